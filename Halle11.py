@@ -4,6 +4,7 @@ from rapidfuzz import fuzz, process
 from datetime import datetime, date, timedelta
 import io
 import gspread
+from gspread.utils import numericise_all
 from google.oauth2.service_account import Credentials
 import time
 import numpy as np
@@ -11,8 +12,14 @@ import plotly.graph_objects as go
 from calendar import monthrange
 import random
 import hashlib
+import json
 import re
 import base64
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from contextlib import contextmanager
 
 
 # ========================================
@@ -176,6 +183,85 @@ PADEL_TERMS = {
 # ========================================
 # ✅ DYNAMISCHE CSV PARSER FUNKTIONEN
 # ========================================
+# Alle Uploads laufen über dieselbe Ingestion: Encoding, Trennzeichen und Header-Zeile
+# werden einmal aus den ersten KB erkannt, danach liest die C-Engine die Datei in Chunks
+# mit genau diesem Encoding (kein mehrfaches Dekodieren / Python-Engine mehr).
+
+CSV_SNIFF_BYTES = 64 * 1024
+CSV_CHUNK_ROWS = 100_000
+CSV_DELIMITERS = [';', ',', '\t']
+
+def sniff_csv(file_obj, is_header=None):
+    """
+    Erkennt Encoding, Trennzeichen und Header-Zeile aus dem Dateianfang.
+    is_header(line) → bool; ohne Prüffunktion ist die erste Zeile der Header.
+    """
+    head = file_obj.read(CSV_SNIFF_BYTES)
+    file_obj.seek(0)
+    if isinstance(head, str):
+        head = head.encode('utf-8')
+    
+    encoding, text = None, None
+    for candidate in ['utf-8-sig', 'latin-1']:
+        try:
+            text = head.decode(candidate)
+            encoding = candidate
+            break
+        except UnicodeDecodeError as e:
+            # Multibyte-Zeichen am Ende des Ausschnitts abgeschnitten → trotzdem UTF-8
+            if candidate == 'utf-8-sig' and e.start >= len(head) - 3 and len(head) == CSV_SNIFF_BYTES:
+                text = head[:e.start].decode(candidate)
+                encoding = candidate
+                break
+    
+    # Nur an \n trennen wie die C-Engine – splitlines() bricht auch an \x85, \x0b, \u2028 usw.,
+    # die in latin-1/cp1252-Exporten mitten in Feldern stehen, und verschiebt dann header_row
+    lines = [line.rstrip('\r') for line in text.split('\n')]
+    if len(head) == CSV_SNIFF_BYTES or not lines[-1]:
+        lines = lines[:-1]  # letzte Zeile evtl. unvollständig bzw. leer nach dem letzten Umbruch
+    
+    header_row = 0 if is_header is None else next((i for i, line in enumerate(lines) if is_header(line)), None)
+    
+    delimiter = ','
+    if header_row is not None and header_row < len(lines):
+        sample = '\n'.join(lines[header_row:header_row + 20])
+        counts = {d: sample.count(d) for d in CSV_DELIMITERS}
+        best = max(counts, key=counts.get)
+        if counts[best] > counts[',']:
+            delimiter = best
+    
+    return {'encoding': encoding, 'delimiter': delimiter, 'header_row': header_row, 'preview': lines[:15]}
+
+def read_csv_chunked(file_obj, sniffed, normalize_chunk=None):
+    """Liest die Datei chunkweise mit der C-Engine; normalize_chunk wird pro Chunk angewendet."""
+    encoding = sniffed['encoding']
+    chunks = []
+    for attempt_encoding in dict.fromkeys([encoding, 'latin-1']):
+        file_obj.seek(0)
+        try:
+            reader = pd.read_csv(
+                file_obj,
+                sep=sniffed['delimiter'],
+                skiprows=sniffed['header_row'],
+                engine='c',
+                on_bad_lines='skip',
+                encoding=attempt_encoding,
+                chunksize=CSV_CHUNK_ROWS,
+            )
+            chunks = [normalize_chunk(chunk) if normalize_chunk else chunk for chunk in reader]
+            break
+        except UnicodeDecodeError:
+            # Nicht-UTF-8-Bytes erst hinter dem Sniff-Ausschnitt
+            continue
+    
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+def clean_csv_columns(df):
+    df.columns = df.columns.str.strip().str.replace('\ufeff', '').str.replace('"', '')
+    return df
+
 
 def parse_playtomic_csv(file_obj):
     """
@@ -183,50 +269,23 @@ def parse_playtomic_csv(file_obj):
     Automatically detects where the actual data starts by looking for key columns.
     """
     try:
-        content = file_obj.read()
-        file_obj.seek(0)
-        
-        text = None
-        for encoding in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-            try:
-                text = content.decode(encoding)
-                break
-            except:
-                continue
+        required_columns = ['User name', 'Product SKU', 'Service date', 'Total']
+        sniffed = sniff_csv(file_obj, lambda line: all(col in line for col in required_columns))
         
-        if text is None:
+        if sniffed['encoding'] is None:
             st.error("❌ CSV-Encoding konnte nicht erkannt werden")
             return pd.DataFrame()
         
-        lines = text.strip().split('\n')
-        required_columns = ['User name', 'Product SKU', 'Service date', 'Total']
-        
-        header_row_idx = None
-        for i, line in enumerate(lines):
-            if all(col in line for col in required_columns):
-                header_row_idx = i
-                break
-        
-        if header_row_idx is None:
+        if sniffed['header_row'] is None:
             st.error(f"❌ Header-Zeile nicht gefunden. Benötigte Spalten: {required_columns}")
             st.info("📋 Erste 15 Zeilen der CSV:")
-            for i, line in enumerate(lines[:15]):
+            for i, line in enumerate(sniffed['preview']):
                 st.text(f"{i}: {line[:100]}...")
             return pd.DataFrame()
         
-        st.info(f"✅ Header gefunden in Zeile {header_row_idx + 1}")
+        st.info(f"✅ Header gefunden in Zeile {sniffed['header_row'] + 1}")
         
-        file_obj.seek(0)
-        df = pd.read_csv(
-            file_obj,
-            sep=';',
-            skiprows=header_row_idx,
-            engine='python',
-            on_bad_lines='skip',
-            encoding='utf-8-sig'
-        )
-        
-        df.columns = df.columns.str.strip().str.replace('\ufeff', '')
+        df = read_csv_chunked(file_obj, sniffed, clean_csv_columns)
         
         missing_cols = [col for col in required_columns if col not in df.columns]
         if missing_cols:
@@ -241,60 +300,35 @@ def parse_playtomic_csv(file_obj):
         return pd.DataFrame()
 
 
+def normalize_checkins_chunk(df):
+    df = clean_csv_columns(df)
+    column_mapping = {}
+    for col in df.columns:
+        col_lower = col.lower()
+        if 'nachname' in col_lower or col_lower == 'name':
+            column_mapping[col] = 'Vor- & Nachname'
+        elif 'datum' in col_lower or 'date' in col_lower:
+            column_mapping[col] = 'Datum'
+        elif 'zeit' in col_lower or 'time' in col_lower:
+            column_mapping[col] = 'Zeit'
+    
+    if column_mapping:
+        df = df.rename(columns=column_mapping)
+    return df
+
 def parse_checkins_csv(file_obj):
     """Parses Wellpass Checkins CSV files."""
     try:
-        content = file_obj.read()
-        file_obj.seek(0)
+        sniffed = sniff_csv(file_obj, lambda line: 'Nachname' in line or ('Name' in line and 'Datum' in line))
         
-        text = None
-        for encoding in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-            try:
-                text = content.decode(encoding)
-                break
-            except:
-                continue
-        
-        if text is None:
+        if sniffed['encoding'] is None:
             st.error("❌ Checkins CSV-Encoding nicht erkannt")
             return pd.DataFrame()
         
-        sample = text[:2000]
-        semicolon_count = sample.count(';')
-        comma_count = sample.count(',')
-        delimiter = ';' if semicolon_count > comma_count else ','
+        if sniffed['header_row'] is None:
+            sniffed = sniff_csv(file_obj)
         
-        lines = text.strip().split('\n')
-        header_row_idx = 0
-        for i, line in enumerate(lines):
-            if 'Nachname' in line or ('Name' in line and 'Datum' in line):
-                header_row_idx = i
-                break
-        
-        file_obj.seek(0)
-        df = pd.read_csv(
-            file_obj,
-            sep=delimiter,
-            skiprows=header_row_idx,
-            engine='python',
-            on_bad_lines='skip',
-            encoding='utf-8-sig'
-        )
-        
-        df.columns = df.columns.str.strip().str.replace('\ufeff', '').str.replace('"', '')
-        
-        column_mapping = {}
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'nachname' in col_lower or col_lower == 'name':
-                column_mapping[col] = 'Vor- & Nachname'
-            elif 'datum' in col_lower or 'date' in col_lower:
-                column_mapping[col] = 'Datum'
-            elif 'zeit' in col_lower or 'time' in col_lower:
-                column_mapping[col] = 'Zeit'
-        
-        if column_mapping:
-            df = df.rename(columns=column_mapping)
+        df = read_csv_chunked(file_obj, sniffed, normalize_checkins_chunk)
         
         st.success(f"✅ {len(df)} Check-ins geladen")
         return df
@@ -434,12 +468,33 @@ def set_monthly_goal(value):
     save_setting('monthly_goal', value)
 
 
+def to_whatsapp_number(raw_phone):
+    """Telefonnummer → whatsapp:+49… (ohne Ländervorwahl wird +49 angenommen)."""
+    raw_phone = str(raw_phone).strip().replace(" ", "").replace("-", "")
+    if raw_phone.startswith("whatsapp:"):
+        return raw_phone
+    e164 = raw_phone if raw_phone.startswith("+") else "+49" + raw_phone.lstrip("0")
+    return f"whatsapp:{e164}"
+
+def wellpass_template_variables(fehler_row, name_suffix=""):
+    """content_variables für das Wellpass-Template (Vorname, Spielzeit, QR-Link, Datum)."""
+    full_name = str(fehler_row.get("Name", "")).strip()
+    firstname = full_name.split()[0] if full_name else "Spieler"
+    spielzeit = str(fehler_row.get("Service_Zeit", "") or "").strip() or "deiner gebuchten Zeit"
+
+    service_date = fehler_row.get("Datum", "")
+    try:
+        service_date_str = pd.to_datetime(service_date).strftime("%d.%m.%Y") if service_date else ""
+    except:
+        service_date_str = str(service_date) if service_date else ""
+
+    return json.dumps({
+        "1": firstname + name_suffix, "2": spielzeit, "3": WELLPASS_QR_LINK, "4": service_date_str,
+    })
+
 def send_wellpass_whatsapp_to_player(fehler_row: pd.Series) -> bool:
     """Sendet WhatsApp-Template-Nachricht an den Spieler."""
     try:
-        from twilio.rest import Client
-        import json
-
         twilio_conf = st.secrets.get("twilio", {})
         account_sid = twilio_conf.get("account_sid")
         auth_token = twilio_conf.get("auth_token")
@@ -450,44 +505,24 @@ def send_wellpass_whatsapp_to_player(fehler_row: pd.Series) -> bool:
             st.error("❌ Twilio-Konfiguration unvollständig.")
             return False
 
-        customers = loadsheet("customers")
-        if customers.empty or "name" not in customers.columns:
+        if not get_name_resolver()["customers"]:
             st.error("❌ Customers-Sheet leer oder 'name'-Spalte fehlt.")
             return False
 
-        player_name_norm = normalize_name(fehler_row["Name"])
-        match = customers[customers["name"].apply(normalize_name) == player_name_norm]
+        customer = find_customer(fehler_row["Name"])
 
-        if match.empty or "phone_number" not in match.columns or pd.isna(match.iloc[0]["phone_number"]):
+        if customer_phone(customer) is None:
             st.error(f"❌ Keine Telefonnummer für {fehler_row['Name']} gefunden.")
             return False
 
-        raw_phone = str(match.iloc[0]["phone_number"]).strip().replace(" ", "").replace("-", "")
-
-        if raw_phone.startswith("whatsapp:"):
-            to_number = raw_phone
-        else:
-            e164 = raw_phone if raw_phone.startswith("+") else "+49" + raw_phone.lstrip("0")
-            to_number = f"whatsapp:{e164}"
-
+        to_number = to_whatsapp_number(customer_phone(customer))
         full_name = str(fehler_row.get("Name", "")).strip()
-        firstname = full_name.split()[0] if full_name else "Spieler"
-        spielzeit = str(fehler_row.get("Service_Zeit", "") or "").strip() or "deiner gebuchten Zeit"
-
-        service_date = fehler_row.get("Datum", "")
-        try:
-            service_date_str = pd.to_datetime(service_date).strftime("%d.%m.%Y") if service_date else ""
-        except:
-            service_date_str = str(service_date) if service_date else ""
 
-        client = Client(account_sid, auth_token)
-        msg = client.messages.create(
+        msg = get_twilio_client(account_sid, auth_token).messages.create(
             from_=from_number,
             to=to_number,
             content_sid=content_sid,
-            content_variables=json.dumps({
-                "1": firstname, "2": spielzeit, "3": WELLPASS_QR_LINK, "4": service_date_str,
-            }),
+            content_variables=wellpass_template_variables(fehler_row),
         )
 
         st.success(f"✅ WhatsApp an {full_name} gesendet (SID: {msg.sid})")
@@ -503,9 +538,6 @@ def send_wellpass_whatsapp_to_player(fehler_row: pd.Series) -> bool:
 def send_wellpass_whatsapp_test(fehler_row: pd.Series) -> bool:
     """Sendet Test-WhatsApp an Admin-Nummer."""
     try:
-        from twilio.rest import Client
-        import json
-
         twilio_conf = st.secrets.get("twilio", {})
         account_sid = twilio_conf.get("account_sid")
         auth_token = twilio_conf.get("auth_token")
@@ -517,31 +549,11 @@ def send_wellpass_whatsapp_test(fehler_row: pd.Series) -> bool:
             st.error("❌ Twilio-Konfiguration unvollständig.")
             return False
 
-        raw_phone = str(admin_phone).strip().replace(" ", "").replace("-", "")
-        if raw_phone.startswith("whatsapp:"):
-            to_number = raw_phone
-        else:
-            e164 = raw_phone if raw_phone.startswith("+") else "+49" + raw_phone.lstrip("0")
-            to_number = f"whatsapp:{e164}"
-
-        full_name = str(fehler_row.get("Name", "")).strip()
-        firstname = full_name.split()[0] if full_name else "Spieler"
-        spielzeit = str(fehler_row.get("Service_Zeit", "") or "").strip() or "deiner gebuchten Zeit"
-
-        service_date = fehler_row.get("Datum", "")
-        try:
-            service_date_str = pd.to_datetime(service_date).strftime("%d.%m.%Y") if service_date else ""
-        except:
-            service_date_str = str(service_date) if service_date else ""
-
-        client = Client(account_sid, auth_token)
-        msg = client.messages.create(
+        msg = get_twilio_client(account_sid, auth_token).messages.create(
             from_=from_number,
-            to=to_number,
+            to=to_whatsapp_number(admin_phone),
             content_sid=content_sid,
-            content_variables=json.dumps({
-                "1": firstname + " (TEST)", "2": spielzeit, "3": WELLPASS_QR_LINK, "4": service_date_str,
-            }),
+            content_variables=wellpass_template_variables(fehler_row, name_suffix=" (TEST)"),
         )
 
         st.success(f"✅ Test-Template an Admin gesendet (SID: {msg.sid})")
@@ -553,7 +565,9 @@ def send_wellpass_whatsapp_test(fehler_row: pd.Series) -> bool:
 
     
 def validate_secrets():
-    required = ["gcp_service_account", "google_sheets", "passwords"]
+    required = ["passwords"]
+    if get_storage_backend() == "gsheets" or sync_to_sheets_enabled():
+        required += ["gcp_service_account", "google_sheets"]
     missing = [k for k in required if k not in st.secrets]
     if missing:
         st.error(f"❌ Fehlende Secrets: {', '.join(missing)}")
@@ -572,18 +586,19 @@ def is_behoben_value(val):
         return False
     return val in [True, 'True', 'true', 1, '1', 'TRUE']
 
+DATE_FORMATS = [
+    '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
+    '%d.%m.%Y %H:%M', '%d.%m.%Y', '%Y%m%d'
+]
+
 def parse_date_safe(date_val):
     """Robust date parsing that handles multiple formats."""
     if pd.isna(date_val) or date_val == '' or date_val == '-':
         return None
     
     date_str = str(date_val).strip()
-    formats = [
-        '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
-        '%d.%m.%Y %H:%M', '%d.%m.%Y', '%Y%m%d'
-    ]
     
-    for fmt in formats:
+    for fmt in DATE_FORMATS:
         try:
             return pd.to_datetime(date_str, format=fmt, errors='raise').date()
         except:
@@ -594,50 +609,60 @@ def parse_date_safe(date_val):
     except:
         return None
 
+def parse_dates_vectorized(values):
+    """
+    Spaltenweise Variante von parse_date_safe mit identischen Ergebnissen.
+    Jeder Rohwert wird nur einmal geparst, jedes Format läuft vektorisiert über alle
+    noch offenen Werte; nur der Rest geht in den dayfirst-Fallback von parse_date_safe.
+    """
+    values = pd.Series(values).astype(object)
+    result = pd.Series([None] * len(values), index=values.index, dtype=object)
+    valid = values.notna() & (values != '') & (values != '-')
+    if not valid.any():
+        return result
+    
+    raw = values[valid].astype(str)
+    uniques = pd.Series(raw.unique())
+    stripped = uniques.str.strip()
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    pending = pd.Series(True, index=uniques.index)
+    
+    for fmt in DATE_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(stripped[pending], format=fmt, errors='coerce')
+        hit_idx = attempt.index[attempt.notna()]
+        parsed[hit_idx] = attempt[hit_idx]
+        pending[hit_idx] = False
+    
+    lookup = dict(zip(uniques[~pending], parsed[~pending].dt.date))
+    for raw_val in uniques[pending]:
+        lookup[raw_val] = parse_date_safe(raw_val)
+    
+    result[valid] = raw.map(lookup)
+    return result
+
 def parse_csv(f):
     """Generic CSV parser with auto-detection."""
     try:
-        content = f.read()
-        f.seek(0)
-        
-        text = None
-        for encoding in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-            try:
-                text = content.decode(encoding)
-                break
-            except:
-                continue
-        
-        if text is None:
+        sniffed = sniff_csv(f)
+        if sniffed['encoding'] is None:
             return pd.DataFrame()
         
-        sample = text[:2000]
-        semicolon_count = sample.count(';')
-        comma_count = sample.count(',')
-        tab_count = sample.count('\t')
-        
-        if semicolon_count > comma_count and semicolon_count > tab_count:
-            delimiter = ';'
-        elif tab_count > comma_count and tab_count > semicolon_count:
-            delimiter = '\t'
-        else:
-            delimiter = ','
-        
-        df = pd.read_csv(io.StringIO(text), sep=delimiter, engine='python', on_bad_lines='skip', encoding_errors='ignore')
-        
+        df = read_csv_chunked(f, sniffed, clean_csv_columns)
         if len(df.columns) > 1:
             return df
     except:
         pass
     
-    for sep in [None, ';', ',', '\t']:
-        try:
-            f.seek(0)
-            df = pd.read_csv(f, sep=sep, engine='python', encoding='utf-8-sig', on_bad_lines='skip')
-            if len(df.columns) > 1:
-                return df
-        except:
-            continue
+    # Fallback: Trennzeichen von pandas raten lassen
+    try:
+        f.seek(0)
+        df = pd.read_csv(f, sep=None, engine='python', encoding='utf-8-sig', on_bad_lines='skip')
+        if len(df.columns) > 1:
+            return df
+    except:
+        pass
     
     return pd.DataFrame()
 
@@ -651,18 +676,91 @@ def color_status(val):
     return ''
 
 
-def optimize_dataframe(df):
-    for col in df.columns:
-        col_type = df[col].dtype
-        if col_type == 'float64':
-            df[col] = pd.to_numeric(df[col], downcast='float')
-        elif col_type == 'int64':
-            df[col] = pd.to_numeric(df[col], downcast='integer')
-        elif col_type == 'object':
-            num_unique = df[col].nunique()
-            num_total = len(df[col])
-            if num_unique / num_total < 0.5:
-                df[col] = df[col].astype('category')
+# ========================================
+# 🧱 SHEET-SCHEMAS
+# ========================================
+# Feste Spaltentypen pro Sheet, einmal beim Lesen angewendet (statt optimize_dataframe,
+# das je nach Inhalt mal category, mal object lieferte). Nicht gelistete Spalten bleiben wie
+# geladen. Text-Spalten werden beim Sheets-Import nicht numerisiert (Telefonnummern, IDs).
+# 'category' nur für Attribute, nach denen nie gruppiert wird – Namen/Daten bleiben Text.
+# Flags werden als bool gespeichert; alte 'Ja'/'Nein'-Zeilen werden beim Lesen mit übersetzt.
+
+TRUE_TEXT_VALUES = ['True', 'true', 'TRUE', '1', '1.0', 'Ja', 'ja']
+
+SHEET_SCHEMAS = {
+    'buchungen': {
+        'Datum': 'str', 'Name': 'str', 'Name_norm': 'str', 'Betrag': 'float',
+        'Service_Zeit': 'category', 'Checkin_Zeit': 'category', 'Product_SKU': 'category', 'Sport': 'category',
+        'Relevant': 'bool', 'Check-in': 'bool', 'Mitarbeiter': 'bool', 'Fehler': 'bool',
+        'analysis_date': 'str', 'Payment id': 'str', 'Club payment id': 'str',
+        'Wochentag': 'smallint', 'Stunde': 'smallint',
+    },
+    'checkins': {
+        'Datum': 'str', 'Name': 'str', 'Name_norm': 'str', 'Checkin_Zeit': 'category',
+        'Gespielt': 'bool', 'analysis_date': 'str',
+    },
+    'playtomic_raw': {
+        'Payment id': 'str', 'Club payment id': 'str', 'User name': 'str', 'Product SKU': 'str',
+        'Service date': 'str', 'Total': 'str', 'Refund id': 'str', 'Payment status': 'str',
+        'Sport': 'str', 'Payment method': 'str',
+        'Service_date_clean': 'date', 'Total_clean': 'float', 'Sport_clean': 'category',
+        'Kategorie': ('category', ['reservierung', 'baelle', 'schlaeger', 'sonstige', '']),
+    },
+    'corrections': {'key': 'str', 'date': 'str', 'behoben': 'bool', 'timestamp': 'str'},
+    'customers': {'name': 'str', 'name_norm': 'str', 'phone_number': 'str', 'email': 'str'},
+    'name_mapping': {
+        'buchung_name': 'str', 'checkin_name': 'str', 'confidence': 'float',
+        'timestamp': 'str', 'confirmed_by': 'str',
+    },
+    'player_daily': {
+        'date': 'str', 'Name': 'str', 'mitarbeiter': 'bool', 'buchungen': 'int',
+        'umsatz': 'float', 'relevant': 'int', 'mit_checkin': 'int', 'fehler': 'int',
+    },
+    'daily_rollup': {
+        'date': 'str', 'umsatz': 'float', 'buchungen': 'int', 'relevant': 'int',
+        'fehler': 'int', 'checkins': 'int',
+    },
+    'demand_weekly': {
+        'week': 'str', 'Wochentag': 'int', 'Stunde': 'int', 'buchungen': 'int',
+    },
+}
+
+def text_column_indices(header, name):
+    """1-basierte Spaltenindizes, die numericise_all nicht anfassen soll."""
+    schema = SHEET_SCHEMAS.get(name, {})
+    return [i + 1 for i, col in enumerate(header) if schema.get(col) == 'str']
+
+def as_text(col):
+    if col.dtype == object and pd.api.types.infer_dtype(col, skipna=False) == 'string':
+        return col  # schon reiner Text (z.B. aus SQLite) → keine Kopie
+    return col.astype(object).where(col.notna(), '').astype(str)
+
+def apply_sheet_schema(df, name):
+    schema = SHEET_SCHEMAS.get(name)
+    if not schema or df.empty:
+        return df
+    
+    df = df.copy()
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if kind == 'str':
+            df[col] = as_text(values)
+        elif kind == 'float':
+            df[col] = pd.to_numeric(values, errors='coerce').astype('float64')
+        elif kind == 'int':
+            df[col] = pd.to_numeric(values, errors='coerce').fillna(0).astype('int64')
+        elif kind == 'smallint':  # Wochentag/Stunde; -1 = unbekannt
+            df[col] = pd.to_numeric(values, errors='coerce').fillna(-1).astype('int8')
+        elif kind == 'bool':
+            df[col] = as_text(values).isin(TRUE_TEXT_VALUES).values
+        elif kind == 'date':
+            df[col] = pd.to_datetime(as_text(values), errors='coerce').dt.date
+        elif kind == 'category':
+            df[col] = as_text(values).astype('category')
+        else:  # ('category', feste Kategorien) – unbekannte Werte → NaN
+            df[col] = pd.Categorical(as_text(values), categories=kind[1])
     return df
 
 
@@ -788,10 +886,14 @@ def check_password():
 # WHATSAPP INTEGRATION
 # ========================================
 
+@st.cache_resource
+def get_twilio_client(account_sid, auth_token):
+    """Ein Client pro Account – hält die HTTP-Session offen statt pro Nachricht neu zu verbinden."""
+    from twilio.rest import Client
+    return Client(account_sid, auth_token)
+
 def send_whatsapp_message(to_number, message_text):
     try:
-        from twilio.rest import Client
-        
         account_sid = st.secrets.get("twilio", {}).get("account_sid")
         auth_token = st.secrets.get("twilio", {}).get("auth_token")
         from_number = st.secrets.get("twilio", {}).get("whatsapp_from")
@@ -800,7 +902,7 @@ def send_whatsapp_message(to_number, message_text):
             st.error("❌ Twilio nicht konfiguriert")
             return False
         
-        client = Client(account_sid, auth_token)
+        client = get_twilio_client(account_sid, auth_token)
         message = client.messages.create(from_=from_number, body=message_text, to=to_number)
         st.success(f"✅ WhatsApp gesendet! SID: {message.sid}")
         play_sound()  # 🔊 Sound-Effekt
@@ -810,50 +912,57 @@ def send_whatsapp_message(to_number, message_text):
         return False
 
 def get_whatsapp_log_key(fehler_row):
-    return f"{fehler_row['Name_norm']}_{fehler_row['Datum']}_{fehler_row['Betrag']}"
+    return fehler_key(fehler_row)
+
+WHATSAPP_LOG_COLUMNS = ['key', 'name', 'datum', 'betrag', 'to_number', 'timestamp', 'status', 'sid', 'error']
 
 def log_whatsapp_sent(fehler_row, to_number):
-    log = loadsheet("whatsapp_log", cols=['key', 'name', 'datum', 'betrag', 'to_number', 'timestamp'])
-    key = get_whatsapp_log_key(fehler_row)
-    
-    if not log.empty and 'key' in log.columns:
-        existing = log[log['key'] == key]
-        if not existing.empty:
-            log.loc[log['key'] == key, 'timestamp'] = datetime.now().isoformat()
-            savesheet(log, "whatsapp_log")
-            return
-    
+    # Jeder Versand = eine neue Zeile; der letzte Versand pro Key ergibt sich beim Lesen
     new_row = pd.DataFrame([{
-        'key': key, 'name': fehler_row['Name'], 'datum': fehler_row['Datum'],
-        'betrag': fehler_row['Betrag'], 'to_number': to_number, 'timestamp': datetime.now().isoformat()
+        'key': get_whatsapp_log_key(fehler_row), 'name': fehler_row['Name'], 'datum': fehler_row['Datum'],
+        'betrag': format_betrag(fehler_row['Betrag']), 'to_number': to_number, 'timestamp': datetime.now().isoformat()
     }])
-    log = pd.concat([log, new_row], ignore_index=True)
-    savesheet(log, "whatsapp_log")
+    appendsheet(new_row, "whatsapp_log")
 
-def get_whatsapp_sent_time(fehler_row):
-    log = loadsheet("whatsapp_log", cols=['key', 'timestamp'])
-    if log.empty or 'key' not in log.columns:
-        return None
-    
-    key = get_whatsapp_log_key(fehler_row)
-    match = log[log['key'] == key]
+def get_whatsapp_log_index():
+    return build_whatsapp_log_index(sheet_version("whatsapp_log"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)
+def build_whatsapp_log_index(version):
+    """key → letzter Versand (datetime), einmal pro Stand des whatsapp_log."""
+    log = loadsheet("whatsapp_log", WHATSAPP_LOG_COLUMNS)
+    if log.empty or 'key' not in log.columns or 'timestamp' not in log.columns:
+        return {}
     
-    if not match.empty:
-        try:
-            return datetime.fromisoformat(match.iloc[0]['timestamp'])
-        except:
-            return None
-    return None
+    if 'status' in log.columns:
+        # Fehlgeschlagene Queue-Jobs zählen nicht als gesendet (alte Zeilen ohne Status schon)
+        status = log['status'].astype(object).fillna('').astype(str)
+        log = log[status.isin(['', 'sent'])]
+    
+    sent = pd.DataFrame({
+        'key': log['key'].astype(str).map(canonical_fehler_key),
+        'timestamp': pd.to_datetime(log['timestamp'].astype(str), format='ISO8601', errors='coerce'),
+    }).dropna()
+    latest = sent.groupby('key')['timestamp'].max()
+    return {key: ts.to_pydatetime() for key, ts in latest.items()}
+
+def attach_whatsapp_status(df, whatsapp_index):
+    """_wa_sent (datetime oder None) per Join über _key – für alle Fehler eines Tages auf einmal."""
+    df = df.copy()
+    sent = df['_key'].map(whatsapp_index)
+    df['_wa_sent'] = sent.astype(object).where(sent.notna(), None)
+    return df
+
+def get_whatsapp_sent_time(fehler_row):
+    return get_whatsapp_log_index().get(get_whatsapp_log_key(fehler_row))
 
 def send_fehler_notification_with_link(fehler_row, to_player=False):
     if to_player:
-        customers = loadsheet("customers")
-        if not customers.empty and 'name' in customers.columns:
-            player_name_norm = normalize_name(fehler_row['Name'])
-            match = customers[customers['name'].apply(normalize_name) == player_name_norm]
+        if get_name_resolver()['customers']:
+            customer = find_customer(fehler_row['Name'])
             
-            if not match.empty and 'phone_number' in match.columns and pd.notna(match.iloc[0]['phone_number']):
-                phone = str(match.iloc[0]['phone_number'])
+            if customer_phone(customer) is not None:
+                phone = customer_phone(customer)
                 if not phone.startswith('+'):
                     phone = '+49' + phone.lstrip('0').replace(' ', '')
                 to_number = f"whatsapp:{phone}"
@@ -893,20 +1002,253 @@ Dein halle11 Team
     return success
 
 
+# ========================================
+# 📬 WHATSAPP-VERSANDQUEUE
+# ========================================
+# Massenversand läuft im Hintergrund statt im Button-Handler:
+# gepoolter Twilio-Client, Rate-Limit (secrets: twilio.rate_per_second, Standard 1/s),
+# Retry mit Backoff bei 429/5xx/Netzwerkfehlern, Status pro Job in whatsapp_log.
+# Die Worker senden nur – ohne ScriptRunContext gehen st.*-Meldungen dort ins Leere. Das
+# Protokollieren (flush_whatsapp_log) passiert im Haupt-Thread bei jedem Rerun/Poll.
+# transport ist austauschbar (message dict → SID), z.B. durch einen Fake für lokale Tests.
+
+WHATSAPP_DEFAULT_RATE = 1.0
+WHATSAPP_MAX_RETRIES = 3
+WHATSAPP_BACKOFF_SECONDS = 2.0
+WHATSAPP_QUEUE_KEEP_JOBS = 500
+
+@st.cache_resource
+def get_whatsapp_queue():
+    return {
+        'executor': ThreadPoolExecutor(max_workers=2, thread_name_prefix="whatsapp"),
+        'lock': threading.Lock(),
+        'jobs': {},
+        'next_slot': 0.0,
+    }
+
+def get_whatsapp_rate():
+    try:
+        rate = float(st.secrets.get("twilio", {}).get("rate_per_second", WHATSAPP_DEFAULT_RATE))
+    except Exception:
+        rate = WHATSAPP_DEFAULT_RATE
+    return rate if rate > 0 else WHATSAPP_DEFAULT_RATE
+
+def make_twilio_transport():
+    """Client im Haupt-Thread auflösen; der Worker bekommt nur die fertige Sende-Funktion."""
+    twilio_conf = st.secrets.get("twilio", {})
+    client = get_twilio_client(twilio_conf["account_sid"], twilio_conf["auth_token"])
+    return lambda message: client.messages.create(**message).sid
+
+def is_transient_send_error(e):
+    status = getattr(e, 'status', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(e, (ConnectionError, TimeoutError, OSError))
+
+def wait_for_send_slot(queue, rate):
+    """Globales Rate-Limit über alle Worker: jeder Versand reserviert den nächsten freien Slot."""
+    with queue['lock']:
+        now = time.monotonic()
+        slot = max(now, queue['next_slot'])
+        queue['next_slot'] = slot + 1.0 / rate
+    time.sleep(max(0.0, slot - now))
+
+def run_whatsapp_job(job, transport, rate, queue, max_retries=WHATSAPP_MAX_RETRIES):
+    """Läuft im Worker-Thread: nur senden und den Status am Job vermerken, kein st.*/Sheet-Zugriff."""
+    for attempt in range(1, max_retries + 1):
+        wait_for_send_slot(queue, rate)
+        job['status'] = 'sending'
+        job['attempts'] = attempt
+        try:
+            job['sid'] = transport(job['message'])
+            job['status'] = 'sent'
+            job['error'] = ''
+            break
+        except Exception as e:
+            job['error'] = str(e)[:200]
+            if attempt < max_retries and is_transient_send_error(e):
+                job['status'] = 'retry'
+                time.sleep(WHATSAPP_BACKOFF_SECONDS * 2 ** (attempt - 1) + random.uniform(0, 0.5))
+            else:
+                job['status'] = 'failed'
+                break
+    job['finished'] = datetime.now().isoformat()
+    return job
+
+def flush_whatsapp_log():
+    """Abgeschlossene, noch nicht protokollierte Jobs in einem Rutsch nach whatsapp_log schreiben (Haupt-Thread)."""
+    queue = get_whatsapp_queue()
+    with queue['lock']:
+        done = [j for j in queue['jobs'].values() if j['status'] in ('sent', 'failed') and not j.get('logged')]
+    if not done:
+        return 0
+    
+    rows = pd.DataFrame([{
+        'key': job['key'], 'name': job['name'], 'datum': job['datum'], 'betrag': job['betrag'],
+        'to_number': job['message'].get('to', ''), 'timestamp': job['finished'],
+        'status': job['status'], 'sid': job['sid'], 'error': job['error'],
+    } for job in done], columns=WHATSAPP_LOG_COLUMNS)
+    if not appendsheet(rows, "whatsapp_log"):
+        st.error(f"❌ WhatsApp-Log: {len(done)} Versand-Einträge nicht gespeichert – neuer Versuch beim nächsten Laden")
+        return 0
+    with queue['lock']:
+        for job in done:
+            job['logged'] = True
+    return len(done)
+
+def make_whatsapp_job(key, name, datum, betrag, message):
+    return {'key': key, 'name': name, 'datum': datum, 'betrag': betrag, 'message': message}
+
+def enqueue_whatsapp_jobs(jobs, transport=None, rate=None):
+    """Stellt Jobs in die Hintergrund-Queue und gibt sofort die Job-IDs zurück."""
+    queue = get_whatsapp_queue()
+    transport = transport or make_twilio_transport()
+    rate = rate or get_whatsapp_rate()
+    
+    job_ids = []
+    with queue['lock']:
+        # Alte, abgeschlossene und protokollierte Jobs vergessen
+        finished = [jid for jid, j in queue['jobs'].items() if j['status'] in ('sent', 'failed') and j.get('logged')]
+        for jid in finished[:max(0, len(queue['jobs']) - WHATSAPP_QUEUE_KEEP_JOBS)]:
+            del queue['jobs'][jid]
+        
+        for job in jobs:
+            job_id = f"wa-{time.time_ns()}-{len(job_ids)}"
+            job.update({'id': job_id, 'status': 'queued', 'attempts': 0, 'sid': '', 'error': '', 'finished': '', 'logged': False})
+            queue['jobs'][job_id] = job
+            job_ids.append(job_id)
+    
+    for job_id in job_ids:
+        queue['executor'].submit(run_whatsapp_job, queue['jobs'][job_id], transport, rate, queue)
+    return job_ids
+
+def get_whatsapp_queue_status(job_ids=None):
+    """Anzahl Jobs pro Status (queued/sending/retry/sent/failed)."""
+    queue = get_whatsapp_queue()
+    with queue['lock']:
+        jobs = [queue['jobs'][jid] for jid in job_ids if jid in queue['jobs']] if job_ids is not None else list(queue['jobs'].values())
+    counts = {}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+    return counts
+
+def pending_whatsapp_keys():
+    """Keys, die gerade versendet werden oder gesendet, aber noch nicht im whatsapp_log stehen."""
+    queue = get_whatsapp_queue()
+    with queue['lock']:
+        return {j['key'] for j in queue['jobs'].values()
+                if j['status'] in ('queued', 'sending', 'retry') or (j['status'] == 'sent' and not j.get('logged'))}
+
+def build_fehler_reminder_jobs(fehler_rows):
+    """Template-Erinnerungen für mehrere Fehler; gibt (jobs, namen_ohne_nummer) zurück."""
+    twilio_conf = st.secrets.get("twilio", {})
+    from_number = twilio_conf.get("whatsapp_from")
+    content_sid = twilio_conf.get("content_sid", "HXe817b0a8d139ff7fcc7e5e476989bcb9")
+    
+    jobs, skipped = [], []
+    for _, row in fehler_rows.iterrows():
+        customer = find_customer(row['Name'])
+        if customer_phone(customer) is None:
+            skipped.append(row['Name'])
+            continue
+        message = {
+            'from_': from_number,
+            'to': to_whatsapp_number(customer_phone(customer)),
+            'content_sid': content_sid,
+            'content_variables': wellpass_template_variables(row),
+        }
+        jobs.append(make_whatsapp_job(get_whatsapp_log_key(row), row['Name'], row['Datum'], format_betrag(row['Betrag']), message))
+    return jobs, skipped
+
+# Offene Platzhalter: {name}-artig (pro Empfänger) oder [DATUM]-artig (von Hand auszufüllen)
+PLACEHOLDER_PATTERN = re.compile(r'\{[^{}\n]+\}|\[[^\[\]\n]+\]')
+
+def fill_message_placeholders(text, name, buchungen=None, zeit=None):
+    """Ersetzt {name} (Vorname), {buchungen} und {zeit}; ohne Wert bleibt der Platzhalter stehen."""
+    text = text.replace("{name}", str(name).split()[0] if name else "")
+    if buchungen is not None:
+        text = text.replace("{buchungen}", str(buchungen))
+    if zeit:
+        text = text.replace("{zeit}", str(zeit))
+    return text
+
+def open_placeholders(text):
+    return sorted(set(PLACEHOLDER_PATTERN.findall(text)))
+
+def build_text_jobs(player_messages):
+    """Freitext an mehrere Spieler: {Name: Nachricht}; gibt (jobs, namen_ohne_nummer) zurück."""
+    from_number = st.secrets.get("twilio", {}).get("whatsapp_from")
+    today_str = date.today().isoformat()
+    
+    jobs, skipped = [], []
+    for name, text in player_messages.items():
+        customer = find_customer(name)
+        if customer_phone(customer) is None:
+            skipped.append(name)
+            continue
+        message = {'from_': from_number, 'to': to_whatsapp_number(customer_phone(customer)), 'body': text}
+        jobs.append(make_whatsapp_job(f"vielspieler_{normalize_name(name)}_{today_str}", name, today_str, '', message))
+    return jobs, skipped
+
+def whatsapp_queue_caption():
+    counts = get_whatsapp_queue_status()
+    if not counts:
+        return
+    offen = counts.get('queued', 0) + counts.get('sending', 0) + counts.get('retry', 0)
+    st.caption(f"📬 Versandqueue: {offen} offen · ✅ {counts.get('sent', 0)} gesendet · ❌ {counts.get('failed', 0)} fehlgeschlagen")
+
+def render_whatsapp_queue_status():
+    flush_whatsapp_log()
+    if pending_whatsapp_keys():
+        poll_whatsapp_queue()
+    else:
+        whatsapp_queue_caption()
+
+@st.fragment(run_every=2)
+def poll_whatsapp_queue():
+    flush_whatsapp_log()
+    whatsapp_queue_caption()
+    if not pending_whatsapp_keys():
+        # Alles versendet und protokolliert → App neu laden, damit die WhatsApp-Spalten stimmen
+        st.rerun()
+
+
 # ========================================
 # CUSTOMER-DATEN
 # ========================================
 
-def get_customer_data(player_name):
+def get_name_resolver():
+    return build_name_resolver(sheet_version("customers"), sheet_version("name_mapping"))
+
+@st.cache_resource(ttl=900, show_spinner=False, max_entries=2)
+def build_name_resolver(customers_version, mapping_version):
+    """Normalisierte Namen → Kunde, Mitarbeiter-Set und gelerntes Mapping – einmal aufgebaut statt pro Lookup."""
     customers = loadsheet("customers")
-    if customers.empty or 'name' not in customers.columns:
+    by_name = {}
+    if not customers.empty and 'name' in customers.columns:
+        for name_norm, record in zip(customers['name'].map(normalize_name), customers.to_dict('records')):
+            by_name.setdefault(name_norm, record)  # erster Treffer gewinnt (wie bisher iloc[0])
+    return {
+        'customers': by_name,
+        'staff': MITARBEITER_NORM,
+        'mapping': load_name_mapping(),
+    }
+
+def find_customer(player_name):
+    return get_name_resolver()['customers'].get(normalize_name(player_name))
+
+def customer_phone(customer):
+    """Telefonnummer eines Kunden oder None (leerer Text zählt als fehlend)."""
+    if customer is None:
         return None
-    
-    player_name_norm = normalize_name(player_name)
-    match = customers[customers['name'].apply(normalize_name) == player_name_norm]
-    
-    if not match.empty:
-        customer = match.iloc[0]
+    phone = customer.get("phone_number")
+    if phone is None or pd.isna(phone) or not str(phone).strip():
+        return None
+    return str(phone)
+
+def get_customer_data(player_name):
+    customer = find_customer(player_name)
+    if customer is not None:
         return {
             'phone_number': customer.get('phone_number', 'N/A'),
             'email': customer.get('email', 'N/A'),
@@ -915,12 +1257,55 @@ def get_customer_data(player_name):
     return None
 
 
+# ========================================
+# 🧵 HINTERGRUND-KONTEXT
+# ========================================
+# Worker-Threads (Import-Job) haben keinen ScriptRunContext: st.info/warning/error landen dort
+# im Nichts, st.secrets und st.cache_data gehören in den Script-Run. Der Haupt-Thread löst die
+# Storage-Konfiguration deshalb vorher auf (resolve_storage_context), der Worker läuft damit in
+# background_context. Storage-Meldungen gehen über notify – im Job landen sie in dessen Protokoll.
+
+BACKGROUND = threading.local()
+
+def get_background_context():
+    return getattr(BACKGROUND, 'context', None)
+
+@contextmanager
+def background_context(storage, report):
+    """storage: Ergebnis von resolve_storage_context(); report(level, message) nimmt Meldungen an."""
+    BACKGROUND.context = {'storage': storage, 'report': report}
+    try:
+        yield
+    finally:
+        BACKGROUND.context = None
+
+def notify(level, message):
+    """st.info/success/warning/error – im Hintergrund-Job stattdessen an report."""
+    context = get_background_context()
+    if context is None:
+        getattr(st, level)(message)
+    else:
+        context['report'](level, message)
+
+def cached_call(cached_fn, *args):
+    """st.cache_data-Funktion im Script-Run über den Cache aufrufen, im Hintergrund-Job direkt."""
+    if get_background_context() is not None:
+        return cached_fn.__wrapped__(*args)
+    return cached_fn(*args)
+
+
 # ========================================
 # GOOGLE SHEETS
 # ========================================
 
-@st.cache_resource
 def get_gsheet_client():
+    context = get_background_context()
+    if context is not None:
+        return context['storage'].get('spreadsheet')
+    return connect_gsheet()
+
+@st.cache_resource
+def connect_gsheet():
     try:
         creds_dict = dict(st.secrets["gcp_service_account"])
         scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
@@ -931,205 +1316,977 @@ def get_gsheet_client():
         st.error(f"❌ Google Sheets Fehler: {e}")
         return None
 
-@st.cache_data(ttl=900, show_spinner=False)  # 15 min cache to reduce API calls
-def loadsheet(name, cols=None):
+def load_table_gsheets(name, cols=None):
+    """Liest ein Worksheet komplett (get_all_records). Fehler der API werden weitergereicht."""
+    sheet = get_gsheet_client()
+    if not sheet:
+        return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+    
     try:
-        sheet = get_gsheet_client()
-        if not sheet:
-            return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
-        
-        try:
-            data = sheet.worksheet(name).get_all_records()
-            df = pd.DataFrame(data) if data else pd.DataFrame(columns=cols) if cols else pd.DataFrame()
-        except gspread.exceptions.WorksheetNotFound:
-            sheet.add_worksheet(title=name, rows=1000, cols=20)
+        ws = sheet.worksheet(name)
+        if name not in SHEET_SCHEMAS:
+            data = ws.get_all_records()
+            return pd.DataFrame(data) if data else pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+        
+        # wie get_all_records, aber Text-Spalten laut Schema bleiben unverändert
+        values = ws.get_all_values()
+        if len(values) < 2:
             return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
-        
-        if not df.empty:
-            df = optimize_dataframe(df)
-        return df
-    except Exception as e:
-        if "429" in str(e):
-            st.warning("⚠️ Rate Limit - warte 10s...")
-            time.sleep(10)
-            loadsheet.clear()
-            return loadsheet(name, cols)
+        header = values[0]
+        ignore = text_column_indices(header, name)
+        width = len(header)
+        rows = [numericise_all((list(r) + [''] * width)[:width], ignore=ignore) for r in values[1:]]
+        return pd.DataFrame(rows, columns=header)
+    except gspread.exceptions.WorksheetNotFound:
+        sheet.add_worksheet(title=name, rows=1000, cols=20)
         return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
 
+def get_worksheet(name):
+    """Holt ein Worksheet per Name und legt es bei Bedarf an."""
+    sheet = get_gsheet_client()
+    if not sheet:
+        return None
+    try:
+        return sheet.worksheet(name)
+    except gspread.exceptions.WorksheetNotFound:
+        return sheet.add_worksheet(title=name, rows=1000, cols=20)
+
+def dataframe_to_rows(df):
+    """Wandelt einen DataFrame in Zeilen (ohne Header) für die Sheets-API um."""
+    df_copy = df.copy()
+    for col in df_copy.columns:
+        values = df_copy[col]
+        if values.dtype == 'object' or isinstance(values.dtype, pd.CategoricalDtype):
+            df_copy[col] = as_text(values).str.replace(',', '.', regex=False)
+        elif pd.api.types.is_float_dtype(values):
+            df_copy[col] = as_text(values.where(np.isfinite(values)))
+        elif pd.api.types.is_integer_dtype(values):
+            df_copy[col] = values.astype(str)
+    
+    df_clean = df_copy.fillna('').replace([np.inf, -np.inf], '')
+    return df_clean.values.tolist()
+
+def write_full_to_worksheet(ws, df):
+    """Ersetzt den kompletten Inhalt eines Worksheets (Header + Zeilen)."""
+    ws.clear()
+    time.sleep(0.5)
+    
+    if not df.empty:
+        batch_data = [df.columns.tolist()] + dataframe_to_rows(df)
+        ws.update(batch_data, value_input_option='RAW')
+
+APPEND_BATCH_SIZE = 500
+
+def append_to_worksheet(ws, df, batch_size=APPEND_BATCH_SIZE):
+    """
+    Hängt neue Zeilen in Batches an, ohne das Sheet zu leeren.
+    Gibt False zurück, wenn df Spalten hat, die der bestehende Header nicht kennt.
+    """
+    if df.empty:
+        return True
+    
+    header = ws.row_values(1)
+    if not header:
+        write_full_to_worksheet(ws, df)
+        return True
+    
+    if any(col not in header for col in df.columns):
+        return False
+    
+    rows = dataframe_to_rows(df.reindex(columns=header))
+    for i in range(0, len(rows), batch_size):
+        ws.append_rows(rows[i:i + batch_size], value_input_option='RAW')
+    return True
+
 def save_sheet_with_retry(df, name, max_retries=3):
     for attempt in range(max_retries):
         try:
-            sheet = get_gsheet_client()
-            if not sheet:
+            ws = get_worksheet(name)
+            if ws is None:
                 return False
             
-            try:
-                ws = sheet.worksheet(name)
-            except gspread.exceptions.WorksheetNotFound:
-                ws = sheet.add_worksheet(title=name, rows=1000, cols=20)
-            
-            ws.clear()
-            time.sleep(0.5)
-            
-            if not df.empty:
-                df_copy = df.copy()
-                for col in df_copy.columns:
-                    if df_copy[col].dtype == 'object' or str(df_copy[col].dtype) == 'category':
-                        df_copy[col] = df_copy[col].astype(str).str.replace(',', '.', regex=False)
-                    elif df_copy[col].dtype in ['float64', 'float32', 'int64', 'int32']:
-                        df_copy[col] = df_copy[col].apply(lambda x: str(x).replace(',', '.') if pd.notna(x) else '')
-                
-                df_clean = df_copy.fillna('').replace([np.inf, -np.inf], '')
-                batch_data = [df_clean.columns.tolist()] + df_clean.values.tolist()
-                ws.update(batch_data, value_input_option='RAW')
+            write_full_to_worksheet(ws, df)
+            return True
+            
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait_time = (2 ** attempt) + random.uniform(0, 1)
+                notify('warning', f"⚠️ Rate Limit - {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                notify('error', f"❌ Fehler: {e}")
+                return False
+    return False
+
+def append_sheet_with_retry(df, name, max_retries=3):
+    """Append-only Schreiben für reine Neuzeilen; Voll-Rewrite nur bei geändertem Header."""
+    for attempt in range(max_retries):
+        try:
+            ws = get_worksheet(name)
+            if ws is None:
+                return False
+            
+            if not append_to_worksheet(ws, df):
+                # Neue Spalten → einmalig komplett neu schreiben
+                existing = load_table_gsheets(name)
+                return save_sheet_with_retry(pd.concat([existing, df], ignore_index=True), name)
+            return True
+            
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait_time = (2 ** attempt) + random.uniform(0, 1)
+                notify('warning', f"⚠️ Rate Limit - {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                notify('error', f"❌ Fehler: {e}")
+                return False
+    return False
+
+@st.cache_data(ttl=900, show_spinner=False)
+def gsheets_row_index(name, column, version=0):
+    """
+    Index Wert → Zeilenbereiche für eine Spalte (z.B. analysis_date).
+    Liest nur Header und diese eine Spalte, nicht das ganze Sheet.
+    version = sheet_version(name), damit jeder Schreibvorgang den Index ungültig macht.
+    """
+    ws = get_worksheet(name)
+    if ws is None:
+        return [], {}
+    header = ws.row_values(1)
+    if column not in header:
+        return header, {}
+    
+    values = ws.col_values(header.index(column) + 1)[1:]
+    index = {}
+    row = 2
+    for value, group in groupby(values):
+        count = len(list(group))
+        index.setdefault(str(value), []).append((row, row + count - 1))
+        row += count
+    return header, index
+
+def load_partition_gsheets(name, column, value, cols=None):
+    header, index = cached_call(gsheets_row_index, name, column, sheet_version(name))
+    if header and column not in header:
+        return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+    
+    ranges = index.get(str(value), [])
+    if not ranges:
+        return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+    
+    ws = get_worksheet(name)
+    blocks = ws.batch_get([f"{start}:{end}" for start, end in ranges])
+    width = len(header)
+    ignore = text_column_indices(header, name)
+    rows = [numericise_all((list(r) + [''] * width)[:width], ignore=ignore) for block in blocks for r in block]
+    df = pd.DataFrame(rows, columns=header)
+    # Schutz gegen veralteten Index (Sheet extern geändert)
+    return df[df[column].astype(str) == str(value)].reset_index(drop=True)
+
+def upsert_row_gsheets(row, name, key_col, max_retries=3):
+    """Schreibt genau eine Zeile: vorhandene Zeile per Schlüssel überschreiben, sonst anhängen."""
+    for attempt in range(max_retries):
+        try:
+            ws = get_worksheet(name)
+            if ws is None:
+                return False
+            
+            header, index = cached_call(gsheets_row_index, name, key_col, sheet_version(name))
+            row_df = pd.DataFrame([row])
+            if not header or any(col not in header for col in row_df.columns):
+                # Leeres Sheet oder neue Spalten → einmalig über den Voll-Upsert
+                return upsert_sheet_with_retry(row_df, name, [key_col])
+            
+            values = dataframe_to_rows(row_df.reindex(columns=header))[0]
+            ranges = index.get(str(row[key_col]), [])
+            if ranges:
+                ws.update([values], f"A{ranges[0][0]}", value_input_option='RAW')
+            else:
+                ws.append_rows([values], value_input_option='RAW')
+            return True
+            
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait_time = (2 ** attempt) + random.uniform(0, 1)
+                notify('warning', f"⚠️ Rate Limit - {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                notify('error', f"❌ Fehler: {e}")
+                return False
+    return False
+
+def delete_rows_gsheets(name, key_col, key, max_retries=3):
+    """Löscht alle Zeilen mit key_col == key, ohne das Sheet neu zu schreiben."""
+    for attempt in range(max_retries):
+        try:
+            ws = get_worksheet(name)
+            if ws is None:
+                return False
+            
+            header, index = cached_call(gsheets_row_index, name, key_col, sheet_version(name))
+            # Von unten nach oben löschen, damit die Zeilennummern gültig bleiben
+            for start, end in sorted(index.get(str(key), []), reverse=True):
+                ws.delete_rows(start, end)
+            return True
+            
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait_time = (2 ** attempt) + random.uniform(0, 1)
+                notify('warning', f"⚠️ Rate Limit - {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                notify('error', f"❌ Fehler: {e}")
+                return False
+    return False
+
+def drop_rows_by_key(existing, df, key_cols):
+    """Entfernt aus existing alle Zeilen, deren Schlüssel (key_cols) auch in df vorkommt."""
+    if existing.empty or df.empty or any(col not in existing.columns for col in key_cols):
+        return existing
+    existing_keys = pd.MultiIndex.from_frame(existing[key_cols].astype(str))
+    new_keys = pd.MultiIndex.from_frame(df[key_cols].astype(str))
+    return existing[~existing_keys.isin(new_keys)]
+
+@st.cache_data(ttl=900, show_spinner=False)
+def gsheets_key_index(name, key_cols, version=0):
+    """
+    Index Schlüssel-Tupel (key_cols) → Zeilennummern.
+    Liest nur Header und die Schlüsselspalten; version wie bei gsheets_row_index.
+    """
+    ws = get_worksheet(name)
+    if ws is None:
+        return [], {}
+    header = ws.row_values(1)
+    if any(col not in header for col in key_cols):
+        return header, {}
+    
+    columns = [ws.col_values(header.index(col) + 1)[1:] for col in key_cols]
+    length = max(len(values) for values in columns)
+    columns = [values + [''] * (length - len(values)) for values in columns]
+    index = {}
+    for row, key in enumerate(zip(*columns), start=2):
+        index.setdefault(key, []).append(row)
+    return header, index
+
+def upsert_sheet_with_retry(df, name, key_cols, max_retries=3):
+    """
+    Upsert per Schlüssel auf Google Sheets mit derselben Semantik wie drop_rows_by_key + concat:
+    alle vorhandenen Zeilen eines Schlüssels werden durch alle neuen Zeilen dieses Schlüssels ersetzt.
+    Steht ein Schlüssel auf genau einer Zeile und kommt genau einmal neu, wird an Ort und Stelle
+    überschrieben; sonst alte Zeilen löschen und neue anhängen. Kein clear() – das Sheet ist nie leer.
+    """
+    if df.empty:
+        return True
+    for attempt in range(max_retries):
+        try:
+            ws = get_worksheet(name)
+            if ws is None:
+                return False
+            
+            header, index = cached_call(gsheets_key_index, name, tuple(key_cols), sheet_version(name))
+            if not header or any(col not in header for col in list(df.columns) + list(key_cols)):
+                # Leeres Sheet oder neue Spalten → einmalig komplett schreiben
+                existing = load_table_gsheets(name)
+                combined = pd.concat([drop_rows_by_key(existing, df, key_cols), df], ignore_index=True)
+                return save_sheet_with_retry(combined, name)
+            
+            rows = dataframe_to_rows(df.reindex(columns=header))
+            incoming = {}
+            for key, values in zip(zip(*[df[col].astype(str) for col in key_cols]), rows):
+                incoming.setdefault(key, []).append(values)
+            
+            updates, appends, deletes = [], [], []
+            for key, values in incoming.items():
+                found = index.get(key, [])
+                if len(found) == 1 and len(values) == 1:
+                    updates.append({'range': f"A{found[0]}", 'values': values})
+                else:
+                    deletes.extend(found)
+                    appends.extend(values)
             
-            loadsheet.clear()
+            if updates:
+                ws.batch_update(updates, value_input_option='RAW')
+            # Von unten nach oben löschen, damit die Zeilennummern gültig bleiben
+            for row in sorted(deletes, reverse=True):
+                ws.delete_rows(row)
+            for i in range(0, len(appends), APPEND_BATCH_SIZE):
+                ws.append_rows(appends[i:i + APPEND_BATCH_SIZE], value_input_option='RAW')
             return True
             
         except Exception as e:
             if "429" in str(e) and attempt < max_retries - 1:
+                gsheets_key_index.clear()  # evtl. schon geschriebene Zeilen beim nächsten Versuch finden
                 wait_time = (2 ** attempt) + random.uniform(0, 1)
-                st.warning(f"⚠️ Rate Limit - {wait_time:.1f}s...")
+                notify('warning', f"⚠️ Rate Limit - {wait_time:.1f}s...")
                 time.sleep(wait_time)
             else:
-                st.error(f"❌ Fehler: {e}")
+                notify('error', f"❌ Fehler: {e}")
                 return False
     return False
 
+
+# ========================================
+# LOKALER SPEICHER (SQLITE)
+# ========================================
+
+@st.cache_resource
+def get_sqlite_connection():
+    path = get_storage_config().get("sqlite_path", "halle11.db")
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+@st.cache_resource
+def get_sqlite_lock():
+    return threading.Lock()
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def to_sqlite_value(val):
+    if val is None or isinstance(val, (str, bool, int, float)):
+        return val
+    if isinstance(val, np.generic):
+        return val.item()
+    return str(val)
+
+def prepare_for_sqlite(df):
+    """Kategorien/Objekte in SQLite-taugliche Python-Werte umwandeln, NaN → NULL."""
+    df_copy = df.copy()
+    for col in df_copy.columns:
+        if df_copy[col].dtype == 'object' or str(df_copy[col].dtype) == 'category':
+            values = df_copy[col].astype(object)
+            df_copy[col] = values.where(values.notna(), None).map(to_sqlite_value)
+    return df_copy
+
+def sqlite_table_columns(conn, name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote_ident(name)})").fetchall()]
+
+def sqlite_ensure_columns(conn, name, columns):
+    """Legt fehlende Spalten per ALTER TABLE an (Header-Erweiterung wie bei Sheets)."""
+    existing = sqlite_table_columns(conn, name)
+    for col in columns:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {quote_ident(name)} ADD COLUMN {quote_ident(col)}")
+
+def load_table_sqlite(name, cols=None):
+    conn = get_sqlite_connection()
+    with get_sqlite_lock():
+        table_exists = bool(sqlite_table_columns(conn, name))
+    
+    if not table_exists and sync_to_sheets_enabled():
+        # Einmalig aus Google Sheets übernehmen, damit der lokale Store denselben Stand hat
+        seeded = load_table_gsheets(name, cols)
+        if not seeded.empty:
+            save_table_sqlite(seeded, name)
+        return seeded
+    
+    if not table_exists:
+        return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+    
+    with get_sqlite_lock():
+        df = pd.read_sql_query(f"SELECT * FROM {quote_ident(name)}", conn)
+    return df if not df.empty else pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+
+def load_partition_sqlite(name, column, value, cols=None):
+    conn = get_sqlite_connection()
+    with get_sqlite_lock():
+        columns = sqlite_table_columns(conn, name)
+    
+    if not columns:
+        df = load_table_sqlite(name, cols)
+        if df.empty or column not in df.columns:
+            return df
+        return df[df[column].astype(str) == str(value)].reset_index(drop=True)
+    
+    if column not in columns:
+        return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+    
+    with get_sqlite_lock(), conn:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {quote_ident(f'idx_{name}_{column}')} ON {quote_ident(name)} ({quote_ident(column)})")
+        df = pd.read_sql_query(f"SELECT * FROM {quote_ident(name)} WHERE {quote_ident(column)} = ?", conn, params=(str(value),))
+    return df if not df.empty else pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+
+def save_table_sqlite(df, name):
+    conn = get_sqlite_connection()
+    with get_sqlite_lock(), conn:
+        prepare_for_sqlite(df).to_sql(name, conn, if_exists='replace', index=False)
+    return True
+
+def append_table_sqlite(df, name):
+    if df.empty:
+        return True
+    conn = get_sqlite_connection()
+    with get_sqlite_lock(), conn:
+        if sqlite_table_columns(conn, name):
+            sqlite_ensure_columns(conn, name, df.columns)
+        prepare_for_sqlite(df).to_sql(name, conn, if_exists='append', index=False)
+    return True
+
+def upsert_table_sqlite(df, name, key_cols):
+    """Ersetzt Zeilen mit gleichem Schlüssel und hängt neue an – in einer Transaktion."""
+    if df.empty:
+        return True
+    conn = get_sqlite_connection()
+    prepared = prepare_for_sqlite(df)
+    with get_sqlite_lock(), conn:
+        if sqlite_table_columns(conn, name):
+            sqlite_ensure_columns(conn, name, df.columns)
+            where = " AND ".join(f"{quote_ident(col)} = ?" for col in key_cols)
+            keys = prepared[key_cols].drop_duplicates().itertuples(index=False, name=None)
+            conn.executemany(f"DELETE FROM {quote_ident(name)} WHERE {where}", list(keys))
+        prepared.to_sql(name, conn, if_exists='append', index=False)
+    return True
+
+def delete_rows_sqlite(name, key_col, key):
+    conn = get_sqlite_connection()
+    with get_sqlite_lock(), conn:
+        if key_col in sqlite_table_columns(conn, name):
+            conn.execute(f"DELETE FROM {quote_ident(name)} WHERE {quote_ident(key_col)} = ?", (str(key),))
+    return True
+
+
+# ========================================
+# 💾 STORAGE-LAYER
+# ========================================
+# Backend-Auswahl über st.secrets, z.B.:
+#
+#   [storage]
+#   backend = "sqlite"          # "gsheets" (Standard) oder "sqlite"
+#   sqlite_path = "halle11.db"
+#   sync_to_sheets = true       # Schreibvorgänge zusätzlich nach Google Sheets spiegeln
+
+def get_storage_config():
+    context = get_background_context()
+    if context is not None:
+        return dict(context['storage']['config'])
+    return dict(st.secrets.get("storage", {}))
+
+def get_storage_backend():
+    backend = str(get_storage_config().get("backend", "gsheets")).lower()
+    return backend if backend in ("gsheets", "sqlite") else "gsheets"
+
+def sync_to_sheets_enabled():
+    return get_storage_backend() == "sqlite" and bool(get_storage_config().get("sync_to_sheets", False))
+
+def resolve_storage_context():
+    """Im Haupt-Thread: Konfiguration und Sheets-Verbindung für einen Hintergrund-Job auflösen."""
+    needs_sheets = get_storage_backend() == "gsheets" or sync_to_sheets_enabled()
+    return {'config': get_storage_config(), 'spreadsheet': get_gsheet_client() if needs_sheets else None}
+
+@st.cache_resource
+def get_sync_executor():
+    # Ein Worker → Sync-Aufträge pro Sheet bleiben in Reihenfolge
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-sync")
+
+def sync_table_to_sheets(mode, df, name):
+    """Spiegelt einen lokalen Schreibvorgang nach Google Sheets (läuft im Hintergrund)."""
+    if mode == 'append':
+        append_sheet_with_retry(df, name)
+    else:
+        # save/upsert/delete: lokaler Stand ist maßgeblich → komplette Tabelle spiegeln
+        save_sheet_with_retry(load_table_sqlite(name), name)
+
+def schedule_sheets_sync(mode, df, name):
+    if sync_to_sheets_enabled():
+        get_sync_executor().submit(sync_table_to_sheets, mode, df.copy(), name)
+
+# Versionszähler pro Sheet: ein Schreibvorgang auf X erhöht nur X.
+# Alle Caches bekommen die Versionen der Sheets, die sie lesen, als Argument –
+# ein neuer Stand ist damit ein neuer Cache-Key, ohne fremde Caches zu leeren.
+
+@st.cache_resource
+def get_sheet_versions():
+    return {}
+
+@st.cache_resource
+def get_sheet_versions_lock():
+    return threading.Lock()
+
+def sheet_version(name):
+    return get_sheet_versions().get(name, 0)
+
+def bump_sheet_version(name):
+    with get_sheet_versions_lock():
+        versions = get_sheet_versions()
+        versions[name] = versions.get(name, 0) + 1
+
+def loadsheet(name, cols=None):
+    return cached_call(loadsheet_cached, name, cols, sheet_version(name))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=64)  # 15 min cache to reduce API calls
+def loadsheet_cached(name, cols, version, max_retries=3):
+    for attempt in range(max_retries):
+        try:
+            if get_storage_backend() == "sqlite":
+                df = load_table_sqlite(name, cols)
+            else:
+                df = load_table_gsheets(name, cols)
+            
+            return apply_sheet_schema(df, name)
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                notify('warning', "⚠️ Rate Limit - warte 10s...")
+                time.sleep(10)
+            else:
+                break
+    return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+
+def load_partition(name, column, value, cols=None, max_retries=3):
+    """Lädt nur die Zeilen mit column == value (z.B. einen Tag) statt des ganzen Sheets."""
+    for attempt in range(max_retries):
+        try:
+            if get_storage_backend() == "sqlite":
+                df = load_partition_sqlite(name, column, value, cols)
+            else:
+                df = load_partition_gsheets(name, column, value, cols)
+            
+            return apply_sheet_schema(df, name)
+        except Exception as e:
+            if "429" in str(e) and attempt < max_retries - 1:
+                wait_time = 10 * (2 ** attempt)
+                notify('warning', f"⚠️ Rate Limit - warte {wait_time}s...")
+                time.sleep(wait_time)
+            else:
+                break
+    return pd.DataFrame(columns=cols) if cols else pd.DataFrame()
+
 def savesheet(df, name):
-    return save_sheet_with_retry(df, name)
+    if get_storage_backend() == "sqlite":
+        save_table_sqlite(df, name)
+        success = True
+        schedule_sheets_sync('save', df, name)
+    else:
+        success = save_sheet_with_retry(df, name)
+    bump_sheet_version(name)
+    if success and name in DEDUP_KEY_FUNCS:
+        reset_dedup_index(name, df)
+    return success
+
+def appendsheet(df, name):
+    if get_storage_backend() == "sqlite":
+        append_table_sqlite(df, name)
+        success = True
+        schedule_sheets_sync('append', df, name)
+    else:
+        success = append_sheet_with_retry(df, name)
+    bump_sheet_version(name)
+    if success and name in DEDUP_KEY_FUNCS:
+        record_dedup_hashes(name, df)
+    return success
+
+def upsertsheet(df, name, key_cols):
+    """Zeilen mit gleichem Schlüssel (key_cols) ersetzen, neue anhängen."""
+    if get_storage_backend() == "sqlite":
+        upsert_table_sqlite(df, name, key_cols)
+        bump_sheet_version(name)
+        schedule_sheets_sync('upsert', df, name)
+        return True
+    success = upsert_sheet_with_retry(df, name, key_cols)
+    bump_sheet_version(name)
+    return success
+
+def upsert_row(row, name, key_col):
+    """Einzelne Zeile per Schlüssel schreiben – ohne das Sheet komplett neu zu schreiben."""
+    if get_storage_backend() == "sqlite":
+        row_df = pd.DataFrame([row])
+        upsert_table_sqlite(row_df, name, [key_col])
+        bump_sheet_version(name)
+        schedule_sheets_sync('upsert', row_df, name)
+        return True
+    success = upsert_row_gsheets(row, name, key_col)
+    bump_sheet_version(name)
+    return success
+
+def delete_row(name, key_col, key):
+    if get_storage_backend() == "sqlite":
+        delete_rows_sqlite(name, key_col, key)
+        bump_sheet_version(name)
+        schedule_sheets_sync('delete', pd.DataFrame(), name)
+        return True
+    success = delete_rows_gsheets(name, key_col, key)
+    bump_sheet_version(name)
+    return success
+
+# ========================================
+# 🔑 DEDUP-INDEX
+# ========================================
+# Pro Tabelle ein Set aus 64-bit-Hashes der Dedup-Schlüssel (Sheet dedup_index: table, hash).
+# appendsheet/savesheet pflegen es mit, neue Uploads werden in O(neue Zeilen) geprüft statt
+# jedes Mal die komplette Historie zu laden und neu zu verschlüsseln. Die Historie wird nur
+# einmal gelesen, falls für eine Tabelle noch kein Index existiert.
+# Hashes als "h" + Hex gespeichert: Sheets würde reine Zahlen > 2^53 runden.
+
+DEDUP_INDEX_COLUMNS = ['table', 'hash']
+
+def buchungen_dedup_keys(df):
+    return df['analysis_date'].astype(str) + '|' + df['Name_norm'].astype(str) + '|' + df['Service_Zeit'].astype(str)
+
+def checkins_dedup_keys(df):
+    return df['analysis_date'].astype(str) + '|' + df['Name_norm'].astype(str) + '|' + df['Checkin_Zeit'].astype(str)
+
+def playtomic_raw_dedup_keys(df):
+    payment_id = df['Payment id'].astype(object)
+    club_id = df['Club payment id'].astype(str) if 'Club payment id' in df.columns else pd.Series('', index=df.index)
+    # wie f"{payment_id}|{club_id}" if payment_id else f"CLUB-{club_id}"
+    return pd.Series(np.where(payment_id.astype(bool), payment_id.astype(str) + '|' + club_id, 'CLUB-' + club_id), index=df.index)
+
+DEDUP_KEY_FUNCS = {
+    'buchungen': buchungen_dedup_keys,
+    'checkins': checkins_dedup_keys,
+    'playtomic_raw': playtomic_raw_dedup_keys,
+}
+
+def dedup_hashes(name, df):
+    """Hash-Spalte für df (gleicher Index); None, wenn Schlüsselspalten fehlen."""
+    try:
+        keys = DEDUP_KEY_FUNCS[name](df)
+    except KeyError:
+        return None
+    hashed = pd.util.hash_pandas_object(keys, index=False).values
+    return pd.Series([f"h{h:016x}" for h in hashed], index=df.index, dtype=object)
+
+@st.cache_resource
+def get_dedup_indexes():
+    return {'lock': threading.Lock(), 'tables': {}}
+
+def get_dedup_index(name):
+    indexes = get_dedup_indexes()
+    with indexes['lock']:
+        if name in indexes['tables']:
+            return indexes['tables'][name]
+        
+        stored = loadsheet("dedup_index", DEDUP_INDEX_COLUMNS)
+        hashes = set()
+        if not stored.empty and 'table' in stored.columns:
+            hashes = set(stored.loc[stored['table'].astype(str) == name, 'hash'].astype(str))
+        
+        if not hashes:
+            # Einmaliger Aufbau aus der vorhandenen Historie
+            existing = loadsheet(name)
+            existing_hashes = dedup_hashes(name, existing) if not existing.empty else None
+            if existing_hashes is not None:
+                hashes = set(existing_hashes)
+                if hashes:
+                    appendsheet(pd.DataFrame({'table': name, 'hash': sorted(hashes)}, columns=DEDUP_INDEX_COLUMNS), "dedup_index")
+        
+        indexes['tables'][name] = hashes
+        return hashes
+
+def filter_new_rows(df, name):
+    """Nur Zeilen, deren Schlüssel noch nicht in name gespeichert ist."""
+    hashes = dedup_hashes(name, df)
+    if hashes is None:
+        return df
+    index = get_dedup_index(name)
+    return df[[h not in index for h in hashes]]
+
+def record_dedup_hashes(name, df):
+    hashes = dedup_hashes(name, df)
+    if hashes is None or hashes.empty:
+        return
+    index = get_dedup_index(name)
+    with get_dedup_indexes()['lock']:
+        new_hashes = sorted(set(hashes) - index)
+        index.update(new_hashes)
+    if new_hashes:
+        appendsheet(pd.DataFrame({'table': name, 'hash': new_hashes}, columns=DEDUP_INDEX_COLUMNS), "dedup_index")
+
+def reset_dedup_index(name, df):
+    """Nach savesheet: Index der Tabelle komplett durch die Schlüssel von df ersetzen."""
+    hashes = dedup_hashes(name, df)
+    hashes = sorted(set(hashes)) if hashes is not None else []
+    
+    stored = loadsheet("dedup_index", DEDUP_INDEX_COLUMNS)
+    if not stored.empty and 'table' in stored.columns:
+        stored = stored[stored['table'].astype(str) != name]
+    else:
+        stored = pd.DataFrame(columns=DEDUP_INDEX_COLUMNS)
+    savesheet(pd.concat([stored, pd.DataFrame({'table': name, 'hash': hashes}, columns=DEDUP_INDEX_COLUMNS)], ignore_index=True), "dedup_index")
+    
+    indexes = get_dedup_indexes()
+    with indexes['lock']:
+        indexes['tables'][name] = set(hashes)
 
 def save_playtomic_raw(df):
+    """Speichert neue Rohdaten und schreibt den Umsatz-Cube fort. → Anzahl neuer Zeilen, None bei Fehler."""
     try:
-        existing = loadsheet("playtomic_raw")
-        
-        if not existing.empty and 'Payment id' in existing.columns and 'Payment id' in df.columns:
-            def make_key(d):
-                payment_id = d.get('Payment id', '')
-                club_id = d.get('Club payment id', '')
-                return f"{payment_id}|{club_id}" if payment_id else f"CLUB-{club_id}"
-            
-            existing['_key'] = existing.apply(make_key, axis=1)
-            df['_key'] = df.apply(make_key, axis=1)
-            
-            existing_keys = set(existing['_key'].dropna())
-            df_new = df[~df['_key'].isin(existing_keys)].copy()
-            df_new = df_new.drop('_key', axis=1)
-            
-            if not df_new.empty:
-                existing = existing.drop('_key', axis=1)
-                df_combined = pd.concat([existing, df_new], ignore_index=True)
-                savesheet(df_combined, "playtomic_raw")
-                st.success(f"✅ {len(df_new)} neue Einträge!")
-                return True
-            else:
-                st.info("ℹ️ Keine neuen Daten")
-                return False
+        df = normalize_playtomic_raw(df)
+        
+        if get_dedup_index("playtomic_raw") and 'Payment id' in df.columns:
+            df_new = filter_new_rows(df, "playtomic_raw").copy()
+            
+            if df_new.empty:
+                notify('info', "ℹ️ Keine neuen Daten")
+                return 0
+            # Cube nur fortschreiben, wenn die Zeilen wirklich gespeichert sind – sonst zählt
+            # der nächste Upload denselben Umsatz ein zweites Mal
+            if not appendsheet(df_new, "playtomic_raw"):
+                notify('error', "❌ Rohdaten konnten nicht gespeichert werden")
+                return None
+            update_revenue_cube(df_new)
+            notify('success', f"✅ {len(df_new)} neue Einträge!")
+            return len(df_new)
         else:
-            savesheet(df, "playtomic_raw")
-            st.success(f"✅ {len(df)} Einträge!")
-            return True
+            if not savesheet(df, "playtomic_raw"):
+                notify('error', "❌ Rohdaten konnten nicht gespeichert werden")
+                return None
+            savesheet(build_revenue_cube(df), "revenue_cube")
+            notify('success', f"✅ {len(df)} Einträge!")
+            return len(df)
             
     except Exception as e:
-        st.error(f"❌ Fehler: {e}")
-        return False
+        notify('error', f"❌ Fehler: {e}")
+        return None
+
+
+# ========================================
+# ✅ CORRECTIONS-STORE
+# ========================================
+
+CORRECTIONS_COLUMNS = ['key', 'date', 'behoben', 'timestamp']
+
+def get_corrections_index():
+    return build_corrections_index(sheet_version("corrections"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)
+def build_corrections_index(version):
+    """key → behoben (bool) für alle Corrections, einmal pro Stand des corrections-Sheets."""
+    corr = loadsheet("corrections", CORRECTIONS_COLUMNS)
+    index = {}
+    if not corr.empty and 'key' in corr.columns:
+        behoben = corr['behoben'] if 'behoben' in corr.columns else pd.Series(False, index=corr.index)
+        for key, val in zip(corr['key'].astype(str).map(canonical_fehler_key), behoben):
+            index.setdefault(key, is_behoben_value(val))  # erster Eintrag gewinnt (wie bisher iloc[0])
+    return index
+
+def get_correction_key_variants():
+    return build_correction_key_variants(sheet_version("corrections"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)
+def build_correction_key_variants(version):
+    """Kanonischer Key → alle tatsächlich gespeicherten Schreibweisen ('..._2.5', '..._2.50', ...)."""
+    corr = loadsheet("corrections", CORRECTIONS_COLUMNS)
+    variants = {}
+    if not corr.empty and 'key' in corr.columns:
+        for raw in corr['key'].astype(str).unique():
+            variants.setdefault(canonical_fehler_key(raw), []).append(raw)
+    return variants
+
+def format_betrag(betrag):
+    """Betrag für Anzeige und Keys: immer zwei Nachkommastellen ('2.50')."""
+    try:
+        return f"{float(betrag):.2f}"
+    except (TypeError, ValueError):
+        return 'nan'
 
+def fehler_key(fehler_row):
+    return f"{fehler_row['Name_norm']}_{fehler_row['Datum']}_{format_betrag(fehler_row['Betrag'])}"
 
-def get_corrections_cached():
+def canonical_fehler_key(key):
     """
-    Lädt Corrections mit Session-Cache um Rate Limits zu reduzieren.
-    Cache wird alle 60 Sekunden aktualisiert oder bei Änderungen invalidiert.
+    Alte Keys auf das aktuelle Format bringen: Betrag stand je nach Speicher als
+    '2.50', '2.5' oder float32-Artefakt '2.200000047683716' im Key.
     """
-    current_time = time.time()
-    cache_age = current_time - st.session_state.get('corrections_cache_time', 0)
-    
-    # Cache ist 60 Sekunden gültig
-    if st.session_state.get('corrections_cache') is not None and cache_age < 60:
-        return st.session_state.corrections_cache
-    
-    # Neu laden
-    corr = loadsheet("corrections", ['key', 'date', 'behoben', 'timestamp'])
-    st.session_state.corrections_cache = corr
-    st.session_state.corrections_cache_time = current_time
-    return corr
+    prefix, sep, betrag = key.rpartition('_')
+    if not sep:
+        return key
+    try:
+        return f"{prefix}_{float(betrag):.2f}"
+    except ValueError:
+        return key
+
+def make_fehler_keys(df):
+    """Correction-Keys f"{Name_norm}_{Datum}_{Betrag:.2f}" für alle Zeilen auf einmal."""
+    betrag = pd.to_numeric(df['Betrag'], errors='coerce').astype('float64').map('{:.2f}'.format)
+    return df['Name_norm'].astype(str) + '_' + df['Datum'].astype(str) + '_' + betrag
+
+def attach_correction_status(df, corrections_index):
+    """Hängt _key und _behoben (bool) in einem Durchgang an – ein Dict-Join statt Suche pro Zeile."""
+    df = df.copy()
+    df['_key'] = make_fehler_keys(df) if not df.empty else pd.Series(dtype=object)
+    df['_behoben'] = df['_key'].map(corrections_index).eq(True)
+    return df
 
+def migrate_stored_types():
+    """
+    Einmalige Migration: buchungen/checkins mit Zahl-Betrag, bool-Flags und Wochentag/Stunde neu schreiben,
+    Keys in corrections/whatsapp_log auf das aktuelle Betrag-Format bringen. Idempotent.
+    """
+    migrated = {}
+    for name in ("buchungen", "checkins"):
+        df = loadsheet(name)  # Schema übersetzt 'Ja'/'Nein' und Text-Beträge
+        if not df.empty:
+            if name == "buchungen":
+                df['Wochentag'], df['Stunde'] = stored_booking_time_columns(df)
+            savesheet(df, name)
+            migrated[name] = len(df)
+    
+    for name in ("corrections", "whatsapp_log"):
+        df = loadsheet(name)
+        if df.empty or 'key' not in df.columns:
+            continue
+        df = df.copy()
+        df['key'] = df['key'].astype(str).map(canonical_fehler_key)
+        if name == "corrections":
+            df = df.drop_duplicates(subset=['key'], keep='first')
+        savesheet(df, name)
+        migrated[name] = len(df)
+    return migrated
+
+# Der Index liest Keys kanonisch, gespeichert sein können aber noch alte Schreibweisen
+# (ohne vorherige Migration). Schreiben/Löschen trifft deshalb alle Varianten eines Keys,
+# sonst bliebe z.B. ein altes '..._2.5' neben dem neuen '..._2.50' stehen und gewänne im Index.
+
+def upsert_correction(key, date_str, behoben=True):
+    key = canonical_fehler_key(str(key))
+    for variant in get_correction_key_variants().get(key, []):
+        if variant != key and not delete_row("corrections", 'key', variant):
+            return False
+    row = {'key': key, 'date': date_str, 'behoben': behoben, 'timestamp': datetime.now().isoformat()}
+    return upsert_row(row, "corrections", 'key')
 
-def invalidate_corrections_cache():
-    """Invalidiert den Corrections-Cache nach Änderungen."""
-    st.session_state.corrections_cache = None
-    st.session_state.corrections_cache_time = 0
+def delete_correction(key):
+    key = canonical_fehler_key(str(key))
+    variants = get_correction_key_variants().get(key, [key])
+    return all([delete_row("corrections", 'key', variant) for variant in variants])
 
 
 # ========================================
 # REVENUE-FUNKTION MIT TENNIS/PADEL SPLIT
 # ========================================
 
-@st.cache_data(ttl=900, show_spinner=False)  # 15 min cache
+REVENUE_CUBE_COLUMNS = ['date', 'sport', 'category', 'total']
+REVENUE_CUBE_KEYS = ['date', 'sport', 'category']
+REVENUE_CATEGORIES = ['reservierung', 'baelle', 'schlaeger', 'sonstige']
+
+def parse_total_series(total):
+    """Vektorisierte Variante von parse_total: '12,50 €' → 12.5, Unlesbares → 0."""
+    cleaned = (total.astype(str).str.replace(',', '.', regex=False).str.replace('€', '', regex=False)
+               .str.replace(' ', '', regex=False).str.strip())
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0.0)
+
+def classify_product_sku(sku):
+    """Ordnet Product SKUs den Umsatz-Kategorien zu ('' für fehlende SKU)."""
+    sku_str = sku.astype(str)
+    category = np.select(
+        [
+            sku_str.str.contains('User booking', regex=False) | sku_str.str.contains('Open match', regex=False),
+            sku_str.str.contains('BALLS', regex=False),
+            sku_str.str.contains('RACKET', regex=False),
+        ],
+        ['reservierung', 'baelle', 'schlaeger'],
+        default='sonstige'
+    )
+    return pd.Series(np.where(sku.isna(), '', category), index=sku.index)
+
+def normalize_playtomic_raw(df):
+    """
+    Ergänzt Playtomic-Rohdaten einmalig beim Import um typisierte Spalten:
+    Service_date_clean (date), Total_clean (float), Sport_clean / Kategorie (categorical).
+    """
+    df = df.copy()
+    df['Service_date_clean'] = parse_dates_vectorized(df['Service date']) if 'Service date' in df.columns else None
+    df['Total_clean'] = parse_total_series(df['Total']) if 'Total' in df.columns else 0.0
+    if 'Sport' in df.columns:
+        df['Sport_clean'] = df['Sport'].astype(str).str.upper().where(df['Sport'].notna(), '')
+    else:
+        df['Sport_clean'] = ''
+    df['Sport_clean'] = df['Sport_clean'].astype('category')
+    sku = df['Product SKU'] if 'Product SKU' in df.columns else pd.Series(np.nan, index=df.index)
+    df['Kategorie'] = classify_product_sku(sku).astype('category')
+    return df
+
+def build_revenue_cube(raw_typed):
+    """Tages-Umsatzwürfel: Summe Total_clean je (Datum × Sport × Kategorie)."""
+    valid = raw_typed.dropna(subset=['Service_date_clean'])
+    if valid.empty:
+        return pd.DataFrame(columns=REVENUE_CUBE_COLUMNS)
+    cube = valid.groupby(['Service_date_clean', 'Sport_clean', 'Kategorie'], observed=True)['Total_clean'].sum().reset_index()
+    cube.columns = REVENUE_CUBE_COLUMNS
+    cube['date'] = cube['date'].astype(str)
+    return cube
+
+def update_revenue_cube(new_raw_typed):
+    """Addiert die Umsätze neuer Rohdaten-Zeilen auf den gespeicherten Würfel."""
+    delta = build_revenue_cube(new_raw_typed)
+    if delta.empty:
+        return
+    cube = loadsheet("revenue_cube", REVENUE_CUBE_COLUMNS)
+    if not cube.empty:
+        cube = cube[REVENUE_CUBE_COLUMNS].astype({'date': str, 'sport': str, 'category': str})
+        cube['total'] = pd.to_numeric(cube['total'], errors='coerce').fillna(0.0)
+        touched = cube.merge(delta[REVENUE_CUBE_KEYS], on=REVENUE_CUBE_KEYS)
+        delta = pd.concat([touched, delta]).groupby(REVENUE_CUBE_KEYS, as_index=False)['total'].sum()
+    upsertsheet(delta, "revenue_cube", REVENUE_CUBE_KEYS)
+
+def load_revenue_cube():
+    return load_revenue_cube_cached(sheet_version("revenue_cube"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=4)  # 15 min cache
+def load_revenue_cube_cached(version):
+    """Lädt den Umsatzwürfel (baut ihn einmalig aus playtomic_raw, falls er noch fehlt)."""
+    cube = loadsheet("revenue_cube", REVENUE_CUBE_COLUMNS)
+    if cube.empty:
+        raw_data = loadsheet("playtomic_raw")
+        if raw_data.empty:
+            return pd.DataFrame(columns=REVENUE_CUBE_COLUMNS)
+        cube = build_revenue_cube(normalize_playtomic_raw(raw_data))
+        savesheet(cube, "revenue_cube")
+    
+    cube = cube[REVENUE_CUBE_COLUMNS].copy()
+    cube['date'] = pd.to_datetime(cube['date'].astype(str), errors='coerce').dt.date
+    cube['total'] = pd.to_numeric(cube['total'], errors='coerce').fillna(0.0)
+    cube['sport'] = cube['sport'].astype(str).replace('nan', '').astype('category')
+    cube['category'] = cube['category'].astype(str).replace('nan', '').astype('category')
+    return cube.dropna(subset=['date'])
+
 def get_revenue_from_raw(date_str=None, start_date=None, end_date=None):
-    """Berechnet Umsätze aus Raw-Daten mit Tennis/Padel Unterscheidung."""
-    raw_data = loadsheet("playtomic_raw")
+    return revenue_from_cube(date_str, start_date, end_date, sheet_version("revenue_cube"))
+
+@st.cache_data(ttl=900, show_spinner=False)  # 15 min cache
+def revenue_from_cube(date_str, start_date, end_date, version):
+    """Berechnet Umsätze mit Tennis/Padel Unterscheidung aus dem vorberechneten Umsatzwürfel."""
+    cube = load_revenue_cube()
     
-    if raw_data.empty:
+    if cube.empty:
         return {'gesamt': 0, 'padel': 0, 'tennis': 0, 'reservierung': 0, 'baelle': 0, 'schlaeger': 0, 'sonstige': 0}
     
-    raw_data['Service_date_clean'] = raw_data['Service date'].apply(parse_date_safe)
-    raw_data = raw_data.dropna(subset=['Service_date_clean'])
-    
     if date_str:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-        filtered = raw_data[raw_data['Service_date_clean'] == date_obj]
+        filtered = cube[cube['date'] == date_obj]
     elif start_date and end_date:
-        filtered = raw_data[(raw_data['Service_date_clean'] >= start_date) & (raw_data['Service_date_clean'] <= end_date)]
+        filtered = cube[(cube['date'] >= start_date) & (cube['date'] <= end_date)]
     else:
-        filtered = raw_data
-    
-    def parse_total(total):
-        if pd.isna(total):
-            return 0
-        total_str = str(total).replace(',', '.').replace('€', '').replace(' ', '').strip()
-        try:
-            return float(total_str)
-        except:
-            return 0
+        filtered = cube
     
-    filtered['Total_clean'] = filtered['Total'].apply(parse_total)
-    gesamt = filtered['Total_clean'].sum()
+    by_sport = filtered.groupby('sport', observed=True)['total'].sum()
+    by_category = filtered.groupby('category', observed=True)['total'].sum()
     
-    revenue = {'gesamt': gesamt, 'padel': 0, 'tennis': 0, 'reservierung': 0, 'baelle': 0, 'schlaeger': 0, 'sonstige': 0}
-    
-    if 'Sport' in filtered.columns:
-        padel_data = filtered[filtered['Sport'].str.upper() == 'PADEL']
-        tennis_data = filtered[filtered['Sport'].str.upper() == 'TENNIS']
-        revenue['padel'] = padel_data['Total_clean'].sum()
-        revenue['tennis'] = tennis_data['Total_clean'].sum()
-    
-    if 'Product SKU' in filtered.columns:
-        for product in filtered['Product SKU'].unique():
-            if pd.isna(product):
-                continue
-            product_revenue = filtered[filtered['Product SKU'] == product]['Total_clean'].sum()
-            if 'User booking' in str(product) or 'Open match' in str(product):
-                revenue['reservierung'] += product_revenue
-            elif 'BALLS' in str(product):
-                revenue['baelle'] += product_revenue
-            elif 'RACKET' in str(product):
-                revenue['schlaeger'] += product_revenue
-            else:
-                revenue['sonstige'] += product_revenue
+    revenue = {'gesamt': float(filtered['total'].sum()), 'padel': 0, 'tennis': 0}
+    revenue['padel'] = float(by_sport.get('PADEL', 0))
+    revenue['tennis'] = float(by_sport.get('TENNIS', 0))
+    for category in REVENUE_CATEGORIES:
+        revenue[category] = float(by_category.get(category, 0))
     
     return revenue
 
-@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
 def get_unique_wellpass_checkins(date_str):
+    return unique_wellpass_checkins_cached(date_str, sheet_version("checkins"))
+
+@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
+def unique_wellpass_checkins_cached(date_str, version):
     """Cached unique check-in count for a date."""
-    checkins = loadsheet("checkins")
-    if checkins.empty or 'analysis_date' not in checkins.columns:
+    day_checkins = load_partition("checkins", "analysis_date", date_str)
+    if day_checkins.empty or 'Name_norm' not in day_checkins.columns:
         return 0
-    day_checkins = checkins[checkins['analysis_date'] == date_str]
-    return day_checkins['Name_norm'].nunique() if not day_checkins.empty else 0
+    return day_checkins['Name_norm'].nunique()
 
-@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
 def get_dates():
+    return get_dates_cached(sheet_version("buchungen"))
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=4)  # 5 min cache
+def get_dates_cached(version):
     """Cached list of available dates."""
     buchungen = loadsheet("buchungen", ['analysis_date'])
     if buchungen.empty or 'analysis_date' not in buchungen.columns:
@@ -1137,31 +2294,529 @@ def get_dates():
     dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in buchungen['analysis_date'].unique()]
     return sorted(dates, reverse=True)
 
-@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
-def load_snapshot(date_str):
-    """Cached snapshot for a specific date."""
-    buchungen = loadsheet("buchungen", ['analysis_date'])
+def load_snapshot(date_str):
+    return load_snapshot_cached(date_str, sheet_version("buchungen"))
+
+@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
+def load_snapshot_cached(date_str, version):
+    """Cached snapshot for a specific date (nur die Zeilen dieses Tages)."""
+    data = load_partition("buchungen", "analysis_date", date_str, ['analysis_date'])
+    return data if not data.empty else None
+
+def load_checkins_snapshot(date_str):
+    return load_checkins_snapshot_cached(date_str, sheet_version("checkins"))
+
+@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
+def load_checkins_snapshot_cached(date_str, version):
+    """Cached check-ins for a specific date (nur die Zeilen dieses Tages)."""
+    data = load_partition("checkins", "analysis_date", date_str, ['analysis_date'])
+    return data if not data.empty else None
+
+WOCHENTAG_NAMEN = ['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag', 'Freitag', 'Samstag', 'Sonntag']
+
+def booking_time_columns(datum, zeit):
+    """Wochentag (0=Mo) und Stunde als int8 aus Datum- und 'HH:MM'-Text; -1 = unbekannt."""
+    dates = pd.to_datetime(pd.Series(datum).astype(str).values, errors='coerce')
+    wochentag = np.where(dates.notna(), dates.dayofweek, -1).astype('int8')
+    zeit = pd.Series(zeit)
+    zeit = zeit.astype(object).where(zeit.notna(), '').astype(str)
+    stunde = pd.to_numeric(zeit.str.extract(r'^\s*(\d{1,2}):', expand=False), errors='coerce').values
+    stunde = np.where((stunde >= 0) & (stunde <= 23), stunde, -1).astype('int8')
+    return wochentag, stunde
+
+def stored_booking_time_columns(buchungen):
+    """Gespeicherte Wochentag/Stunde; ältere Zeilen ohne Werte (-1) aus Datum/Service_Zeit nachrechnen."""
+    if 'Wochentag' in buchungen.columns and 'Stunde' in buchungen.columns:
+        wochentag = buchungen['Wochentag'].to_numpy(dtype='int8', copy=True)
+        stunde = buchungen['Stunde'].to_numpy(dtype='int8', copy=True)
+    else:
+        wochentag = np.full(len(buchungen), -1, dtype='int8')
+        stunde = np.full(len(buchungen), -1, dtype='int8')
+    
+    missing = (wochentag < 0) | (stunde < 0)
+    if missing.any():
+        zeit = buchungen['Service_Zeit'].values[missing] if 'Service_Zeit' in buchungen.columns else np.full(missing.sum(), '')
+        wochentag[missing], stunde[missing] = booking_time_columns(buchungen['analysis_date'].values[missing], zeit)
+    return wochentag, stunde
+
+def derive_buchungen_columns(buchungen):
+    """Typisierte Zusatzspalten: Datum, Wochentag, Stunde sowie Betrag_num/is_*-Aliase der gespeicherten Spalten."""
+    dates = pd.to_datetime(buchungen['analysis_date'].astype(str), errors='coerce')
+    buchungen = buchungen[dates.notna().values].copy()
+    dates = dates[dates.notna()]
+    
+    buchungen['date_obj'] = dates.dt.date.values
+    buchungen['Betrag_num'] = buchungen['Betrag'].fillna(0.0)
+    
+    # Wochentag/Stunde werden beim Import gespeichert; nur ältere Zeilen ohne Werte nachrechnen
+    wochentag, stunde = stored_booking_time_columns(buchungen)
+    buchungen['Wochentag'] = wochentag
+    buchungen['Wochentag_Name'] = np.array(WOCHENTAG_NAMEN, dtype=object)[wochentag]
+    buchungen['Stunde'] = pd.Series(stunde, index=buchungen.index).where(stunde >= 0)  # NaN = keine Uhrzeit
+    
+    for flag, col in [('is_relevant', 'Relevant'), ('has_checkin', 'Check-in'), ('is_fehler', 'Fehler'), ('is_mitarbeiter', 'Mitarbeiter')]:
+        buchungen[flag] = buchungen[col].values if col in buchungen.columns else False
+    return buchungen
+
+def derive_checkins_columns(checkins):
+    checkins = checkins.copy()
+    checkins['date_obj'] = pd.to_datetime(checkins['analysis_date'].astype(str), errors='coerce').dt.date
+    return checkins
+
+def get_data_context():
+    return build_data_context(sheet_version("buchungen"), sheet_version("checkins"))
+
+@st.cache_resource(ttl=900, show_spinner=False, max_entries=2)
+def build_data_context(buchungen_version, checkins_version):
+    """
+    Buchungen + Check-ins einmal pro Datenstand laden und typisieren.
+    Wird von allen Tabs geteilt – NUR LESEN, für Änderungen vorher .copy()!
+    """
+    buchungen = loadsheet("buchungen")
+    checkins = loadsheet("checkins")
+    if not buchungen.empty and 'analysis_date' in buchungen.columns:
+        buchungen = derive_buchungen_columns(buchungen)
+    if not checkins.empty and 'analysis_date' in checkins.columns:
+        checkins = derive_checkins_columns(checkins)
+    return {'buchungen': buchungen, 'checkins': checkins}
+
+
+# ========================================
+# 👥 SPIELER-AGGREGAT
+# ========================================
+# player_daily: eine Zeile pro (Tag × Spieler) mit Buchungen, Umsatz, Relevant, Check-in, Fehler.
+# Wird beim Import um die neuen Buchungen ergänzt (wie revenue_cube); Spieler-Statistiken
+# für beliebige Zeiträume sind damit ein groupby-sum über vorab aggregierte Zeilen.
+
+PLAYER_DAILY_COLUMNS = ['date', 'Name', 'mitarbeiter', 'buchungen', 'umsatz', 'relevant', 'mit_checkin', 'fehler']
+PLAYER_DAILY_KEYS = ['date', 'Name']
+PLAYER_DAILY_SUMS = ['buchungen', 'umsatz', 'relevant', 'mit_checkin', 'fehler']
+
+def build_player_daily(buchungen):
+    if buchungen.empty:
+        return pd.DataFrame(columns=PLAYER_DAILY_COLUMNS)
+    rows = pd.DataFrame({
+        'date': buchungen['analysis_date'].astype(str),
+        'Name': buchungen['Name'].astype(str),
+        'mitarbeiter': buchungen['Mitarbeiter'].astype(bool),
+        'buchungen': 1,
+        'umsatz': pd.to_numeric(buchungen['Betrag'], errors='coerce').fillna(0.0),
+        'relevant': buchungen['Relevant'].astype(int),
+        'mit_checkin': buchungen['Check-in'].astype(int),
+        'fehler': buchungen['Fehler'].astype(int),
+    })
+    aggregations = {col: 'sum' for col in PLAYER_DAILY_SUMS}
+    aggregations['mitarbeiter'] = 'any'
+    return rows.groupby(PLAYER_DAILY_KEYS, as_index=False).agg(aggregations)[PLAYER_DAILY_COLUMNS]
+
+def update_player_daily(new_buchungen):
+    """Addiert neu gespeicherte Buchungen auf die betroffenen (Tag × Spieler)-Zeilen."""
+    delta = build_player_daily(new_buchungen)
+    if delta.empty:
+        return
+    daily = loadsheet("player_daily", PLAYER_DAILY_COLUMNS)
+    if daily.empty:
+        # Noch kein Aggregat → einmal komplett aus buchungen (enthält die neuen Zeilen schon)
+        savesheet(build_player_daily(loadsheet("buchungen")), "player_daily")
+        return
+    
+    touched = daily[PLAYER_DAILY_COLUMNS].merge(delta[PLAYER_DAILY_KEYS], on=PLAYER_DAILY_KEYS)
+    aggregations = {col: 'sum' for col in PLAYER_DAILY_SUMS}
+    aggregations['mitarbeiter'] = 'any'
+    delta = pd.concat([touched, delta]).groupby(PLAYER_DAILY_KEYS, as_index=False).agg(aggregations)[PLAYER_DAILY_COLUMNS]
+    upsertsheet(delta, "player_daily", PLAYER_DAILY_KEYS)
+
+def load_player_daily():
+    return load_player_daily_cached(sheet_version("player_daily"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=4)  # 15 min cache
+def load_player_daily_cached(version):
+    """Lädt player_daily (baut es einmalig aus buchungen, falls es noch fehlt) mit date_obj."""
+    daily = loadsheet("player_daily", PLAYER_DAILY_COLUMNS)
+    if daily.empty:
+        buchungen = loadsheet("buchungen")
+        if buchungen.empty or 'analysis_date' not in buchungen.columns:
+            return pd.DataFrame(columns=PLAYER_DAILY_COLUMNS + ['date_obj'])
+        daily = build_player_daily(buchungen)
+        savesheet(daily, "player_daily")
+    
+    daily = daily[PLAYER_DAILY_COLUMNS].copy()
+    daily['date_obj'] = pd.to_datetime(daily['date'], errors='coerce').dt.date
+    return daily.dropna(subset=['date_obj'])
+
+def active_players(daily, start_date, end_date=None):
+    """Normalisierte Namen aller Spieler mit Buchung ab start_date (bis ausschließlich end_date)."""
+    period = daily[daily['date_obj'] >= start_date]
+    if end_date is not None:
+        period = period[period['date_obj'] < end_date]
+    return set(period['Name'].drop_duplicates().map(normalize_name))
+
+def player_stats_for_period(daily, start_date=None):
+    """Spieler-Statistik eines Zeitraums (ohne Mitarbeiter) aus player_daily."""
+    period = daily[~daily['mitarbeiter']]
+    if start_date is not None:
+        period = period[period['date_obj'] >= start_date]
+    stats = period.groupby('Name').agg(
+        Buchungen=('buchungen', 'sum'),
+        Umsatz=('umsatz', 'sum'),
+        Relevante=('relevant', 'sum'),
+        Mit_Checkin=('mit_checkin', 'sum'),
+        Fehler=('fehler', 'sum'),
+    ).reset_index()
+    stats['Ist_Wellpass'] = stats['Relevante'] > 0
+    return stats
+
+# Suchindex für die Sidebar-Suche: Bigramme → Spieler-Positionen (nach Buchungen sortiert),
+# dazu die Zusammenfassung pro Spieler. Nur lesen – das Objekt wird über Reruns geteilt.
+SEARCH_NGRAM = 2
+
+def get_player_search_index():
+    return build_player_search_index(sheet_version("player_daily"))
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def build_player_search_index(version):
+    daily = load_player_daily()
+    stats = daily.groupby('Name', sort=False).agg(
+        Buchungen=('buchungen', 'sum'),
+        Letzte=('date', 'max'),
+        Umsatz=('umsatz', 'sum'),
+    ).reset_index()
+    stats = stats.sort_values('Buchungen', ascending=False, kind='stable').reset_index(drop=True)
+    
+    names = stats['Name'].str.lower().tolist()
+    grams = {}
+    for i, name in enumerate(names):
+        for gram in {name[j:j + SEARCH_NGRAM] for j in range(len(name) - SEARCH_NGRAM + 1)}:
+            grams.setdefault(gram, []).append(i)
+    return {'stats': stats, 'names': names, 'grams': grams}
+
+def search_players(index, query, limit=5):
+    """Top-Treffer (meiste Buchungen zuerst); ohne Teilstring-Treffer Fuzzy-Suche. → (DataFrame, fuzzy)"""
+    q = query.lower().strip()
+    names = index['names']
+    if len(q) < SEARCH_NGRAM or not names:
+        return index['stats'].iloc[:0], False
+    
+    postings = [index['grams'].get(q[j:j + SEARCH_NGRAM]) for j in range(len(q) - SEARCH_NGRAM + 1)]
+    if all(postings):
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        hits = [i for i in sorted(candidates) if q in names[i]][:limit]
+        if hits:
+            return index['stats'].iloc[hits], False
+    
+    # Tippfehler: ähnlichste Namen, bei gleichem Score der Spieler mit mehr Buchungen
+    matches = process.extract(q, names, scorer=fuzz.partial_ratio, score_cutoff=80, limit=None)
+    hits = [i for _, _, i in sorted(matches, key=lambda m: (-m[1], m[2]))[:limit]]
+    return index['stats'].iloc[hits], True
+
+
+# ========================================
+# 🗓️ TAGES-ROLLUP
+# ========================================
+# daily_rollup: eine Zeile pro Tag mit Umsatz, Buchungen, Relevant, Fehler und eindeutigen
+# Wellpass-Check-ins. Beim Import werden nur die importierten Tage neu gerechnet (aus ihren
+# Partitionen) – abgeschlossene Monate bleiben unangetastet. Monatsansichten lesen nur noch
+# ihre ~30 Zeilen statt die ganze Historie zu filtern.
+
+DAILY_ROLLUP_COLUMNS = ['date', 'umsatz', 'buchungen', 'relevant', 'fehler', 'checkins']
+DAILY_ROLLUP_PARTITION_DATES = 5  # mehr Tage → jedes Sheet einmal laden statt Partition pro Tag
+
+def build_daily_rollup(buchungen, checkins):
+    parts = []
+    if not buchungen.empty and 'analysis_date' in buchungen.columns:
+        b = pd.DataFrame({
+            'date': buchungen['analysis_date'].astype(str),
+            'umsatz': pd.to_numeric(buchungen['Betrag'], errors='coerce').fillna(0.0),
+            'relevant': buchungen['Relevant'].astype(int),
+            'fehler': buchungen['Fehler'].astype(int),
+        })
+        parts.append(b.groupby('date').agg(
+            umsatz=('umsatz', 'sum'), buchungen=('date', 'size'),
+            relevant=('relevant', 'sum'), fehler=('fehler', 'sum'),
+        ))
+    if not checkins.empty and 'analysis_date' in checkins.columns:
+        # Wellpass: jeder Spieler zählt einmal pro Tag
+        unique = checkins.drop_duplicates(subset=['analysis_date', 'Name_norm'])
+        parts.append(unique.groupby(unique['analysis_date'].astype(str).rename('date')).size().rename('checkins').to_frame())
+    if not parts:
+        return pd.DataFrame(columns=DAILY_ROLLUP_COLUMNS)
+    
+    rollup = pd.concat(parts, axis=1).reindex(columns=DAILY_ROLLUP_COLUMNS[1:]).fillna(0)
+    rollup = rollup.astype({col: 'int64' for col in DAILY_ROLLUP_COLUMNS[2:]})
+    return rollup.rename_axis('date').reset_index()[DAILY_ROLLUP_COLUMNS]
+
+def rows_for_dates(df, dates):
+    if df.empty or 'analysis_date' not in df.columns:
+        return df
+    return df[df['analysis_date'].astype(str).isin(dates)]
+
+def refresh_daily_rollup(dates):
+    """Rechnet die Rollup-Zeilen der angegebenen Tage aus deren buchungen/checkins-Partitionen neu."""
+    dates = sorted({str(d) for d in dates})
+    if not dates:
+        return
+    rollup = loadsheet("daily_rollup", DAILY_ROLLUP_COLUMNS)
+    if rollup.empty:
+        # Noch kein Rollup → einmal komplett aufbauen
+        savesheet(build_daily_rollup(loadsheet("buchungen"), loadsheet("checkins")), "daily_rollup")
+        return
+    
+    if len(dates) > DAILY_ROLLUP_PARTITION_DATES:
+        # Mehrmonats-Import: eine Partition pro Tag wären hunderte API-Calls
+        buchungen, checkins = (rows_for_dates(loadsheet(name), dates) for name in ("buchungen", "checkins"))
+    else:
+        buchungen = pd.concat([load_partition("buchungen", "analysis_date", d) for d in dates], ignore_index=True)
+        checkins = pd.concat([load_partition("checkins", "analysis_date", d) for d in dates], ignore_index=True)
+    upsertsheet(build_daily_rollup(buchungen, checkins), "daily_rollup", ['date'])
+
+def load_daily_rollup():
+    return load_daily_rollup_cached(sheet_version("daily_rollup"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=4)  # 15 min cache
+def load_daily_rollup_cached(version):
+    """Lädt daily_rollup (baut es einmalig aus buchungen/checkins, falls es noch fehlt) mit date_obj."""
+    rollup = loadsheet("daily_rollup", DAILY_ROLLUP_COLUMNS)
+    if rollup.empty:
+        rollup = build_daily_rollup(loadsheet("buchungen"), loadsheet("checkins"))
+        if rollup.empty:
+            return pd.DataFrame(columns=DAILY_ROLLUP_COLUMNS + ['date_obj'])
+        savesheet(rollup, "daily_rollup")
+    
+    rollup = rollup[DAILY_ROLLUP_COLUMNS].copy()
+    rollup['date_obj'] = pd.to_datetime(rollup['date'], errors='coerce').dt.date
+    return rollup.dropna(subset=['date_obj'])
+
+def month_rollup(rollup, first_day, last_day):
+    """Tageszeilen eines Monats aus dem Rollup."""
+    return rollup[(rollup['date_obj'] >= first_day) & (rollup['date_obj'] <= last_day)]
+
+
+# ========================================
+# ⏰ NACHFRAGE PRO WOCHE
+# ========================================
+# demand_weekly: Buchungen pro (Woche × Wochentag × Stunde), beim Import fortgeschrieben.
+# Geladen wird es als Stapel von 7×24-Matrizen (eine pro Woche) – die Heatmap für einen
+# Zeitraum ist dann eine NumPy-Summe über die passenden Wochen.
+
+DEMAND_WEEKLY_COLUMNS = ['week', 'Wochentag', 'Stunde', 'buchungen']
+DEMAND_WEEKLY_KEYS = ['week', 'Wochentag', 'Stunde']
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def build_demand_weekly(buchungen):
     if buchungen.empty or 'analysis_date' not in buchungen.columns:
-        return None
-    data = buchungen[buchungen['analysis_date'] == date_str]
-    return data if not data.empty else None
+        return pd.DataFrame(columns=DEMAND_WEEKLY_COLUMNS)
+    wochentag, stunde = stored_booking_time_columns(buchungen)
+    dates = pd.to_datetime(buchungen['analysis_date'].astype(str).values, errors='coerce')
+    valid = dates.notna() & (wochentag >= 0) & (stunde >= 0)
+    dates = dates[valid]
+    rows = pd.DataFrame({
+        'week': (dates - pd.to_timedelta(dates.dayofweek, unit='D')).strftime('%Y-%m-%d'),
+        'Wochentag': dates.dayofweek.values,
+        'Stunde': stunde[valid].astype(int),
+    })
+    return rows.groupby(DEMAND_WEEKLY_KEYS).size().rename('buchungen').reset_index()[DEMAND_WEEKLY_COLUMNS]
+
+def update_demand_weekly(new_buchungen):
+    """
+    Addiert neu gespeicherte Buchungen auf die betroffenen (Woche × Wochentag × Stunde)-Zeilen.
+    Nur nach erfolgreichem appendsheet aufrufen (siehe append_new_rows): der Erstaufbau liest
+    buchungen, und fehlgeschlagene Zeilen kämen beim nächsten Import ein zweites Mal dazu.
+    """
+    delta = build_demand_weekly(new_buchungen)
+    if delta.empty:
+        return
+    demand = loadsheet("demand_weekly", DEMAND_WEEKLY_COLUMNS)
+    if demand.empty:
+        # Noch keine Wochenmatrizen → einmal komplett aus buchungen
+        savesheet(build_demand_weekly(loadsheet("buchungen")), "demand_weekly")
+        return
+    
+    touched = demand[DEMAND_WEEKLY_COLUMNS].merge(delta[DEMAND_WEEKLY_KEYS], on=DEMAND_WEEKLY_KEYS)
+    delta = pd.concat([touched, delta]).groupby(DEMAND_WEEKLY_KEYS, as_index=False)['buchungen'].sum()[DEMAND_WEEKLY_COLUMNS]
+    upsertsheet(delta, "demand_weekly", DEMAND_WEEKLY_KEYS)
+
+def load_demand_slabs():
+    return load_demand_slabs_cached(sheet_version("demand_weekly"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)  # 15 min cache
+def load_demand_slabs_cached(version):
+    """→ {'weeks': sortierte Wochen-Montage, 'slabs': Array (Wochen × 7 × 24)}."""
+    demand = loadsheet("demand_weekly", DEMAND_WEEKLY_COLUMNS)
+    if demand.empty:
+        demand = build_demand_weekly(loadsheet("buchungen"))
+        if not demand.empty:
+            savesheet(demand, "demand_weekly")
+    
+    demand = demand[demand['Wochentag'].between(0, 6) & demand['Stunde'].between(0, 23)]
+    weeks, week_idx = np.unique(pd.to_datetime(demand['week'].astype(str), errors='coerce').dt.date.values.astype(object), return_inverse=True)
+    slabs = np.zeros((len(weeks), 7, 24), dtype=np.int64)
+    np.add.at(slabs, (week_idx, demand['Wochentag'].values.astype(int), demand['Stunde'].values.astype(int)), demand['buchungen'].values.astype(np.int64))
+    return {'weeks': weeks, 'slabs': slabs}
+
+def demand_matrix(demand, start_date=None, end_date=None):
+    """7×24-Buchungsmatrix (Wochentag × Stunde) für alle Wochen, die den Zeitraum berühren."""
+    weeks = demand['weeks']
+    mask = np.ones(len(weeks), dtype=bool)
+    if start_date is not None:
+        mask &= weeks >= week_start(start_date)
+    if end_date is not None:
+        mask &= weeks <= end_date
+    return demand['slabs'][mask].sum(axis=0) if mask.any() else np.zeros((7, 24), dtype=np.int64)
 
-@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
-def load_checkins_snapshot(date_str):
-    """Cached check-ins for a specific date."""
-    checkins = loadsheet("checkins", ['analysis_date'])
-    if checkins.empty or 'analysis_date' not in checkins.columns:
+
+# ========================================
+# 🔮 PROGNOSE
+# ========================================
+# Tagesumsatz (inkl. Wellpass) und Buchungen per kleinste Quadrate: Achsenabschnitt, linearer
+# Trend, Wochentag und bundesweite Feiertage. Gefittet wird auf dem daily_rollup, einmal pro
+# Datenstand. Der Backtest vergleicht mit dem früheren Wochentag-Durchschnitt (letzte 8 Wochen).
+
+FORECAST_FIT_DAYS = 182          # Trainingsfenster (~6 Monate)
+FORECAST_MIN_DAYS = 21           # darunter keine Prognose
+FORECAST_HORIZON = 14            # Backtest-Horizont in Tagen
+FORECAST_BACKTEST_ORIGINS = 8    # Anzahl Backtest-Startpunkte (wöchentlich)
+
+def easter_sunday(year):
+    """Ostersonntag (gregorianisch, Meeus/Jones/Butcher)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def german_holidays(years):
+    """Bundesweite Feiertage (ohne Landesfeiertage) der angegebenen Jahre."""
+    holidays = set()
+    for year in map(int, years):
+        easter = easter_sunday(year)
+        holidays |= {date(year, 1, 1), date(year, 5, 1), date(year, 10, 3), date(year, 12, 25), date(year, 12, 26)}
+        # Karfreitag, Ostermontag, Christi Himmelfahrt, Pfingstmontag
+        holidays |= {easter + timedelta(days=offset) for offset in (-2, 1, 39, 50)}
+    return holidays
+
+def forecast_features(dates, t0):
+    """Designmatrix: Achsenabschnitt, Trend (Wochen ab t0), Wochentag-Dummies Di–So, Feiertag."""
+    dates = pd.to_datetime(pd.Series(list(dates)))
+    weekday = dates.dt.dayofweek.values
+    X = np.zeros((len(dates), 9))
+    X[:, 0] = 1.0
+    X[:, 1] = (dates - pd.Timestamp(t0)).dt.days.values / 7.0
+    rows = np.flatnonzero(weekday > 0)
+    X[rows, 1 + weekday[rows]] = 1.0
+    X[:, 8] = dates.dt.date.isin(german_holidays(set(dates.dt.year))).values
+    return X
+
+def forecast_series(rollup, until=None):
+    """Tagesreihe Gesamt-Umsatz (Buchungen + Wellpass) und Buchungen – ohne den laufenden Tag."""
+    series = rollup[rollup['date_obj'] < (until or date.today())]
+    return pd.DataFrame({
+        'date_obj': series['date_obj'].values,
+        'gesamt': (series['umsatz'] + series['checkins'] * WELLPASS_WERT).values.astype(float),
+        'buchungen': series['buchungen'].values.astype(float),
+    })
+
+def fit_forecast(series):
+    """Fit auf den letzten FORECAST_FIT_DAYS Tagen; None bei zu wenig Daten."""
+    if series.empty:
         return None
-    data = checkins[checkins['analysis_date'] == date_str]
-    return data if not data.empty else None
+    end = series['date_obj'].max()
+    train = series[series['date_obj'] > end - timedelta(days=FORECAST_FIT_DAYS)]
+    if len(train) < FORECAST_MIN_DAYS:
+        return None
+    X = forecast_features(train['date_obj'], end)
+    coef = np.linalg.lstsq(X, train[['gesamt', 'buchungen']].to_numpy(), rcond=None)[0]
+    return {'coef': coef, 't0': end}
+
+def predict_forecast(model, dates):
+    """Erwarteter Gesamt-Umsatz und Buchungen pro Tag (nicht negativ)."""
+    dates = list(dates)
+    pred = np.clip(forecast_features(dates, model['t0']) @ model['coef'], 0, None)
+    return pd.DataFrame({'date_obj': dates, 'gesamt': pred[:, 0], 'buchungen': pred[:, 1]})
+
+def weekday_mean_forecast(series, dates):
+    """Vergleichsbasis: Ø Gesamt-Umsatz pro Wochentag der letzten 8 Wochen."""
+    recent = series[series['date_obj'] >= series['date_obj'].max() - timedelta(weeks=8)]
+    means = recent.groupby(pd.to_datetime(recent['date_obj']).dt.dayofweek.values)['gesamt'].mean()
+    return np.array([means.get(d.weekday(), 0.0) for d in dates])
+
+def backtest_forecast(series, origins=FORECAST_BACKTEST_ORIGINS, horizon=FORECAST_HORIZON):
+    """Rolling-Origin-Backtest: MAE des Gesamt-Umsatzes je Horizont (Tage) für Modell und Wochentag-Ø."""
+    columns = ['Horizont', 'Modell', 'Wochentag_Ø', 'n']
+    if series.empty:
+        return pd.DataFrame(columns=columns)
+    
+    last_origin = series['date_obj'].max() - timedelta(days=horizon - 1)
+    errors = []
+    for k in range(origins):
+        origin = last_origin - timedelta(weeks=k)
+        train = series[series['date_obj'] < origin]
+        test = series[(series['date_obj'] >= origin) & (series['date_obj'] < origin + timedelta(days=horizon))]
+        model = fit_forecast(train)
+        if model is None or test.empty:
+            continue
+        pred = predict_forecast(model, test['date_obj'])['gesamt'].values
+        base = weekday_mean_forecast(train, test['date_obj'])
+        errors.append(pd.DataFrame({
+            'Horizont': [(d - origin).days + 1 for d in test['date_obj']],
+            'Modell': np.abs(pred - test['gesamt'].values),
+            'Wochentag_Ø': np.abs(base - test['gesamt'].values),
+        }))
+    if not errors:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(errors).groupby('Horizont').agg(
+        Modell=('Modell', 'mean'), Wochentag_Ø=('Wochentag_Ø', 'mean'), n=('Modell', 'size')
+    ).reset_index()
+
+def get_revenue_forecast():
+    return load_revenue_forecast(sheet_version("daily_rollup"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)  # 15 min cache
+def load_revenue_forecast(version):
+    return fit_forecast(forecast_series(load_daily_rollup()))
+
+def get_forecast_backtest():
+    return load_forecast_backtest(sheet_version("daily_rollup"))
+
+@st.cache_data(ttl=900, show_spinner=False, max_entries=2)  # 15 min cache
+def load_forecast_backtest(version):
+    return backtest_forecast(forecast_series(load_daily_rollup()))
+
+def get_hourly_demand_profile(weeks=8):
+    """7×24-Matrix: Anteil der Buchungen eines Wochentags pro Stunde (letzte 8 Wochen)."""
+    counts = demand_matrix(load_demand_slabs(), date.today() - timedelta(weeks=weeks)).astype(float)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+def project_month_total(actual_so_far, first_day, last_day, days_passed):
+    """Hochrechnung Monatsende: Ist-Umsatz × (Modell-Summe Monat / Modell-Summe bisherige Tage)."""
+    if days_passed <= 0:
+        return 0
+    days_in_month = last_day.day
+    model = get_revenue_forecast()
+    if model is not None:
+        expected = predict_forecast(model, [first_day + timedelta(days=i) for i in range(days_in_month)])['gesamt'].values
+        if expected[:days_passed].sum() > 0:
+            return actual_so_far * expected.sum() / expected[:days_passed].sum()
+    return actual_so_far / days_passed * days_in_month
 
 
 # ========================================
 # NAME-MATCHING FUNKTIONEN
 # ========================================
 
-@st.cache_data(ttl=120, show_spinner=False)  # 2 min cache (shorter because data changes)
 def load_name_mapping():
+    return load_name_mapping_cached(sheet_version("name_mapping"))
+
+@st.cache_data(ttl=120, show_spinner=False, max_entries=4)  # 2 min cache (shorter because data changes)
+def load_name_mapping_cached(version):
     """Cached name mapping loading."""
     try:
         df = loadsheet("name_mapping")
@@ -1196,10 +2851,12 @@ def save_name_mapping(mapping):
                 'timestamp': datetime.now().isoformat(), 'confirmed_by': 'legacy'
             })
     savesheet(pd.DataFrame(data), "name_mapping")
-    load_name_mapping.clear()  # Clear cache after save
 
-@st.cache_data(ttl=120, show_spinner=False)  # 2 min cache
 def load_rejected_matches():
+    return load_rejected_matches_cached(sheet_version("rejected_matches"))
+
+@st.cache_data(ttl=120, show_spinner=False, max_entries=4)  # 2 min cache
+def load_rejected_matches_cached(version):
     """Cached rejected matches loading."""
     try:
         df = loadsheet("rejected_matches")
@@ -1210,92 +2867,238 @@ def load_rejected_matches():
         return set()
 
 def save_rejected_match(buchung_name, checkin_name):
-    df = loadsheet("rejected_matches", cols=['buchung_name', 'checkin_name', 'timestamp'])
     new_row = pd.DataFrame([{'buchung_name': buchung_name, 'checkin_name': checkin_name, 'timestamp': datetime.now().isoformat()}])
-    df = pd.concat([df, new_row], ignore_index=True)
-    savesheet(df, "rejected_matches")
-    load_rejected_matches.clear()  # Clear cache after save
+    appendsheet(new_row, "rejected_matches")
 
 def remove_rejected_match(buchung_name, checkin_name):
     df = loadsheet("rejected_matches", cols=['buchung_name', 'checkin_name', 'timestamp'])
     if not df.empty:
         df = df[~((df['buchung_name'] == buchung_name) & (df['checkin_name'] == checkin_name))]
         savesheet(df, "rejected_matches")
-        load_rejected_matches.clear()  # Clear cache after save
+
+def get_initials(name):
+    parts = name.split()
+    return ''.join([p[0].lower() for p in parts if p])
+
+def simplify_phonetic(name):
+    if not name:
+        return ""
+    simplified = name[0].lower()
+    for char in name[1:].lower():
+        if char not in 'aeiouäöü':
+            simplified += char
+    for old, new in {'z': 's', 'c': 'k', 'v': 'f', 'w': 'v', 'ph': 'f', 'dt': 't', 'th': 't'}.items():
+        simplified = simplified.replace(old, new)
+    return simplified
 
 def check_initials_match(name1, name2):
-    def get_initials(name):
-        parts = name.split()
-        return ''.join([p[0].lower() for p in parts if p])
     init1 = get_initials(name1)
     init2 = get_initials(name2)
     return init1 in init2 or init2 in init1 or init1 == init2
 
 def phonetic_similarity(name1, name2):
-    def simplify_phonetic(name):
-        if not name:
-            return ""
-        simplified = name[0].lower()
-        for char in name[1:].lower():
-            if char not in 'aeiouäöü':
-                simplified += char
-        for old, new in {'z': 's', 'c': 'k', 'v': 'f', 'w': 'v', 'ph': 'f', 'dt': 't', 'th': 't'}.items():
-            simplified = simplified.replace(old, new)
-        return simplified
     return fuzz.ratio(simplify_phonetic(name1), simplify_phonetic(name2))
 
+MATCH_MIN_SCORE = 50
+MATCH_MAX_RESULTS = 5
+
+@st.cache_data(show_spinner=False)
+def build_candidate_index(candidate_names):
+    """Check-in-Namen mit vorberechneten Phonetik-Keys und Initialen"""
+    names = list(candidate_names)
+    return {
+        'names': names,
+        'phonetic': [simplify_phonetic(n) for n in names],
+        'initials': [get_initials(n) for n in names],
+    }
+
+def get_already_matched(all_fehler, mapping):
+    """Pro Fehler-Name: Check-in-Namen, die schon anderen Fehlern zugeordnet sind"""
+    names = all_fehler['Name_norm'].unique()
+    mapped_by_name = {}
+    for name in names:
+        if name in mapping:
+            mapped = mapping[name]
+            mapped_by_name[name] = mapped['checkin_name'] if isinstance(mapped, dict) else mapped
+    
+    # Alle teilen sich ein Set – nur wer selbst als einziger auf einen Namen zeigt, bekommt eine Kopie ohne ihn
+    all_mapped = set(mapped_by_name.values())
+    mapped_counts = pd.Series(list(mapped_by_name.values()), dtype=object).value_counts().to_dict()
+    already = {}
+    for name in names:
+        own = mapped_by_name.get(name)
+        if own is not None and mapped_counts[own] == 1:
+            already[name] = all_mapped - {own}
+        else:
+            already[name] = all_mapped
+    return already
+
+def batch_fuzzy_match(query_names, candidate_index, mapping, rejected_matches, already_matched_by_query=None):
+    """Vorschläge für mehrere Namen auf einmal (cdist) – gleiche Gewichtung wie advanced_fuzzy_match"""
+    if already_matched_by_query is None:
+        already_matched_by_query = {}
+    
+    names = candidate_index['names']
+    queries = list(dict.fromkeys(query_names))
+    results = {q: [] for q in queries}
+    if not queries or not names:
+        return results
+    
+    # Gelernte Matches zuerst, nur der Rest wird gescored
+    pending = []
+    for q in queries:
+        excluded = already_matched_by_query.get(q, set())
+        if q in mapping:
+            learned = mapping[q]
+            learned_name = learned['checkin_name'] if isinstance(learned, dict) else learned
+            if learned_name in names and learned_name not in excluded:
+                results[q] = [(learned_name, 100, 'learned')]
+                continue
+        pending.append(q)
+    if not pending:
+        return results
+    
+    available = np.ones((len(pending), len(names)), dtype=bool)
+    for i, q in enumerate(pending):
+        excluded = already_matched_by_query.get(q, set())
+        for j, candidate in enumerate(names):
+            if candidate in excluded or (q, candidate) in rejected_matches:
+                available[i, j] = False
+    
+    token = process.cdist(pending, names, scorer=fuzz.token_set_ratio, dtype=np.float64, workers=-1)
+    bonus = np.array([
+        [20.0 if a in b or b in a else 0.0 for b in candidate_index['initials']]
+        for a in (get_initials(q) for q in pending)
+    ]).reshape(len(pending), len(names))
+    
+    # Blocking: partial/phonetic bringen max. 0.2*100 + 0.2*100 = 40 Punkte.
+    # Paare, die selbst damit nicht über MATCH_MIN_SCORE kommen, fallen raus.
+    block = available & (token * 0.5 + bonus + 40 > MATCH_MIN_SCORE)
+    rows = np.flatnonzero(block.any(axis=1))
+    cols = np.flatnonzero(block.any(axis=0))
+    if len(rows) == 0:
+        return results
+    
+    partial = np.zeros_like(token)
+    phonetic = np.zeros_like(token)
+    partial[np.ix_(rows, cols)] = process.cdist(
+        [pending[i] for i in rows], [names[j] for j in cols],
+        scorer=fuzz.partial_ratio, dtype=np.float64, workers=-1
+    )
+    phonetic[np.ix_(rows, cols)] = process.cdist(
+        [simplify_phonetic(pending[i]) for i in rows], [candidate_index['phonetic'][j] for j in cols],
+        scorer=fuzz.ratio, dtype=np.float64, workers=-1
+    )
+    
+    final = token * 0.5 + partial * 0.2 + phonetic * 0.2 + bonus
+    hits = block & (final > MATCH_MIN_SCORE)
+    for i in rows:
+        matches = [(names[j], round(float(final[i, j]), 1), 'fuzzy') for j in np.flatnonzero(hits[i])]
+        matches.sort(key=lambda x: x[1], reverse=True)
+        results[pending[i]] = matches[:MATCH_MAX_RESULTS]
+    return results
+
 def advanced_fuzzy_match(query_name, candidate_names, mapping, rejected_matches, already_matched_checkins=None):
     if not candidate_names:
         return []
-    
-    if already_matched_checkins is None:
-        already_matched_checkins = set()
-    
-    available_candidates = [c for c in candidate_names if c not in already_matched_checkins]
-    if not available_candidates:
-        return []
-    
-    if query_name in mapping:
-        learned = mapping[query_name]
-        learned_name = learned['checkin_name'] if isinstance(learned, dict) else learned
-        if learned_name in available_candidates:
-            return [(learned_name, 100, 'learned')]
-    
-    results = []
-    for candidate in available_candidates:
-        if (query_name, candidate) in rejected_matches:
-            continue
-        
-        token_score = fuzz.token_set_ratio(query_name, candidate)
-        partial_score = fuzz.partial_ratio(query_name, candidate)
-        initials_bonus = 20 if check_initials_match(query_name, candidate) else 0
-        phonetic_score = phonetic_similarity(query_name, candidate)
-        
-        final_score = token_score * 0.5 + partial_score * 0.2 + phonetic_score * 0.2 + initials_bonus
-        
-        if final_score > 50:
-            results.append((candidate, round(final_score, 1), 'fuzzy'))
-    
-    results.sort(key=lambda x: x[1], reverse=True)
-    return results[:5]
+    candidate_index = build_candidate_index(tuple(candidate_names))
+    already = {query_name: already_matched_checkins or set()}
+    return batch_fuzzy_match([query_name], candidate_index, mapping, rejected_matches, already)[query_name]
+
+def compute_match_suggestions(all_fehler, ci_df, mapping, rejected_matches):
+    """Vorschläge für alle Fehler eines Tages in einem Durchlauf"""
+    if all_fehler is None or all_fehler.empty or ci_df is None or ci_df.empty:
+        return {}
+    candidate_index = cached_call(build_candidate_index, tuple(ci_df['Name_norm']))
+    already_matched = get_already_matched(all_fehler, mapping)
+    return batch_fuzzy_match(all_fehler['Name_norm'].tolist(), candidate_index, mapping, rejected_matches, already_matched)
+
+MATCH_SUGGESTION_COLUMNS = ['analysis_date', 'buchung_name', 'rank', 'checkin_name', 'score', 'match_type', 'fingerprint']
+
+def match_state_fingerprint(mapping, rejected_matches, ci_df):
+    """
+    Kurzer Hash über Mapping, Ablehnungen und die Check-in-Namen des Tages – ändert sich eines
+    davon (z.B. nachträglich importierte Check-ins), sind gespeicherte Vorschläge veraltet
+    """
+    mapped = sorted(
+        (str(k), str(v['checkin_name'] if isinstance(v, dict) else v)) for k, v in mapping.items()
+    )
+    rejected = sorted((str(b), str(c)) for b, c in rejected_matches)
+    checkins = sorted(set(ci_df['Name_norm'].astype(str))) if ci_df is not None and not ci_df.empty else []
+    digest = hashlib.md5(repr((mapped, rejected, checkins)).encode('utf-8')).hexdigest()
+    return f"fp-{digest[:16]}"
+
+def suggestions_to_df(date_str, suggestions, fingerprint):
+    rows = []
+    for buchung_name, matches in suggestions.items():
+        if not matches:
+            # Leerer Eintrag, damit der Fehler als "berechnet" gilt
+            rows.append({'analysis_date': date_str, 'buchung_name': buchung_name, 'rank': 0, 'checkin_name': '', 'score': 0, 'match_type': '', 'fingerprint': fingerprint})
+        for rank, (checkin_name, score, match_type) in enumerate(matches, start=1):
+            rows.append({'analysis_date': date_str, 'buchung_name': buchung_name, 'rank': rank, 'checkin_name': checkin_name, 'score': score, 'match_type': match_type, 'fingerprint': fingerprint})
+    return pd.DataFrame(rows, columns=MATCH_SUGGESTION_COLUMNS)
+
+def suggestions_from_df(df):
+    suggestions = {}
+    for row in df.sort_values('rank').itertuples(index=False):
+        matches = suggestions.setdefault(str(row.buchung_name), [])
+        if int(row.rank) > 0:
+            score = round(float(row.score), 1) if row.match_type == 'fuzzy' else int(float(row.score))
+            matches.append((str(row.checkin_name), score, row.match_type))
+    return suggestions
+
+def precompute_match_suggestions(buchungen_df, checkins_df, mapping, rejected_matches):
+    """Beim Analysieren: Top-5 Vorschläge für alle Fehler aller Tage berechnen und speichern"""
+    if buchungen_df.empty:
+        return
+    fehler_all = buchungen_df[buchungen_df['Fehler']]
+    if fehler_all.empty:
+        return
+    
+    frames = []
+    for date_str, day_fehler in fehler_all.groupby('analysis_date'):
+        day_checkins = checkins_df[checkins_df['analysis_date'] == date_str] if not checkins_df.empty else checkins_df
+        suggestions = compute_match_suggestions(day_fehler, day_checkins, mapping, rejected_matches)
+        suggestions = {name: suggestions.get(name, []) for name in day_fehler['Name_norm'].unique()}
+        frames.append(suggestions_to_df(date_str, suggestions, match_state_fingerprint(mapping, rejected_matches, day_checkins)))
+    
+    # Schlüssel analysis_date: ein Tag wird immer als Ganzes ersetzt, alte Fehler-Namen fallen weg
+    upsertsheet(pd.concat(frames, ignore_index=True), "match_suggestions", ['analysis_date'])
+
+def load_match_suggestions_snapshot(date_str):
+    return load_match_suggestions_snapshot_cached(date_str, sheet_version("match_suggestions"))
+
+@st.cache_data(ttl=300, show_spinner=False)  # 5 min cache
+def load_match_suggestions_snapshot_cached(date_str, version):
+    data = load_partition("match_suggestions", "analysis_date", date_str, MATCH_SUGGESTION_COLUMNS)
+    return data if not data.empty else None
 
-def render_name_matching_interface(fehler_row, ci_df, mapping, rejected_matches, all_fehler):
+def get_match_suggestions(date_str, all_fehler, ci_df, mapping, rejected_matches):
+    """Gespeicherte Vorschläge lesen – nur neu berechnen, wenn sich Mapping/Ablehnungen/Check-ins geändert haben"""
+    fingerprint = match_state_fingerprint(mapping, rejected_matches, ci_df)
+    stored = load_match_suggestions_snapshot(date_str)
+    if stored is not None and (stored['fingerprint'].astype(str) == fingerprint).all():
+        suggestions = suggestions_from_df(stored)
+        if set(all_fehler['Name_norm'].astype(str)) <= set(suggestions):
+            return suggestions
+    
+    suggestions = compute_match_suggestions(all_fehler, ci_df, mapping, rejected_matches)
+    suggestions = {name: suggestions.get(name, []) for name in all_fehler['Name_norm'].unique()}
+    upsertsheet(suggestions_to_df(date_str, suggestions, fingerprint), "match_suggestions", ['analysis_date'])
+    return suggestions
+
+def render_name_matching_interface(fehler_row, ci_df, mapping, rejected_matches, all_fehler, suggestions=None):
     name = fehler_row['Name_norm']
-    key_base = f"{fehler_row['Name_norm']}_{fehler_row['Datum']}_{fehler_row['Betrag']}"
+    key_base = fehler_key(fehler_row)
     
     checkin_names = list(ci_df['Name_norm']) if ci_df is not None and not ci_df.empty else []
     
-    already_matched = set()
-    for _, other_fehler in all_fehler.iterrows():
-        if other_fehler['Name_norm'] == name:
-            continue
-        other_name = other_fehler['Name_norm']
-        if other_name in mapping:
-            mapped = mapping[other_name]
-            mapped_name = mapped['checkin_name'] if isinstance(mapped, dict) else mapped
-            already_matched.add(mapped_name)
+    already_matched = get_already_matched(all_fehler, mapping).get(name, set())
     
-    matches = advanced_fuzzy_match(name, checkin_names, mapping, rejected_matches, already_matched)
+    if suggestions is not None:
+        matches = suggestions.get(name, [])
+    else:
+        matches = advanced_fuzzy_match(name, checkin_names, mapping, rejected_matches, already_matched)
     
     # Show suggestions if any
     if matches:
@@ -1313,12 +3116,7 @@ def render_name_matching_interface(fehler_row, ci_df, mapping, rejected_matches,
                     save_name_mapping(mapping)
                     if (name, match_name) in rejected_matches:
                         remove_rejected_match(name, match_name)
-                    corr = loadsheet("corrections", ['key','date','behoben','timestamp'])
-                    key = f"{fehler_row['Name_norm']}_{fehler_row['Datum']}_{fehler_row['Betrag']}"
-                    if not corr.empty and 'key' in corr.columns:
-                        corr = corr[corr['key'] != key]
-                    corr = pd.concat([corr, pd.DataFrame([{'key': key, 'date': fehler_row['Datum'], 'behoben': True, 'timestamp': datetime.now().isoformat()}])], ignore_index=True)
-                    savesheet(corr, "corrections")
+                    upsert_correction(key_base, fehler_row['Datum'])
                     st.rerun()
             with col3:
                 if st.button("❌", key=f"reject_{key_base}_{i}", use_container_width=True):
@@ -1348,12 +3146,7 @@ def render_name_matching_interface(fehler_row, ci_df, mapping, rejected_matches,
                     manual_norm = ci_df[ci_df['Name'] == manual_match].iloc[0]['Name_norm']
                     mapping[name] = {'checkin_name': manual_norm, 'confidence': 100, 'timestamp': datetime.now().isoformat(), 'confirmed_by': 'manual'}
                     save_name_mapping(mapping)
-                    corr = loadsheet("corrections", ['key','date','behoben','timestamp'])
-                    key = f"{fehler_row['Name_norm']}_{fehler_row['Datum']}_{fehler_row['Betrag']}"
-                    if not corr.empty and 'key' in corr.columns:
-                        corr = corr[corr['key'] != key]
-                    corr = pd.concat([corr, pd.DataFrame([{'key': key, 'date': fehler_row['Datum'], 'behoben': True, 'timestamp': datetime.now().isoformat()}])], ignore_index=True)
-                    savesheet(corr, "corrections")
+                    upsert_correction(key_base, fehler_row['Datum'])
                     st.success("✅ Manuell gematcht!")
                     time.sleep(0.5)
                     st.rerun()
@@ -1396,6 +3189,370 @@ def render_learned_matches_manager():
                             st.rerun()
 
 
+# ========================================
+# ABGLEICH BUCHUNGEN ↔ CHECK-INS
+# ========================================
+
+MITARBEITER_NORM = {normalize_name(m) for m in MITARBEITER}
+
+BUCHUNGEN_COLUMNS = [
+    'Datum', 'Name', 'Name_norm', 'Betrag', 'Service_Zeit', 'Checkin_Zeit', 'Product_SKU', 'Sport',
+    'Relevant', 'Check-in', 'Mitarbeiter', 'Fehler', 'analysis_date', 'Payment id', 'Club payment id',
+    'Wochentag', 'Stunde'
+]
+CHECKINS_COLUMNS = ['Datum', 'Name', 'Name_norm', 'Checkin_Zeit', 'Gespielt', 'analysis_date']
+
+
+def reconcile_bookings(playtomic_filtered, cdf, mapping):
+    """
+    Gleicht alle Buchungen mit allen Check-ins in einem Schritt ab.
+    Ein Join auf (Datum, Name_norm) plus ein zweiter Join über das gelernte Name-Mapping
+    ersetzen die Tages-Schleife mit iterrows(). Liefert (buchungen, checkins) als DataFrames.
+    """
+    bookings = playtomic_filtered[playtomic_filtered['Servicedatum'].notna()]
+    bookings = bookings.sort_values('Servicedatum', kind='stable').reset_index(drop=True)
+    checkins = cdf[cdf['Checkin_Datum'].notna()]
+    checkins = checkins.sort_values('Checkin_Datum', kind='stable').reset_index(drop=True)
+
+    # Pro Tag und Name zählt der erste Check-in (wie checkin_match.iloc[0])
+    first_ci = checkins.drop_duplicates(subset=['Checkin_Datum', 'Name_norm'])[['Checkin_Datum', 'Name_norm', 'Checkin_Zeit']]
+    first_ci = first_ci.rename(columns={'Checkin_Datum': 'Servicedatum'})
+    first_ci['_hit'] = True
+
+    direct = bookings[['Servicedatum', 'Name_norm']].merge(first_ci, on=['Servicedatum', 'Name_norm'], how='left')
+    direct_hit = direct['_hit'].notna().values
+
+    mapped_names = {
+        buchung_name: (details['checkin_name'] if isinstance(details, dict) else details)
+        for buchung_name, details in mapping.items()
+    }
+    # astype(object): ohne einen einzigen Mapping-Treffer (z.B. leeres Mapping) liefert map() float64,
+    # und der Merge mit dem Text-Name_norm der Check-ins bricht ab
+    via_mapping = pd.DataFrame({
+        'Servicedatum': bookings['Servicedatum'],
+        'Name_norm': bookings['Name_norm'].map(mapped_names).astype(object)
+    }).merge(first_ci, on=['Servicedatum', 'Name_norm'], how='left')
+    mapped_hit = via_mapping['_hit'].notna().values & ~direct_hit
+
+    has_ci = direct_hit | mapped_hit
+    ci_zeit = np.where(direct_hit, direct['Checkin_Zeit'], np.where(mapped_hit, via_mapping['Checkin_Zeit'], ''))
+    is_ma = bookings['Name_norm'].isin(MITARBEITER_NORM).values
+    relevant = bookings['Relevant'].astype(bool).values
+    fehler = relevant & ~has_ci & ~is_ma
+
+    def col_or_empty(df, col):
+        return df[col].values if col in df.columns else ''
+
+    datum = bookings['Servicedatum'].astype(str)
+    wochentag, stunde = booking_time_columns(datum, bookings['Service_Zeit'])
+    buchungen_rows = pd.DataFrame({
+        'Datum': datum, 'Name': bookings['Name'], 'Name_norm': bookings['Name_norm'],
+        'Betrag': bookings['Betrag'], 'Service_Zeit': bookings['Service_Zeit'].astype(str),
+        'Checkin_Zeit': pd.Series(ci_zeit, index=bookings.index).astype(str),
+        'Product_SKU': col_or_empty(bookings, 'Product_SKU'), 'Sport': col_or_empty(bookings, 'Sport'),
+        'Relevant': relevant, 'Check-in': has_ci, 'Mitarbeiter': is_ma, 'Fehler': fehler,
+        'analysis_date': datum,
+        'Payment id': col_or_empty(bookings, 'Payment id'), 'Club payment id': col_or_empty(bookings, 'Club payment id'),
+        'Wochentag': wochentag, 'Stunde': stunde
+    }, columns=BUCHUNGEN_COLUMNS)
+
+    # Check-ins: ein Eintrag pro Tag und Name, "Gespielt" = Buchung mit gleichem Namen am selben Tag
+    ci_unique = checkins.drop_duplicates(subset=['Checkin_Datum', 'Name_norm'])
+    booked = bookings[['Servicedatum', 'Name_norm']].drop_duplicates().rename(columns={'Servicedatum': 'Checkin_Datum'})
+    booked['_gespielt'] = True
+    gespielt = ci_unique[['Checkin_Datum', 'Name_norm']].merge(booked, on=['Checkin_Datum', 'Name_norm'], how='left')
+    gespielt = gespielt['_gespielt'].notna().values
+
+    ci_datum = ci_unique['Checkin_Datum'].astype(str)
+    checkin_rows = pd.DataFrame({
+        'Datum': ci_datum, 'Name': ci_unique['Name'], 'Name_norm': ci_unique['Name_norm'],
+        'Checkin_Zeit': ci_unique['Checkin_Zeit'].astype(str),
+        'Gespielt': gespielt,
+        'analysis_date': ci_datum
+    }, columns=CHECKINS_COLUMNS)
+
+    return buchungen_rows.reset_index(drop=True), checkin_rows.reset_index(drop=True)
+
+def prepare_playtomic_bookings(pdf):
+    """Playtomic-Export → relevante Buchungen mit Name_norm, Betrag, Servicedatum und Relevant-Flag."""
+    playtomic_filtered = pdf[pdf['Product SKU'].isin(['User booking registration', 'Open match registration'])].copy() if 'Product SKU' in pdf.columns else pdf.copy()
+    
+    if 'Refund id' in playtomic_filtered.columns:
+        playtomic_filtered = playtomic_filtered[playtomic_filtered['Refund id'] == '-']
+    if 'Payment status' in playtomic_filtered.columns:
+        playtomic_filtered = playtomic_filtered[playtomic_filtered['Payment status'] != 'Refund']
+    
+    rename_map = {
+        'User name': 'Name', 'Total': 'Betrag_raw', 'Service date': 'Servicedatum_raw',
+        'Product SKU': 'Product_SKU', 'Payment id': 'Payment id', 'Club payment id': 'Club payment id', 'Sport': 'Sport',
+        'Payment method': 'Payment_method'  # ✅ NEU: Für Wallet-Erkennung
+    }
+    if 'Service time' in playtomic_filtered.columns:
+        rename_map['Service time'] = 'Service_Zeit'
+    
+    playtomic_filtered.rename(columns=rename_map, inplace=True)
+    playtomic_filtered['Service_Zeit'] = playtomic_filtered['Servicedatum_raw'].astype(str).str.extract(r'(\d{2}:\d{2})')
+    playtomic_filtered['Name_norm'] = playtomic_filtered['Name'].apply(normalize_name)
+    playtomic_filtered['Betrag_raw'] = playtomic_filtered['Betrag_raw'].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.replace('€', '', regex=False).str.strip()
+    # Auf Cent runden: gespeichert wird die Zahl, formatiert wird erst in der Anzeige
+    playtomic_filtered['Betrag'] = pd.to_numeric(playtomic_filtered['Betrag_raw'], errors='coerce').fillna(0).round(2)
+    playtomic_filtered['Servicedatum'] = parse_dates_vectorized(playtomic_filtered['Servicedatum_raw'])
+    
+    if 'Service_Zeit' not in playtomic_filtered.columns:
+        playtomic_filtered['Service_Zeit'] = ''
+    else:
+        playtomic_filtered['Service_Zeit'] = playtomic_filtered['Service_Zeit'].fillna('')
+    
+    playtomic_filtered['Betrag_num'] = playtomic_filtered['Betrag']
+    playtomic_filtered = playtomic_filtered[playtomic_filtered['Betrag_num'] >= 0]
+    
+    if 'Payment id' in playtomic_filtered.columns:
+        playtomic_filtered = playtomic_filtered.drop_duplicates(subset=['Payment id'])
+
+    # ✅ FIX: Club Wallet Zahlungen erkennen
+    # Wenn Payment method = "Club wallet" → Spieler hat über Wallet bezahlt, NICHT Wellpass-relevant!
+    is_wallet_payment = False
+    if 'Payment_method' in playtomic_filtered.columns:
+        is_wallet_payment = playtomic_filtered['Payment_method'].str.lower().str.contains('wallet', na=False)
+    
+    # ✅ Relevanz für BEIDE Sportarten (Padel UND Tennis), unter 6€
+    # ABER: Wallet-Zahlungen sind NICHT relevant (die haben ja bezahlt!)
+    playtomic_filtered['Relevant'] = (
+        (
+            ((playtomic_filtered['Betrag_num'] < 6) & (playtomic_filtered['Betrag_num'] > 0)) | 
+            (playtomic_filtered['Betrag_num'] == 0)
+        ) & 
+        (~is_wallet_payment)  # ✅ Wallet-Zahlungen ausschließen
+    )
+    return playtomic_filtered
+
+def prepare_checkins(cdf):
+    rename_map_ci = {'Vor- & Nachname': 'Name', 'Datum': 'Checkin_Datum_raw'}
+    if 'Zeit' in cdf.columns:
+        rename_map_ci['Zeit'] = 'Checkin_Zeit'
+    cdf = cdf.rename(columns=rename_map_ci)
+    cdf['Name_norm'] = cdf['Name'].apply(normalize_name)
+    cdf['Checkin_Datum'] = pd.to_datetime(cdf['Checkin_Datum_raw'], errors='coerce').dt.date
+    
+    if 'Checkin_Zeit' not in cdf.columns:
+        cdf['Checkin_Zeit'] = ''
+    else:
+        cdf['Checkin_Zeit'] = cdf['Checkin_Zeit'].fillna('')
+    return cdf
+
+def append_new_rows(new_df, name):
+    """
+    Hängt nur Zeilen an, deren Dedup-Schlüssel (analysis_date|Name_norm|Zeit) noch nicht im Sheet ist.
+    Gibt die Anzahl neuer Zeilen zurück, None wenn das Anhängen fehlschlug.
+    """
+    if new_df.empty:
+        return 0
+    
+    new_df = filter_new_rows(new_df, name)
+    if new_df.empty:
+        return 0
+    if not appendsheet(new_df, name):
+        # Aggregate nur fortschreiben, wenn die Zeilen wirklich gespeichert sind – sonst
+        # zählt der erneute Import (Dedup lässt sie wieder durch) sie doppelt
+        return None
+    if name == "buchungen":
+        update_player_daily(new_df)
+        update_demand_weekly(new_df)
+    refresh_daily_rollup(new_df['analysis_date'].unique())
+    return len(new_df)
+
+
+# ========================================
+# 📥 INGESTION-JOBS
+# ========================================
+# "Analysieren" liest und prüft die Uploads noch im Button-Run (Parser-Meldungen erscheinen
+# direkt), das Speichern läuft als Hintergrund-Job: der Fortschritt pro Stufe und die Meldungen
+# des Storage-Layers (Rate Limits, Fehler) stehen im Sheet ingestion_jobs, die UI pollt nur.
+# Ein Verbindungsabbruch im Browser stoppt den Import also nicht, und nach dem Reconnect ist
+# der Stand sichtbar. Fortsetzen ab der letzten fertigen Stufe gibt es nicht – die Uploads
+# werden nicht gespeichert. Alle Schreibstufen deduplizieren, ein abgebrochener Job läuft
+# deshalb einfach mit denselben Dateien noch einmal.
+
+INGESTION_JOB_COLUMNS = ['job_id', 'status', 'stage', 'progress', 'message', 'files', 'started', 'updated', 'log']
+INGESTION_LOG_KEEP = 30  # Meldungen pro Job im Sheet
+
+INGESTION_STAGES = {
+    'playtomic_raw': ("Rohdaten speichern", 10),
+    'reconcile': ("Abgleich", 40),
+    'buchungen': ("Buchungen speichern", 60),
+    'checkins': ("Check-ins speichern", 80),
+    'suggestions': ("Match-Vorschläge", 90),
+    'done': ("Fertig", 100),
+}
+
+@st.cache_resource
+def get_ingestion_queue():
+    # Ein Worker → Importe laufen nacheinander, nie zwei gleichzeitig auf denselben Sheets
+    return {
+        'executor': ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestion"),
+        'lock': threading.Lock(),
+        'jobs': {},
+    }
+
+def update_ingestion_job(job, **fields):
+    with get_ingestion_queue()['lock']:
+        job.update(fields)
+        job['updated'] = datetime.now().isoformat(timespec='seconds')
+        row = {col: job.get(col, '') for col in INGESTION_JOB_COLUMNS}
+        row['log'] = json.dumps(job.get('log', [])[-INGESTION_LOG_KEEP:], ensure_ascii=False)
+    try:
+        upsert_row(row, "ingestion_jobs", 'job_id')
+    except Exception:
+        pass  # Fortschritt bleibt im Speicher sichtbar, Import läuft weiter
+
+def report_ingestion_message(job, level, message):
+    """notify-Ziel im Worker: Meldung am Job merken, gespeichert wird sie mit dem nächsten Update."""
+    with get_ingestion_queue()['lock']:
+        job.setdefault('log', []).append([level, str(message)[:200]])
+
+def ingestion_job_log(job):
+    """[[level, message], ...] – im Speicher als Liste, aus ingestion_jobs als JSON-Text."""
+    log = job.get('log') or []
+    if isinstance(log, str):
+        try:
+            log = json.loads(log)
+        except ValueError:
+            log = []
+    return list(log)
+
+def set_ingestion_stage(job, stage, message=''):
+    update_ingestion_job(job, status='running', stage=stage, progress=INGESTION_STAGES[stage][1],
+                         message=message or INGESTION_STAGES[stage][0])
+
+def run_ingestion_job(job, storage, pdf, playtomic_filtered, cdf, mapping, rejected_matches):
+    """Läuft im Worker-Thread: nur fertig gelesene Daten speichern, kein st.* / st.secrets."""
+    with background_context(storage, lambda level, message: report_ingestion_message(job, level, message)):
+        try:
+            set_ingestion_stage(job, 'playtomic_raw', f"{len(pdf)} Zeilen – Rohdaten speichern")
+            if save_playtomic_raw(pdf) is None:
+                raise ValueError("Playtomic-Rohdaten konnten nicht gespeichert werden")
+            
+            all_dates = set(playtomic_filtered['Servicedatum'].dropna()) | set(cdf['Checkin_Datum'].dropna())
+            set_ingestion_stage(job, 'reconcile', f"{len(all_dates)} Tage abgleichen")
+            results_df, checkin_results_df = reconcile_bookings(playtomic_filtered, cdf, mapping)
+            
+            set_ingestion_stage(job, 'buchungen')
+            new_buchungen = append_new_rows(results_df, "buchungen")
+            if new_buchungen is None:
+                raise ValueError("Buchungen konnten nicht gespeichert werden")
+            
+            set_ingestion_stage(job, 'checkins')
+            new_checkins = append_new_rows(checkin_results_df, "checkins")
+            if new_checkins is None:
+                raise ValueError("Check-ins konnten nicht gespeichert werden")
+            
+            # Match-Vorschläge für alle Fehler einmalig vorberechnen
+            set_ingestion_stage(job, 'suggestions')
+            precompute_match_suggestions(results_df, checkin_results_df, mapping, rejected_matches)
+            
+            update_ingestion_job(job, status='done', stage='done', progress=100,
+                                 message=f"{len(all_dates)} Tage · {new_buchungen} neue Buchungen · {new_checkins} neue Check-ins")
+        except Exception as e:
+            update_ingestion_job(job, status='failed', message=str(e)[:200])
+    return job
+
+def start_ingestion_job(p_file, c_file):
+    """
+    Liest und prüft beide Uploads im Haupt-Thread und startet das Speichern im Hintergrund.
+    → Job-ID, None wenn eine Datei nicht gelesen werden konnte (Meldung kommt vom Parser).
+    """
+    try:
+        pdf = parse_playtomic_csv(io.BytesIO(p_file.getvalue()))
+        if pdf.empty:
+            return None
+        cdf = parse_checkins_csv(io.BytesIO(c_file.getvalue()))
+        if cdf.empty:
+            return None
+        playtomic_filtered = prepare_playtomic_bookings(pdf)
+        cdf = prepare_checkins(cdf)
+    except Exception as e:
+        st.error(f"❌ Import nicht gestartet: {e}")
+        return None
+    
+    queue = get_ingestion_queue()
+    job_id = f"ing-{datetime.now():%Y%m%d-%H%M%S}-{random.randint(0, 0xffff):04x}"
+    job = {
+        'job_id': job_id, 'status': 'queued', 'stage': '', 'progress': 0, 'message': "Wartet",
+        'files': f"{getattr(p_file, 'name', 'playtomic.csv')} + {getattr(c_file, 'name', 'checkins.csv')}",
+        'started': datetime.now().isoformat(timespec='seconds'), 'log': [],
+    }
+    with queue['lock']:
+        queue['jobs'][job_id] = job
+    update_ingestion_job(job)
+    queue['executor'].submit(run_ingestion_job, job, resolve_storage_context(), pdf, playtomic_filtered, cdf,
+                             load_name_mapping(), load_rejected_matches())
+    return job_id
+
+def get_ingestion_job(job_id=None):
+    """
+    Stand eines Jobs (oder des neuesten): laufende Jobs aus dem Speicher, sonst aus ingestion_jobs.
+    Persistierte Jobs ohne laufenden Worker (Server-Neustart) gelten als abgebrochen.
+    """
+    queue = get_ingestion_queue()
+    with queue['lock']:
+        jobs = dict(queue['jobs'])
+    
+    if job_id is None and jobs:
+        job_id = max(jobs.values(), key=lambda j: j['started'])['job_id']
+    if job_id in jobs:
+        return dict(jobs[job_id])
+    
+    persisted = loadsheet("ingestion_jobs", INGESTION_JOB_COLUMNS)
+    if persisted.empty or 'job_id' not in persisted.columns:
+        return None
+    if job_id is not None:
+        persisted = persisted[persisted['job_id'] == job_id]
+    if persisted.empty:
+        return None
+    
+    job = persisted.sort_values('started').iloc[-1].to_dict()
+    if job.get('status') in ('queued', 'running'):
+        job['status'] = 'aborted'
+        job['message'] = f"Abgebrochen bei '{job.get('stage', '')}' – Dateien erneut hochladen"
+    return job
+
+def ingestion_job_active(job):
+    return job is not None and job.get('status') in ('queued', 'running')
+
+def render_ingestion_job(job):
+    if job is None:
+        return
+    status = job.get('status')
+    if ingestion_job_active(job):
+        try:
+            progress = int(float(job.get('progress') or 0))
+        except (TypeError, ValueError):
+            progress = 0
+        st.progress(progress / 100, text=f"⏳ {job.get('message', '')}")
+    elif status == 'done':
+        st.success(f"✅ Import fertig: {job.get('message', '')}")
+    elif status == 'failed':
+        st.error(f"❌ Import fehlgeschlagen: {job.get('message', '')}")
+    elif status == 'aborted':
+        st.warning(f"⚠️ {job.get('message', '')}")
+    for level, message in ingestion_job_log(job):
+        if level in ('warning', 'error'):
+            getattr(st, level)(message)
+        else:
+            st.caption(message)
+    st.caption(f"Job {job.get('job_id', '')} · {job.get('files', '')} · {job.get('updated', '')}")
+
+@st.fragment(run_every=2)
+def poll_ingestion_job(job_id):
+    job = get_ingestion_job(job_id)
+    render_ingestion_job(job)
+    if not ingestion_job_active(job):
+        # Fertig → ganze App neu laden, damit die Tabs die neuen Daten zeigen
+        if job is not None and job.get('status') == 'done':
+            st.session_state['ingestion_celebrate'] = job_id
+        st.rerun()
+
+
 # ========================================
 # MAIN APP
 # ========================================
@@ -1685,10 +3842,6 @@ if 'checkins_all' not in st.session_state:
     st.session_state.checkins_all = pd.DataFrame()
 if 'day_idx' not in st.session_state:
     st.session_state.day_idx = 0
-if 'corrections_cache' not in st.session_state:
-    st.session_state.corrections_cache = None
-if 'corrections_cache_time' not in st.session_state:
-    st.session_state.corrections_cache_time = 0
 if 'sound_enabled' not in st.session_state:
     st.session_state.sound_enabled = True
 if 'monthly_goal' not in st.session_state:
@@ -1729,34 +3882,13 @@ st.sidebar.markdown("---")
 search_query = st.sidebar.text_input("🔍 Spieler suchen", placeholder="Name eingeben...", key="global_search")
 
 if search_query and len(search_query) >= 2:
-    all_buchungen = loadsheet("buchungen")
-    if not all_buchungen.empty and 'Name' in all_buchungen.columns:
-        # Suche in Namen (case-insensitive)
-        search_lower = search_query.lower()
-        matches = all_buchungen[all_buchungen['Name'].str.lower().str.contains(search_lower, na=False)]
-        
-        if not matches.empty:
-            # ✅ FIX: Einfachere Aggregation ohne Categorical-Problem
-            # Konvertiere analysis_date zu string falls nötig
-            matches = matches.copy()
-            matches['analysis_date_str'] = matches['analysis_date'].astype(str)
-            matches['Betrag_num'] = pd.to_numeric(matches['Betrag'], errors='coerce').fillna(0)
-            
-            # Gruppiere manuell
-            player_stats = []
-            for name in matches['Name'].unique():
-                player_data = matches[matches['Name'] == name]
-                player_stats.append({
-                    'Name': name,
-                    'Buchungen': len(player_data),
-                    'Letzte': player_data['analysis_date_str'].max(),
-                    'Umsatz': player_data['Betrag_num'].sum()
-                })
-            
-            unique_players = pd.DataFrame(player_stats)
-            unique_players = unique_players.sort_values('Buchungen', ascending=False).head(5)
-            
-            st.sidebar.markdown("##### 🔎 Ergebnisse")
+    search_index = get_player_search_index()
+    if search_index['names']:
+        # Suche über den vorab gebauten Namensindex statt über alle Buchungen
+        unique_players, fuzzy = search_players(search_index, search_query)
+        
+        if not unique_players.empty:
+            st.sidebar.markdown("##### 🔎 Ähnliche Namen" if fuzzy else "##### 🔎 Ergebnisse")
             for _, player in unique_players.iterrows():
                 st.sidebar.markdown(f"""
                     <div style="background: rgba(255,255,255,0.1); padding: 0.5rem; border-radius: 8px; margin-bottom: 0.5rem;">
@@ -1796,6 +3928,13 @@ with st.sidebar.expander("Einstellungen", expanded=False):
         st.success("Gespeichert")
     
     st.session_state.monthly_goal = new_goal
+    
+    # Einmalig für Bestandsdaten aus der Zeit vor Zahl-/bool-Spalten
+    if st.button("🧰 Datentypen migrieren", use_container_width=True,
+                 help="Schreibt buchungen/checkins mit Zahl-Betrag und bool-Flags neu und vereinheitlicht die Fehler-Keys"):
+        with st.spinner("Migriere..."):
+            migrated = migrate_stored_types()
+        st.success("✅ " + ", ".join(f"{name}: {count}" for name, count in migrated.items()) if migrated else "Nichts zu migrieren")
 
 st.sidebar.markdown("---")
 
@@ -1808,181 +3947,23 @@ p_file = st.sidebar.file_uploader("📄 Playtomic CSV", type=['csv'], key="playt
 c_file = st.sidebar.file_uploader("📄 Checkins CSV", type=['csv'], key="checkins")
 
 if st.sidebar.button("🚀 Analysieren", use_container_width=True, type="primary") and p_file and c_file:
-    with st.spinner(get_random_padel_message('verarbeite')):
-        pdf = parse_playtomic_csv(p_file)
-        
-        if pdf.empty:
-            st.error("❌ Playtomic CSV konnte nicht gelesen werden")
-            st.stop()
-        
-        save_playtomic_raw(pdf)
-        
-        playtomic_filtered = pdf[pdf['Product SKU'].isin(['User booking registration', 'Open match registration'])].copy() if 'Product SKU' in pdf.columns else pdf.copy()
-        
-        if 'Refund id' in playtomic_filtered.columns:
-            playtomic_filtered = playtomic_filtered[playtomic_filtered['Refund id'] == '-']
-        if 'Payment status' in playtomic_filtered.columns:
-            playtomic_filtered = playtomic_filtered[playtomic_filtered['Payment status'] != 'Refund']
-        
-        rename_map = {
-            'User name': 'Name', 'Total': 'Betrag_raw', 'Service date': 'Servicedatum_raw',
-            'Product SKU': 'Product_SKU', 'Payment id': 'Payment id', 'Club payment id': 'Club payment id', 'Sport': 'Sport',
-            'Payment method': 'Payment_method'  # ✅ NEU: Für Wallet-Erkennung
-        }
-        if 'Service time' in playtomic_filtered.columns:
-            rename_map['Service time'] = 'Service_Zeit'
-        
-        playtomic_filtered.rename(columns=rename_map, inplace=True)
-        playtomic_filtered['Service_Zeit'] = playtomic_filtered['Servicedatum_raw'].astype(str).str.extract(r'(\d{2}:\d{2})')
-        playtomic_filtered['Name_norm'] = playtomic_filtered['Name'].apply(normalize_name)
-        playtomic_filtered['Betrag_raw'] = playtomic_filtered['Betrag_raw'].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.replace('€', '', regex=False).str.strip()
-        playtomic_filtered['Betrag'] = pd.to_numeric(playtomic_filtered['Betrag_raw'], errors='coerce').fillna(0)
-        playtomic_filtered['Betrag'] = playtomic_filtered['Betrag'].apply(lambda x: f"{x:.2f}".replace(',', '.'))
-        playtomic_filtered['Servicedatum'] = playtomic_filtered['Servicedatum_raw'].apply(parse_date_safe)
-        
-        if 'Service_Zeit' not in playtomic_filtered.columns:
-            playtomic_filtered['Service_Zeit'] = ''
-        else:
-            playtomic_filtered['Service_Zeit'] = playtomic_filtered['Service_Zeit'].fillna('')
-        
-        playtomic_filtered['Betrag_num'] = pd.to_numeric(playtomic_filtered['Betrag'], errors='coerce').fillna(0)
-        playtomic_filtered = playtomic_filtered[playtomic_filtered['Betrag_num'] >= 0]
-        
-        if 'Payment id' in playtomic_filtered.columns:
-            playtomic_filtered = playtomic_filtered.drop_duplicates(subset=['Payment id'])
-
-        # ✅ FIX: Club Wallet Zahlungen erkennen
-        # Wenn Payment method = "Club wallet" → Spieler hat über Wallet bezahlt, NICHT Wellpass-relevant!
-        is_wallet_payment = False
-        if 'Payment_method' in playtomic_filtered.columns:
-            is_wallet_payment = playtomic_filtered['Payment_method'].str.lower().str.contains('wallet', na=False)
-        
-        # ✅ Relevanz für BEIDE Sportarten (Padel UND Tennis), unter 6€
-        # ABER: Wallet-Zahlungen sind NICHT relevant (die haben ja bezahlt!)
-        playtomic_filtered['Relevant'] = (
-            (
-                ((playtomic_filtered['Betrag_num'] < 6) & (playtomic_filtered['Betrag_num'] > 0)) | 
-                (playtomic_filtered['Betrag_num'] == 0)
-            ) & 
-            (~is_wallet_payment)  # ✅ Wallet-Zahlungen ausschließen
-        )
-        
-        cdf = parse_checkins_csv(c_file)
-        
-        if cdf.empty:
-            st.error("❌ Checkins CSV konnte nicht gelesen werden")
-            st.stop()
-        
-        rename_map_ci = {'Vor- & Nachname': 'Name', 'Datum': 'Checkin_Datum_raw'}
-        if 'Zeit' in cdf.columns:
-            rename_map_ci['Zeit'] = 'Checkin_Zeit'
-        cdf.rename(columns=rename_map_ci, inplace=True)
-        cdf['Name_norm'] = cdf['Name'].apply(normalize_name)
-        cdf['Checkin_Datum'] = pd.to_datetime(cdf['Checkin_Datum_raw'], errors='coerce').dt.date
-        
-        if 'Checkin_Zeit' not in cdf.columns:
-            cdf['Checkin_Zeit'] = ''
-        else:
-            cdf['Checkin_Zeit'] = cdf['Checkin_Zeit'].fillna('')
-        
-        all_dates = sorted(set(playtomic_filtered['Servicedatum'].dropna()) | set(cdf['Checkin_Datum'].dropna()))
-        st.info(f"📦 {len(all_dates)} Tage werden verarbeitet...")
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        all_results = []
-        all_checkin_results = []
-        mapping = load_name_mapping()
-        
-        for i, td in enumerate(all_dates):
-            progress_bar.progress((i + 1) / len(all_dates))
-            status_text.text(f"{td.strftime('%d.%m.%Y')} ({i+1}/{len(all_dates)})")
-            
-            pd_day = playtomic_filtered[playtomic_filtered['Servicedatum'] == td]
-            cd_day = cdf[cdf['Checkin_Datum'] == td]
-            
-            for _, row in pd_day.iterrows():
-                is_ma = normalize_name(row['Name']) in [normalize_name(m) for m in MITARBEITER]
-                
-                checkin_match = cd_day[cd_day['Name_norm'] == row['Name_norm']]
-                has_ci = not checkin_match.empty
-                
-                if not has_ci and row['Name_norm'] in mapping:
-                    mapped = mapping[row['Name_norm']]
-                    mapped_name = mapped['checkin_name'] if isinstance(mapped, dict) else mapped
-                    mapped_checkin = cd_day[cd_day['Name_norm'] == mapped_name]
-                    if not mapped_checkin.empty:
-                        has_ci = True
-                        checkin_match = mapped_checkin
-                
-                ci_zeit = checkin_match.iloc[0]['Checkin_Zeit'] if has_ci else ''
-                fehler = row['Relevant'] and not has_ci and not is_ma
-                
-                all_results.append({
-                    'Datum': str(td), 'Name': row['Name'], 'Name_norm': row['Name_norm'],
-                    'Betrag': row['Betrag'], 'Service_Zeit': str(row['Service_Zeit']), 'Checkin_Zeit': str(ci_zeit),
-                    'Product_SKU': row.get('Product_SKU', ''), 'Sport': row.get('Sport', ''),
-                    'Relevant': 'Ja' if row['Relevant'] else 'Nein',
-                    'Check-in': 'Ja' if has_ci else 'Nein',
-                    'Mitarbeiter': 'Ja' if is_ma else 'Nein',
-                    'Fehler': 'Ja' if fehler else 'Nein',
-                    'analysis_date': td.strftime("%Y-%m-%d"),
-                    'Payment id': row.get('Payment id', ''), 'Club payment id': row.get('Club payment id', '')
-                })
-            
-            seen_names = set()
-            for _, row in cd_day.iterrows():
-                if row['Name_norm'] not in seen_names:
-                    seen_names.add(row['Name_norm'])
-                    buchung = pd_day[pd_day['Name_norm'] == row['Name_norm']]
-                    gespielt = not buchung.empty
-                    all_checkin_results.append({
-                        'Datum': str(td), 'Name': row['Name'], 'Name_norm': row['Name_norm'],
-                        'Checkin_Zeit': str(row['Checkin_Zeit']), 'Gespielt': 'Ja' if gespielt else 'Nein',
-                        'analysis_date': td.strftime("%Y-%m-%d")
-                    })
-        
-        progress_bar.progress(1.0)
-        status_text.success(f"✅ {len(all_dates)} Tage verarbeitet!")
-        
-        # Speichern
-        if all_results:
-            buchungen = loadsheet("buchungen", ['analysis_date'])
-            if not buchungen.empty:
-                buchungen['_dup_key'] = buchungen['analysis_date'].astype(str) + '|' + buchungen['Name_norm'].astype(str) + '|' + buchungen['Service_Zeit'].astype(str)
-                existing_keys = set(buchungen['_dup_key'])
-                new_results_df = pd.DataFrame(all_results)
-                new_results_df['_dup_key'] = new_results_df['analysis_date'].astype(str) + '|' + new_results_df['Name_norm'].astype(str) + '|' + new_results_df['Service_Zeit'].astype(str)
-                new_results_filtered = new_results_df[~new_results_df['_dup_key'].isin(existing_keys)].drop('_dup_key', axis=1)
-                if not new_results_filtered.empty:
-                    buchungen = buchungen.drop('_dup_key', axis=1)
-                    savesheet(pd.concat([buchungen, new_results_filtered], ignore_index=True), "buchungen")
-                    st.success(f"✅ {len(new_results_filtered)} neue Buchungen!")
-            else:
-                savesheet(pd.DataFrame(all_results), "buchungen")
-                st.success(f"✅ {len(all_results)} Buchungen!")
-        
-        if all_checkin_results:
-            checkins = loadsheet("checkins", ['analysis_date'])
-            if not checkins.empty:
-                checkins['_dup_key'] = checkins['analysis_date'].astype(str) + '|' + checkins['Name_norm'].astype(str) + '|' + checkins['Checkin_Zeit'].astype(str)
-                existing_keys = set(checkins['_dup_key'])
-                new_checkins_df = pd.DataFrame(all_checkin_results)
-                new_checkins_df['_dup_key'] = new_checkins_df['analysis_date'].astype(str) + '|' + new_checkins_df['Name_norm'].astype(str) + '|' + new_checkins_df['Checkin_Zeit'].astype(str)
-                new_checkins_filtered = new_checkins_df[~new_checkins_df['_dup_key'].isin(existing_keys)].drop('_dup_key', axis=1)
-                if not new_checkins_filtered.empty:
-                    checkins = checkins.drop('_dup_key', axis=1)
-                    savesheet(pd.concat([checkins, new_checkins_filtered], ignore_index=True), "checkins")
-                    st.success(f"✅ {len(new_checkins_filtered)} neue Check-ins!")
-            else:
-                savesheet(pd.DataFrame(all_checkin_results), "checkins")
-                st.success(f"✅ {len(all_checkin_results)} Check-ins!")
-        
-        st.success("🎉 Por cuatro! 🚀")
-        st.balloons()
-        time.sleep(2)
-        st.rerun()
+    if ingestion_job_active(get_ingestion_job()):
+        st.sidebar.warning("⏳ Es läuft bereits ein Import")
+    else:
+        job_id = start_ingestion_job(p_file, c_file)
+        if job_id is not None:
+            st.session_state['ingestion_job_id'] = job_id
+
+# Import-Status: aktiver Job wird gepollt, sonst letzter Stand (auch nach Reconnect)
+ingestion_job = get_ingestion_job(st.session_state.get('ingestion_job_id'))
+with st.sidebar:
+    if ingestion_job_active(ingestion_job):
+        poll_ingestion_job(ingestion_job['job_id'])
+    else:
+        render_ingestion_job(ingestion_job)
+        if ingestion_job is not None and st.session_state.pop('ingestion_celebrate', None) == ingestion_job.get('job_id'):
+            st.success("🎉 Por cuatro! 🚀")
+            st.balloons()
 
 # Customer Upload
 st.sidebar.markdown("---")
@@ -1995,7 +3976,6 @@ if st.sidebar.button("📤 Upload", use_container_width=True) and cust_file:
             customers_df['name_norm'] = customers_df['name'].apply(normalize_name)
             if savesheet(customers_df, "customers"):
                 st.sidebar.success(f"✅ {len(customers_df)} Kunden!")
-                loadsheet.clear()
                 st.rerun()
     except Exception as e:
         st.sidebar.error(f"❌ {str(e)[:50]}")
@@ -2063,8 +4043,8 @@ with tab1:
     df = load_snapshot(st.session_state.current_date)
     ci_df = load_checkins_snapshot(st.session_state.current_date)
     
-    # ✅ EINMAL LADEN für gesamten Tab (Rate Limit Fix!)
-    corrections_df = loadsheet("corrections", ['key','date','behoben','timestamp'])
+    # ✅ EINMAL LADEN für gesamten Tab (Rate Limit Fix!) – key → behoben
+    corrections_index = get_corrections_index()
     
     if df is None or df.empty:
         st.info("🎾 Keine Daten für diesen Tag")
@@ -2136,8 +4116,8 @@ with tab1:
     st.markdown(metrics_html, unsafe_allow_html=True)
     
     # ✅ STATISTIK-BADGES
-    relevant_count = len(df[df['Relevant'] == 'Ja'])
-    fehler_count = len(df[df['Fehler'] == 'Ja'])
+    relevant_count = int(df['Relevant'].sum())
+    fehler_count = int(df['Fehler'].sum())
     checkin_count = len(ci_df) if ci_df is not None else 0
     
     stats_html = f"""
@@ -2157,44 +4137,18 @@ with tab1:
     
     with col_left:
         st.markdown("**Buchungen (Relevant)**")
-        rv = df[df['Relevant'] == 'Ja'].sort_values('Name').copy()
+        rv = df[df['Relevant']].sort_values('Name').copy()
         
         if not rv.empty:
             # Toggle: Nur Probleme anzeigen
             show_only_problems = st.checkbox("Nur Probleme", value=True, key="hide_green_bookings")
             
             # ✅ Verwende bereits geladene corrections (Rate Limit Fix!)
-            behoben_keys = set()
-            if not corrections_df.empty and 'key' in corrections_df.columns:
-                # Robuster Check für Boolean/String
-                for _, c_row in corrections_df.iterrows():
-                    behoben_val = c_row.get('behoben', False)
-                    # Check für True, 'True', 'true', 1, '1'
-                    is_behoben = behoben_val in [True, 'True', 'true', 1, '1', 'TRUE']
-                    if is_behoben and pd.notna(c_row.get('key')):
-                        behoben_keys.add(str(c_row['key']))
-            
-            # Status-Badge vor Namen - mit Behoben-Check
-            def add_status_badge(row):
-                if row['Fehler'] == 'Ja':
-                    # Prüfe ob bereits behoben
-                    key = f"{row['Name_norm']}_{row['Datum']}_{row['Betrag']}"
-                    if key in behoben_keys:
-                        return f"🟢 {row['Name']}"  # Behoben = grün
-                    else:
-                        return f"🔴 {row['Name']}"  # Offen = rot
-                else:
-                    return f"🟢 {row['Name']}"
-            
-            # Prüfe ob Problem noch offen (für Filter)
-            def is_open_problem(row):
-                if row['Fehler'] != 'Ja':
-                    return False
-                key = f"{row['Name_norm']}_{row['Datum']}_{row['Betrag']}"
-                return key not in behoben_keys
+            rv = attach_correction_status(rv, corrections_index)
             
-            rv['Spieler'] = rv.apply(add_status_badge, axis=1)
-            rv['_is_problem'] = rv.apply(is_open_problem, axis=1)
+            # Offen = Fehler und noch nicht behoben → rot, sonst grün
+            rv['_is_problem'] = rv['Fehler'].values & ~rv['_behoben'].values
+            rv['Spieler'] = np.where(rv['_is_problem'], '🔴 ', '🟢 ') + rv['Name'].astype(str)
             
             # Filtere wenn Toggle aktiv - zeige nur OFFENE Probleme (nicht behobene)
             if show_only_problems:
@@ -2208,6 +4162,7 @@ with tab1:
             if 'Sport' in rv_display.columns:
                 rv_display['S'] = rv_display['Sport'].apply(lambda x: 'P' if str(x).upper() == 'PADEL' else ('T' if str(x).upper() == 'TENNIS' else ''))
             
+            rv_display['Betrag'] = rv_display['Betrag'].map(format_betrag)
             display_cols = ['Spieler', 'Betrag']
             if 'Service_Zeit' in rv_display.columns:
                 display_cols.append('Service_Zeit')
@@ -2315,24 +4270,19 @@ with tab1:
     st.markdown("---")
     
     # FEHLER-BEREICH (wie Padel Port - funktioniert!)
-    fehler = df[df['Fehler'] == 'Ja'].copy()
+    fehler = attach_correction_status(df[df['Fehler']], corrections_index)
+    fehler = attach_whatsapp_status(fehler, get_whatsapp_log_index())
     if not fehler.empty:
         mapping = load_name_mapping()
         rejected_matches = load_rejected_matches()
-        corr = corrections_df
         
         # Fehler-Daten sammeln
         fehler_data = []
         for idx, row in fehler.iterrows():
-            key = f"{row['Name_norm']}_{row['Datum']}_{row['Betrag']}"
+            key = row['_key']
+            is_behoben = bool(row['_behoben'])
             
-            is_behoben = False
-            if not corr.empty and 'key' in corr.columns:
-                match_corr = corr[corr['key'] == key]
-                if not match_corr.empty:
-                    is_behoben = is_behoben_value(match_corr.iloc[0].get('behoben'))
-            
-            whatsapp_sent_time = get_whatsapp_sent_time(row)
+            whatsapp_sent_time = row['_wa_sent']
             customer_data = get_customer_data(row['Name'])
             
             telefon = 'N/A'
@@ -2343,7 +4293,7 @@ with tab1:
             fehler_data.append({
                 'Status': '✅' if is_behoben else '🔴',
                 'Name': row['Name'],
-                'Betrag': f"€{row['Betrag']}",
+                'Betrag': f"€{format_betrag(row['Betrag'])}",
                 'Zeit': row.get('Service_Zeit', 'N/A'),
                 'Telefon': telefon,
                 'WhatsApp': '✅ ' + whatsapp_sent_time.strftime("%d.%m. %H:%M") if whatsapp_sent_time else '❌',
@@ -2366,6 +4316,17 @@ with tab1:
             hide_index=True
         )
         
+        # Alle offenen Fehler ohne bisherige WhatsApp auf einmal erinnern (läuft im Hintergrund)
+        open_unsent = fehler[~fehler['_behoben'] & fehler['_wa_sent'].isna() & ~fehler['_key'].isin(pending_whatsapp_keys())]
+        if st.button(f"📨 Alle offenen erinnern ({len(open_unsent)})", key="remind_all_open", disabled=open_unsent.empty, use_container_width=True):
+            jobs, skipped = build_fehler_reminder_jobs(open_unsent)
+            if jobs:
+                enqueue_whatsapp_jobs(jobs)
+                st.success(f"📬 {len(jobs)} Nachrichten in der Versandqueue")
+            if skipped:
+                st.warning(f"❌ Keine Telefonnummer: {', '.join(map(str, skipped))}")
+        render_whatsapp_queue_status()
+        
         st.markdown("---")
         st.markdown("### 🔧 Fehler bearbeiten")
         
@@ -2384,7 +4345,7 @@ with tab1:
         row = selected_fehler['_row']
         key = selected_fehler['_key']
         is_behoben = selected_fehler['_is_behoben']
-        whatsapp_sent_time = get_whatsapp_sent_time(row)
+        whatsapp_sent_time = row['_wa_sent']
         
         st.markdown("---")
         
@@ -2393,7 +4354,7 @@ with tab1:
         
         with col1:
             st.markdown(f"**🧑 {row['Name']}**")
-            st.caption(f"⏰ {row.get('Service_Zeit', 'N/A')} | 💰 €{row['Betrag']} | 📅 {row['Datum']}")
+            st.caption(f"⏰ {row.get('Service_Zeit', 'N/A')} | 💰 €{format_betrag(row['Betrag'])} | 📅 {row['Datum']}")
             if whatsapp_sent_time:
                 st.caption(f"✅ WhatsApp: {whatsapp_sent_time.strftime('%d.%m. %H:%M')}")
         
@@ -2409,23 +4370,11 @@ with tab1:
         with col3:
             if not is_behoben:
                 if st.button("✅ Behoben", key=f"fix_{key}", type="primary", use_container_width=True):
-                    if not corr.empty and 'key' in corr.columns:
-                        corr = corr[corr['key'] != key]
-                    corr = pd.concat([corr, pd.DataFrame([{
-                        'key': key,
-                        'date': st.session_state.current_date,
-                        'behoben': True,
-                        'timestamp': datetime.now().isoformat()
-                    }])], ignore_index=True)
-                    savesheet(corr, "corrections")
-                    loadsheet.clear()
+                    upsert_correction(key, st.session_state.current_date)
                     st.rerun()
             else:
                 if st.button("🔄 Öffnen", key=f"reopen_{key}", use_container_width=True):
-                    if not corr.empty and 'key' in corr.columns:
-                        corr = corr[corr['key'] != key]
-                        savesheet(corr, "corrections")
-                    loadsheet.clear()
+                    delete_correction(key)
                     st.rerun()
         
         # WhatsApp Buttons
@@ -2440,7 +4389,8 @@ with tab1:
         # Name-Matching (nur wenn nicht behoben)
         if not is_behoben:
             with st.expander("🔗 Name-Zuordnung", expanded=False):
-                render_name_matching_interface(row, ci_df, mapping, rejected_matches, fehler)
+                match_suggestions = get_match_suggestions(st.session_state.current_date, fehler, ci_df, mapping, rejected_matches)
+                render_name_matching_interface(row, ci_df, mapping, rejected_matches, fehler, match_suggestions)
     else:
         st.success("✅ Keine offenen Fehler! 🎉")
         trigger_confetti()
@@ -2448,42 +4398,30 @@ with tab1:
     # ✅ OFFENE FEHLER DER LETZTEN 5 TAGE
     st.markdown("---")
     with st.expander("📋 Offene Fehler der letzten 5 Tage", expanded=False):
-        # Lade Buchungen (corrections schon geladen)
-        all_buchungen = loadsheet("buchungen")
-        all_corrections = corrections_df  # ✅ Verwende bereits geladene corrections
+        # Letzte 5 Tage berechnen (ohne heute) – nur diese Tages-Partitionen laden
+        today = datetime.strptime(st.session_state.current_date, "%Y-%m-%d").date()
+        past_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 6)]
+        past_snapshots = [snap for snap in (load_snapshot(d) for d in past_dates) if snap is not None]
         
-        if not all_buchungen.empty and 'analysis_date' in all_buchungen.columns:
-            # Letzte 5 Tage berechnen (ohne heute)
-            today = datetime.strptime(st.session_state.current_date, "%Y-%m-%d").date()
-            past_dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 6)]
+        if past_snapshots:
+            past_buchungen = pd.concat(past_snapshots, ignore_index=True)
             
             # Filtere auf Fehler der letzten 5 Tage
-            past_fehler = all_buchungen[
-                (all_buchungen['analysis_date'].isin(past_dates)) & 
-                (all_buchungen['Fehler'] == 'Ja')
-            ].copy()
+            past_fehler = attach_correction_status(past_buchungen[past_buchungen['Fehler']], corrections_index)
             
             if not past_fehler.empty:
-                # Prüfe welche behoben sind
+                # Nur offene (nicht behobene) Fehler
                 open_fehler = []
-                for idx, row in past_fehler.iterrows():
-                    key = f"{row['Name_norm']}_{row['Datum']}_{row['Betrag']}"
-                    is_behoben = False
-                    if not all_corrections.empty and 'key' in all_corrections.columns:
-                        match_corr = all_corrections[all_corrections['key'] == key]
-                        if not match_corr.empty:
-                            is_behoben = is_behoben_value(match_corr.iloc[0].get('behoben'))
-                    
-                    if not is_behoben:
-                        open_fehler.append({
-                            'Datum': row['Datum'],
-                            'Name': row['Name'],
-                            'Betrag': f"€{row['Betrag']}",
-                            'Zeit': row.get('Service_Zeit', ''),
-                            'Sport': '🎾P' if str(row.get('Sport', '')).upper() == 'PADEL' else '🎾T',
-                            '_key': key,
-                            '_row': row
-                        })
+                for idx, row in past_fehler[~past_fehler['_behoben']].iterrows():
+                    open_fehler.append({
+                        'Datum': row['Datum'],
+                        'Name': row['Name'],
+                        'Betrag': f"€{format_betrag(row['Betrag'])}",
+                        'Zeit': row.get('Service_Zeit', ''),
+                        'Sport': '🎾P' if str(row.get('Sport', '')).upper() == 'PADEL' else '🎾T',
+                        '_key': row['_key'],
+                        '_row': row
+                    })
                 
                 if open_fehler:
                     st.warning(f"⚠️ {len(open_fehler)} offene Fehler aus den letzten 5 Tagen")
@@ -2506,17 +4444,7 @@ with tab1:
                                 st.caption(f"🔴 {f['Name']} | {f['Betrag']} | {f['Zeit']} {f['Sport']}")
                             with col2:
                                 if st.button("✅", key=f"fix_past_{f['_key']}", use_container_width=True):
-                                    corr = corrections_df.copy()  # ✅ Verwende bereits geladene corrections
-                                    if not corr.empty and 'key' in corr.columns:
-                                        corr = corr[corr['key'] != f['_key']]
-                                    corr = pd.concat([corr, pd.DataFrame([{
-                                        'key': f['_key'], 
-                                        'date': f['Datum'], 
-                                        'behoben': True, 
-                                        'timestamp': datetime.now().isoformat()
-                                    }])], ignore_index=True)
-                                    savesheet(corr, "corrections")
-                                    loadsheet.clear()  # ✅ Cache leeren!
+                                    upsert_correction(f['_key'], f['Datum'])
                                     st.rerun()
                         
                         st.markdown("---")
@@ -2525,7 +4453,7 @@ with tab1:
             else:
                 st.info("Keine Fehler in den letzten 5 Tagen gefunden")
         else:
-            st.info("Keine Buchungsdaten vorhanden")
+            st.info("Keine Buchungsdaten in den letzten 5 Tagen")
     
     # ✅ CHARTS NACH UNTEN
     if gesamt_mit_wellpass > 0:
@@ -2570,30 +4498,23 @@ with tab2:
     first_day = date(selected_year, selected_month, 1)
     last_day = date(selected_year, selected_month, monthrange(selected_year, selected_month)[1])
     
-    buchungen = loadsheet("buchungen")
+    rollup = load_daily_rollup()
     
-    if buchungen.empty or 'analysis_date' not in buchungen.columns:
+    if rollup.empty:
         st.info("📦 Keine Daten")
         st.stop()
     
-    buchungen['date_obj'] = pd.to_datetime(buchungen['analysis_date'], errors='coerce').dt.date
-    month_data = buchungen[(buchungen['date_obj'] >= first_day) & (buchungen['date_obj'] <= last_day)]
+    # Tageswerte des Monats kommen fertig aus dem Rollup
+    month_days = month_rollup(rollup, first_day, last_day)
+    total_buchungen = int(month_days['buchungen'].sum())
     
-    if month_data.empty:
+    if total_buchungen == 0:
         st.warning(f"⚠️ Keine Daten für {month_names[selected_month]} {selected_year}")
         st.stop()
     
-    total_buchungen = len(month_data)
-    relevant_buchungen = len(month_data[month_data['Relevant'] == 'Ja'])
-    fehler_gesamt = len(month_data[month_data['Fehler'] == 'Ja'])
-    
-    checkins = loadsheet("checkins")
-    wellpass_checkins_monat = 0
-    if not checkins.empty and 'analysis_date' in checkins.columns:
-        checkins['date_obj'] = pd.to_datetime(checkins['analysis_date'], errors='coerce').dt.date
-        month_checkins = checkins[(checkins['date_obj'] >= first_day) & (checkins['date_obj'] <= last_day)]
-        if not month_checkins.empty:
-            wellpass_checkins_monat = len(month_checkins.drop_duplicates(subset=['analysis_date', 'Name_norm']))
+    relevant_buchungen = int(month_days['relevant'].sum())
+    fehler_gesamt = int(month_days['fehler'].sum())
+    wellpass_checkins_monat = int(month_days['checkins'].sum())
     
     revenue_month = get_revenue_from_raw(start_date=first_day, end_date=last_day)
     wellpass_revenue_monat = wellpass_checkins_monat * WELLPASS_WERT
@@ -2619,12 +4540,8 @@ with tab2:
     expected_pct = (days_passed / days_in_month * 100) if days_in_month > 0 else 0
     on_track = progress_pct >= expected_pct
     
-    # Prognose für Monatsende
-    if days_passed > 0:
-        daily_avg = gesamt_umsatz / days_passed
-        projected_total = daily_avg * days_in_month
-    else:
-        projected_total = 0
+    # Prognose für Monatsende (gewichtet mit dem Wochentag-/Feiertagsprofil des Modells)
+    projected_total = project_month_total(gesamt_umsatz, first_day, last_day, days_passed)
     
     # Progress Bar Farbe & Status
     if progress_pct >= 100:
@@ -2728,61 +4645,30 @@ with tab3:
             key="analytics_period"
         )
     
-    # Lade alle Buchungsdaten
-    all_buchungen = loadsheet("buchungen")
+    # Tagesaggregate pro Spieler (player_daily) statt aller Buchungszeilen
+    player_daily = load_player_daily()
     
-    if all_buchungen.empty or 'analysis_date' not in all_buchungen.columns:
+    if player_daily.empty:
         st.warning("⚠️ Keine Buchungsdaten vorhanden. Bitte erst CSVs hochladen!")
     else:
         # Filtere auf Zeitraum
         today = date.today()
         start_date = today - timedelta(days=analysis_days)
         
-        all_buchungen['date_obj'] = pd.to_datetime(all_buchungen['analysis_date'], errors='coerce').dt.date
-        period_data = all_buchungen[all_buchungen['date_obj'] >= start_date].copy()
-        
-        if period_data.empty:
+        if not (player_daily['date_obj'] >= start_date).any():
             st.info(f"📭 Keine Daten in den letzten {analysis_days} Tagen")
         else:
-            # Filtere Mitarbeiter raus
-            if 'Mitarbeiter' in period_data.columns:
-                period_data = period_data[period_data['Mitarbeiter'] != 'Ja']
-            
-            with col_info:
-                unique_players = period_data['Name'].nunique()
-                total_bookings = len(period_data)
-                st.info(f"📊 {total_bookings} Buchungen von {unique_players} Spielern")
-            
-            st.markdown("---")
-            
             # ========================================
             # SPIELER-STATISTIKEN BERECHNEN
             # ========================================
             
-            # Gruppiere nach Spieler - sichere Methode ohne iloc[0] Problem
-            if period_data.empty or 'Name' not in period_data.columns:
-                # Leere DataFrame wenn keine Daten
-                player_stats = pd.DataFrame(columns=['Name', 'Buchungen', 'Umsatz', 'Relevante', 'Mit_Checkin', 'Fehler', 'Ist_Wellpass', 'Checkin_Quote', 'Pro_Woche'])
-            else:
-                # Sichere Aggregation ohne lambda mit iloc
-                stats_list = []
-                for name, group in period_data.groupby('Name'):
-                    if len(group) == 0:
-                        continue
-                    stats_list.append({
-                        'Name': name,
-                        'Buchungen': len(group),
-                        'Umsatz': pd.to_numeric(group['Betrag'], errors='coerce').sum(),
-                        'Relevante': (group['Relevant'] == 'Ja').sum(),
-                        'Mit_Checkin': (group['Check-in'] == 'Ja').sum(),
-                        'Fehler': (group['Fehler'] == 'Ja').sum(),
-                        'Ist_Wellpass': (group['Relevant'] == 'Ja').any()
-                    })
-                
-                if stats_list:
-                    player_stats = pd.DataFrame(stats_list)
-                else:
-                    player_stats = pd.DataFrame(columns=['Name', 'Buchungen', 'Umsatz', 'Relevante', 'Mit_Checkin', 'Fehler', 'Ist_Wellpass'])
+            # Ein groupby-sum über (Tag × Spieler)-Zeilen, Mitarbeiter schon ausgefiltert
+            player_stats = player_stats_for_period(player_daily, start_date)
+            
+            with col_info:
+                st.info(f"📊 {int(player_stats['Buchungen'].sum())} Buchungen von {len(player_stats)} Spielern")
+            
+            st.markdown("---")
             
             # Check-in Quote berechnen (nur wenn Daten vorhanden)
             if not player_stats.empty and 'Relevante' in player_stats.columns:
@@ -2980,31 +4866,11 @@ with tab3:
 with tab4:
     st.markdown("### 🔮 Prognosen & Kalender")
     
-    # Lade Daten
-    all_buchungen = loadsheet("buchungen")
-    all_checkins = loadsheet("checkins")
-    
-    if all_buchungen.empty or 'analysis_date' not in all_buchungen.columns:
+    # Nur Aggregate (daily_rollup, player_daily, demand_weekly) – keine Roh-Historie
+    if load_daily_rollup().empty:
         st.warning("⚠️ Keine Buchungsdaten vorhanden!")
     else:
-        all_buchungen['date_obj'] = pd.to_datetime(all_buchungen['analysis_date'], errors='coerce').dt.date
-        all_buchungen = all_buchungen.dropna(subset=['date_obj'])
-        
-        # Berechne Betrag numerisch
-        all_buchungen['Betrag_num'] = pd.to_numeric(all_buchungen['Betrag'], errors='coerce').fillna(0)
-        
-        # Wochentag hinzufügen (0=Montag, 6=Sonntag)
-        all_buchungen['Wochentag'] = pd.to_datetime(all_buchungen['analysis_date']).dt.dayofweek
-        
-        # Deutsche Wochentag-Namen
-        wochentag_namen = ['Montag', 'Dienstag', 'Mittwoch', 'Donnerstag', 'Freitag', 'Samstag', 'Sonntag']
-        all_buchungen['Wochentag_Name'] = all_buchungen['Wochentag'].apply(lambda x: wochentag_namen[x])
-        
-        # Uhrzeit extrahieren (falls vorhanden)
-        if 'Service_Zeit' in all_buchungen.columns:
-            all_buchungen['Stunde'] = all_buchungen['Service_Zeit'].apply(
-                lambda x: int(str(x).split(':')[0]) if pd.notna(x) and ':' in str(x) else None
-            )
+        wochentag_namen = WOCHENTAG_NAMEN
         
         st.markdown("---")
         
@@ -3027,26 +4893,11 @@ with tab4:
         first_day = date(cal_year, cal_month, 1)
         last_day = date(cal_year, cal_month, monthrange(cal_year, cal_month)[1])
         
-        # Tages-Statistiken für den Monat
-        month_data = all_buchungen[(all_buchungen['date_obj'] >= first_day) & (all_buchungen['date_obj'] <= last_day)]
-        
-        daily_stats = month_data.groupby('date_obj').agg({
-            'Betrag_num': 'sum',
-            'Name': 'count',
-            'Fehler': lambda x: (x == 'Ja').sum()
-        }).reset_index()
-        daily_stats.columns = ['Datum', 'Umsatz', 'Buchungen', 'Fehler']
-        
-        # Wellpass Check-ins pro Tag
-        if not all_checkins.empty and 'analysis_date' in all_checkins.columns:
-            all_checkins['date_obj'] = pd.to_datetime(all_checkins['analysis_date'], errors='coerce').dt.date
-            month_checkins = all_checkins[(all_checkins['date_obj'] >= first_day) & (all_checkins['date_obj'] <= last_day)]
-            checkin_counts = month_checkins.groupby('date_obj')['Name_norm'].nunique().reset_index()
-            checkin_counts.columns = ['Datum', 'Checkins']
-            daily_stats = daily_stats.merge(checkin_counts, on='Datum', how='left')
-            daily_stats['Checkins'] = daily_stats['Checkins'].fillna(0).astype(int)
-        else:
-            daily_stats['Checkins'] = 0
+        # Tages-Statistiken für den Monat (aus dem Rollup, nur Tage mit Buchungen)
+        daily_stats = month_rollup(load_daily_rollup(), first_day, last_day)
+        daily_stats = daily_stats[daily_stats['buchungen'] > 0].rename(columns={
+            'date_obj': 'Datum', 'umsatz': 'Umsatz', 'buchungen': 'Buchungen', 'fehler': 'Fehler', 'checkins': 'Checkins'
+        })[['Datum', 'Umsatz', 'Buchungen', 'Fehler', 'Checkins']]
         
         # Wellpass-Wert hinzufügen
         daily_stats['Wellpass_Umsatz'] = daily_stats['Checkins'] * WELLPASS_WERT
@@ -3155,103 +5006,99 @@ with tab4:
         # ========================================
         
         st.markdown("#### 📈 Wochentag-Prognose")
-        st.caption("Basierend auf historischen Durchschnittswerten")
-        
-        # Durchschnitt pro Wochentag berechnen (letzte 8 Wochen)
-        eight_weeks_ago = today - timedelta(weeks=8)
-        recent_data = all_buchungen[all_buchungen['date_obj'] >= eight_weeks_ago]
-        
-        # Tages-Umsätze berechnen
-        daily_revenue = recent_data.groupby(['date_obj', 'Wochentag', 'Wochentag_Name']).agg({
-            'Betrag_num': 'sum',
-            'Name': 'count'
-        }).reset_index()
-        daily_revenue.columns = ['Datum', 'Wochentag', 'Wochentag_Name', 'Umsatz', 'Buchungen']
-        
-        # Wellpass dazu
-        if not all_checkins.empty:
-            recent_checkins = all_checkins[all_checkins['date_obj'] >= eight_weeks_ago]
-            checkin_daily = recent_checkins.groupby('date_obj')['Name_norm'].nunique().reset_index()
-            checkin_daily.columns = ['Datum', 'Checkins']
-            daily_revenue = daily_revenue.merge(checkin_daily, on='Datum', how='left')
-            daily_revenue['Checkins'] = daily_revenue['Checkins'].fillna(0)
-            daily_revenue['Wellpass'] = daily_revenue['Checkins'] * WELLPASS_WERT
-            daily_revenue['Gesamt'] = daily_revenue['Umsatz'] + daily_revenue['Wellpass']
-        else:
-            daily_revenue['Gesamt'] = daily_revenue['Umsatz']
-        
-        # Durchschnitt pro Wochentag
-        weekday_avg = daily_revenue.groupby(['Wochentag', 'Wochentag_Name']).agg({
-            'Gesamt': 'mean',
-            'Buchungen': 'mean',
-            'Datum': 'count'  # Anzahl Datenpunkte
-        }).reset_index()
-        weekday_avg.columns = ['Wochentag', 'Wochentag_Name', 'Ø_Umsatz', 'Ø_Buchungen', 'Datenpunkte']
-        weekday_avg = weekday_avg.sort_values('Wochentag')
-        
-        # Balkendiagramm
-        fig_weekday = go.Figure()
-        
-        fig_weekday.add_trace(go.Bar(
-            x=weekday_avg['Wochentag_Name'],
-            y=weekday_avg['Ø_Umsatz'],
-            marker_color=[COLORS['primary'] if i < 5 else COLORS['secondary'] for i in range(7)],
-            text=[f"€{x:.0f}" for x in weekday_avg['Ø_Umsatz']],
-            textposition='outside'
-        ))
-        
-        fig_weekday.update_layout(
-            title="Durchschnittlicher Umsatz pro Wochentag",
-            xaxis_title="",
-            yaxis_title="Ø Umsatz (€)",
-            height=350,
-            showlegend=False
-        )
-        
-        st.plotly_chart(fig_weekday, use_container_width=True)
-        
-        # Prognose für aktuelle/nächste Woche
-        st.markdown("##### 🎯 Prognose für diese Woche")
-        
-        # Berechne Start der aktuellen Woche (Montag)
-        days_since_monday = today.weekday()
-        monday = today - timedelta(days=days_since_monday)
+        st.caption("Modell aus Wochentag, Feiertagen und Trend der letzten 6 Monate")
         
-        prognose_data = []
-        for i in range(7):
-            day = monday + timedelta(days=i)
-            day_name = wochentag_namen[i]
-            avg_row = weekday_avg[weekday_avg['Wochentag'] == i]
+        forecast_model = get_revenue_forecast()
+        if forecast_model is None:
+            st.info("Noch nicht genug Daten für eine Prognose (mind. 3 Wochen)")
+        else:
+            # Berechne Start der aktuellen Woche (Montag)
+            days_since_monday = today.weekday()
+            monday = today - timedelta(days=days_since_monday)
+            week_days = [monday + timedelta(days=i) for i in range(7)]
+            week_forecast = predict_forecast(forecast_model, week_days)
+            week_holidays = german_holidays({d.year for d in week_days})
+            
+            rollup = load_daily_rollup()
+            week_rollup = rollup[rollup['date_obj'].isin(week_days) & (rollup['buchungen'] > 0)]
+            actual_by_day = dict(zip(week_rollup['date_obj'], week_rollup['umsatz'] + week_rollup['checkins'] * WELLPASS_WERT))
+            
+            # Balkendiagramm
+            fig_weekday = go.Figure()
+            
+            fig_weekday.add_trace(go.Bar(
+                x=wochentag_namen,
+                y=week_forecast['gesamt'],
+                marker_color=[COLORS['primary'] if i < 5 else COLORS['secondary'] for i in range(7)],
+                text=[f"€{x:.0f}" for x in week_forecast['gesamt']],
+                textposition='outside'
+            ))
+            
+            fig_weekday.update_layout(
+                title="Erwarteter Umsatz pro Wochentag (diese Woche)",
+                xaxis_title="",
+                yaxis_title="Erwarteter Umsatz (€)",
+                height=350,
+                showlegend=False
+            )
+            
+            st.plotly_chart(fig_weekday, use_container_width=True)
+            
+            # Prognose für aktuelle Woche
+            st.markdown("##### 🎯 Prognose für diese Woche")
             
-            if not avg_row.empty:
-                expected = avg_row.iloc[0]['Ø_Umsatz']
-                expected_bookings = avg_row.iloc[0]['Ø_Buchungen']
+            prognose_data = []
+            for i, day in enumerate(week_days):
+                expected = week_forecast.iloc[i]['gesamt']
+                actual = actual_by_day.get(day) if day <= today else None
+                
+                prognose_data.append({
+                    'Tag': wochentag_namen[i] + (' 🎉' if day in week_holidays else ''),
+                    'Datum': day.strftime('%d.%m.'),
+                    'Erwartet': f"€{expected:.0f}",
+                    'Tatsächlich': f"€{actual:.0f}" if actual is not None else "—",
+                    'Differenz': f"{((actual/expected)-1)*100:+.0f}%" if actual is not None and expected > 0 else "—",
+                    'Status': '✅' if day <= today else '🔮'
+                })
+            
+            prognose_df = pd.DataFrame(prognose_data)
+            st.dataframe(prognose_df, use_container_width=True, hide_index=True)
+            
+            # Wochen-Summe Prognose
+            weekly_expected = week_forecast['gesamt'].sum()
+            st.metric("📊 Erwarteter Wochen-Umsatz", f"€{weekly_expected:.0f}")
+            
+            # Stunden-Nachfrage: erwartete Tagesbuchungen × Stundenprofil des Wochentags
+            st.markdown("##### ⏰ Erwartete Buchungen pro Stunde")
+            demand_day = st.selectbox(
+                "Tag",
+                options=week_days,
+                index=days_since_monday,
+                format_func=lambda d: f"{wochentag_namen[d.weekday()]} {d.strftime('%d.%m.')}",
+                key="demand_day"
+            )
+            profile = get_hourly_demand_profile()[demand_day.weekday()]
+            hours = np.flatnonzero(profile)
+            if hours.size:
+                expected_hourly = week_forecast.iloc[week_days.index(demand_day)]['buchungen'] * profile[hours]
+                fig_hourly = go.Figure(go.Bar(x=[f"{h}:00" for h in hours], y=expected_hourly, marker_color=COLORS['primary']))
+                fig_hourly.update_layout(xaxis_title="", yaxis_title="Ø Buchungen", height=300, showlegend=False)
+                st.plotly_chart(fig_hourly, use_container_width=True)
             else:
-                expected = 0
-                expected_bookings = 0
-            
-            # Actual wenn Tag in der Vergangenheit
-            actual = None
-            if day <= today:
-                day_actual = daily_revenue[daily_revenue['Datum'] == day]
-                if not day_actual.empty:
-                    actual = day_actual.iloc[0]['Gesamt']
-            
-            prognose_data.append({
-                'Tag': day_name,
-                'Datum': day.strftime('%d.%m.'),
-                'Erwartet': f"€{expected:.0f}",
-                'Tatsächlich': f"€{actual:.0f}" if actual is not None else "—",
-                'Differenz': f"{((actual/expected)-1)*100:+.0f}%" if actual is not None and expected > 0 else "—",
-                'Status': '✅' if day <= today else '🔮'
-            })
-        
-        prognose_df = pd.DataFrame(prognose_data)
-        st.dataframe(prognose_df, use_container_width=True, hide_index=True)
-        
-        # Wochen-Summe Prognose
-        weekly_expected = weekday_avg['Ø_Umsatz'].sum()
-        st.metric("📊 Erwarteter Wochen-Umsatz", f"€{weekly_expected:.0f}")
+                st.info("Keine Uhrzeit-Daten verfügbar")
+            
+            with st.expander("🧪 Backtest: Prognosefehler je Horizont"):
+                backtest = get_forecast_backtest()
+                if backtest.empty:
+                    st.info("Noch nicht genug Historie für einen Backtest")
+                else:
+                    st.caption(f"MAE Gesamt-Umsatz/Tag über {FORECAST_BACKTEST_ORIGINS} wöchentliche Startpunkte · "
+                               f"Modell €{backtest['Modell'].mean():.0f} vs. Wochentag-Ø €{backtest['Wochentag_Ø'].mean():.0f}")
+                    st.dataframe(
+                        backtest.rename(columns={'Horizont': 'Horizont (Tage)', 'Modell': 'MAE Modell (€)', 'Wochentag_Ø': 'MAE Wochentag-Ø (€)'}).round(1),
+                        use_container_width=True,
+                        hide_index=True
+                    )
         
         st.markdown("---")
         
@@ -3261,60 +5108,57 @@ with tab4:
         
         st.markdown("#### ⏰ Peak-Zeiten (Wann wird gespielt?)")
         
-        if 'Stunde' in all_buchungen.columns:
-            # Filtere auf gültige Stunden
-            heatmap_data = all_buchungen[all_buchungen['Stunde'].notna()].copy()
-            heatmap_data['Stunde'] = heatmap_data['Stunde'].astype(int)
+        heatmap_weeks = st.selectbox(
+            "Zeitraum",
+            options=[4, 12, 26, 52, 0],
+            index=4,
+            format_func=lambda x: f"Letzte {x} Wochen" if x else "Gesamt",
+            key="heatmap_weeks"
+        )
+        
+        # Wochentag × Stunde aus den vorberechneten Wochenmatrizen
+        heatmap_start = today - timedelta(weeks=heatmap_weeks) if heatmap_weeks else None
+        heatmap_counts = demand_matrix(load_demand_slabs(), heatmap_start)
+        heatmap_hours = np.flatnonzero(heatmap_counts.sum(axis=0))
+        
+        if heatmap_hours.size:
+            heatmap_matrix = heatmap_counts[:, heatmap_hours].T  # Zeilen = Stunden, Spalten = Mo–So
             
-            if not heatmap_data.empty:
-                # Pivot-Tabelle: Wochentag × Stunde
-                heatmap_pivot = heatmap_data.groupby(['Wochentag', 'Stunde']).size().reset_index(name='Buchungen')
-                heatmap_matrix = heatmap_pivot.pivot(index='Stunde', columns='Wochentag', values='Buchungen').fillna(0)
-                
-                # Sicherstellen dass alle Wochentage vorhanden sind
-                for i in range(7):
-                    if i not in heatmap_matrix.columns:
-                        heatmap_matrix[i] = 0
-                heatmap_matrix = heatmap_matrix.reindex(columns=range(7))
-                heatmap_matrix.columns = ['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So']
-                
-                # Heatmap erstellen
-                fig_heatmap = go.Figure(data=go.Heatmap(
-                    z=heatmap_matrix.values,
-                    x=heatmap_matrix.columns,
-                    y=[f"{h}:00" for h in heatmap_matrix.index],
-                    colorscale=[
-                        [0, '#F5F5F5'],
-                        [0.25, '#C8E6C9'],
-                        [0.5, '#81C784'],
-                        [0.75, '#4CAF50'],
-                        [1, '#1B5E20']
-                    ],
-                    hovertemplate='%{x} %{y}: %{z} Buchungen<extra></extra>'
-                ))
-                
-                fig_heatmap.update_layout(
-                    title="Buchungen nach Uhrzeit und Wochentag",
-                    xaxis_title="",
-                    yaxis_title="Uhrzeit",
-                    height=400,
-                    yaxis=dict(autorange='reversed')
-                )
-                
-                st.plotly_chart(fig_heatmap, use_container_width=True)
-                
-                # Top 3 Peak-Zeiten
-                top_peaks = heatmap_pivot.nlargest(3, 'Buchungen')
-                peak_text = []
-                for _, row in top_peaks.iterrows():
-                    day_name = wochentag_namen[int(row['Wochentag'])]
-                    peak_text.append(f"**{day_name} {int(row['Stunde'])}:00** ({int(row['Buchungen'])} Buchungen)")
-                
-                st.markdown(f"🔥 **Top Peak-Zeiten:** {' · '.join(peak_text)}")
-            else:
-                st.info("Keine Uhrzeit-Daten verfügbar")
+            # Heatmap erstellen
+            fig_heatmap = go.Figure(data=go.Heatmap(
+                z=heatmap_matrix,
+                x=['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So'],
+                y=[f"{h}:00" for h in heatmap_hours],
+                colorscale=[
+                    [0, '#F5F5F5'],
+                    [0.25, '#C8E6C9'],
+                    [0.5, '#81C784'],
+                    [0.75, '#4CAF50'],
+                    [1, '#1B5E20']
+                ],
+                hovertemplate='%{x} %{y}: %{z} Buchungen<extra></extra>'
+            ))
+            
+            fig_heatmap.update_layout(
+                title="Buchungen nach Uhrzeit und Wochentag",
+                xaxis_title="",
+                yaxis_title="Uhrzeit",
+                height=400,
+                yaxis=dict(autorange='reversed')
+            )
+            
+            st.plotly_chart(fig_heatmap, use_container_width=True)
+            
+            # Top 3 Peak-Zeiten
+            top_cells = np.argsort(-heatmap_counts, axis=None, kind='stable')[:3]
+            peak_text = []
+            for weekday, hour in zip(*np.unravel_index(top_cells, heatmap_counts.shape)):
+                if heatmap_counts[weekday, hour] > 0:
+                    peak_text.append(f"**{wochentag_namen[weekday]} {hour}:00** ({int(heatmap_counts[weekday, hour])} Buchungen)")
+            
+            st.markdown(f"🔥 **Top Peak-Zeiten:** {' · '.join(peak_text)}")
         else:
-            st.info("Keine Uhrzeit-Daten in den Buchungen")
+            st.info("Keine Uhrzeit-Daten verfügbar")
         
         st.markdown("---")
         
@@ -3329,14 +5173,9 @@ with tab4:
         last_week_end = today - timedelta(days=7)
         this_week_start = today - timedelta(days=7)
         
-        last_week_players = set(all_buchungen[
-            (all_buchungen['date_obj'] >= last_week_start) & 
-            (all_buchungen['date_obj'] < last_week_end)
-        ]['Name_norm'].unique())
-        
-        this_week_players = set(all_buchungen[
-            (all_buchungen['date_obj'] >= this_week_start)
-        ]['Name_norm'].unique())
+        player_daily = load_player_daily()
+        last_week_players = active_players(player_daily, last_week_start, last_week_end)
+        this_week_players = active_players(player_daily, this_week_start)
         
         if len(last_week_players) > 0:
             returning = last_week_players.intersection(this_week_players)
@@ -3463,19 +5302,19 @@ Dein halle11 Team""",
     # SPIELER-LISTE LADEN
     # ========================================
     
-    buchungen = loadsheet("buchungen")
+    buchungen = get_data_context()['buchungen']
     vielspieler_list = []
     all_players_list = []
+    counts = pd.DataFrame(columns=['Name', 'Buchungen'])
     
-    if not buchungen.empty:
-        buchungen['date_obj'] = pd.to_datetime(buchungen['analysis_date'], errors='coerce').dt.date
+    if not buchungen.empty and 'date_obj' in buchungen.columns:
         cutoff = date.today() - timedelta(days=30)
         
         # Vielspieler (≥4 Wellpass-Buchungen in 30 Tagen)
         recent = buchungen[
             (buchungen['date_obj'] >= cutoff) & 
-            (buchungen['Mitarbeiter'] != 'Ja') &
-            (buchungen['Relevant'] == 'Ja')
+            ~buchungen['Mitarbeiter'] &
+            buchungen['Relevant']
         ]
         
         if not recent.empty:
@@ -3566,24 +5405,31 @@ Dein halle11 Team""",
     st.markdown("---")
     st.markdown("### 📝 Nachricht anpassen")
     
-    # Platzhalter ersetzen
-    template_text = selected_template['template']
-    
-    # Name ersetzen
-    if selected_player:
-        template_text = template_text.replace("{name}", selected_player.split()[0])
-        template_text = template_text.replace("{buchungen}", str(counts[counts['Name']==selected_player]['Buchungen'].values[0]) if not counts[counts['Name']==selected_player].empty else "X")
-    elif manual_name:
-        template_text = template_text.replace("{name}", manual_name.split()[0] if manual_name else "")
-        template_text = template_text.replace("{buchungen}", "X")
+    buchungen_by_name = dict(zip(counts['Name'], counts['Buchungen']))
     
-    # Bearbeitbares Textfeld
+    # Bearbeitbares Textfeld – {name}/{buchungen} werden erst pro Empfänger ersetzt
     final_message = st.text_area(
         "Nachricht (bearbeitbar):",
-        value=template_text,
+        value=selected_template['template'],
         height=250,
         key="final_message"
     )
+    st.caption("{name} und {buchungen} werden pro Empfänger ersetzt – [..]-Platzhalter bitte selbst ausfüllen.")
+    
+    recipient = selected_player or manual_name
+    if selected_player:
+        personal_message = fill_message_placeholders(final_message, selected_player, buchungen_by_name.get(selected_player, "X"))
+    elif manual_name:
+        personal_message = fill_message_placeholders(final_message, manual_name, "X")
+    else:
+        personal_message = final_message
+    missing_placeholders = open_placeholders(personal_message)
+    
+    if recipient:
+        with st.expander(f"👀 Vorschau für {recipient}"):
+            st.text(personal_message)
+    if missing_placeholders:
+        st.warning(f"⚠️ Noch offene Platzhalter: {', '.join(missing_placeholders)}")
     
     # ========================================
     # SENDEN BUTTONS
@@ -3592,7 +5438,7 @@ Dein halle11 Team""",
     col_send, col_test = st.columns(2)
     
     with col_send:
-        can_send = (selected_player is not None) or (manual_phone and manual_name)
+        can_send = ((selected_player is not None) or (manual_phone and manual_name)) and not missing_placeholders
         
         if st.button("📤 WhatsApp senden", type="primary", use_container_width=True, disabled=not can_send):
             st.session_state['confirm_vielspieler_wa'] = True
@@ -3601,8 +5447,6 @@ Dein halle11 Team""",
         if st.button("🧪 Test an Admin", use_container_width=True):
             # Test an Admin-Nummer senden
             try:
-                from twilio.rest import Client
-                
                 twilio_conf = st.secrets.get("twilio", {})
                 account_sid = twilio_conf.get("account_sid")
                 auth_token = twilio_conf.get("auth_token")
@@ -3610,14 +5454,14 @@ Dein halle11 Team""",
                 admin_phone = twilio_conf.get("whatsapp_to")
                 
                 if all([account_sid, auth_token, from_number, admin_phone]):
-                    client = Client(account_sid, auth_token)
+                    client = get_twilio_client(account_sid, auth_token)
                     
                     to_number = admin_phone if admin_phone.startswith("whatsapp:") else f"whatsapp:{admin_phone}"
                     
                     msg = client.messages.create(
                         from_=from_number,
                         to=to_number,
-                        body=f"[TEST] {final_message}"
+                        body=f"[TEST] {personal_message}"
                     )
                     
                     st.success(f"✅ Test gesendet! SID: {msg.sid}")
@@ -3628,25 +5472,21 @@ Dein halle11 Team""",
     
     # Bestätigungsdialog
     if st.session_state.get('confirm_vielspieler_wa', False):
-        recipient = selected_player or manual_name
         st.warning(f"⚠️ Nachricht wirklich an **{recipient}** senden?")
         
         col_yes, col_no = st.columns(2)
         with col_yes:
             if st.button("✅ Ja, senden!", type="primary", use_container_width=True):
                 try:
-                    from twilio.rest import Client
-                    
                     # Telefonnummer ermitteln
                     if manual_phone:
                         phone = manual_phone
                     else:
                         # Aus Customers-Sheet laden
-                        customers = loadsheet("customers")
-                        if not customers.empty and 'name' in customers.columns:
-                            player_match = customers[customers['name'].apply(normalize_name) == normalize_name(selected_player)]
-                            if not player_match.empty and 'phone_number' in player_match.columns:
-                                phone = str(player_match.iloc[0]['phone_number'])
+                        if get_name_resolver()['customers']:
+                            customer = find_customer(selected_player)
+                            if customer_phone(customer) is not None:
+                                phone = customer_phone(customer)
                             else:
                                 st.error(f"Keine Telefonnummer für {selected_player} gefunden")
                                 st.session_state['confirm_vielspieler_wa'] = False
@@ -3664,12 +5504,12 @@ Dein halle11 Team""",
                     
                     # Senden
                     twilio_conf = st.secrets.get("twilio", {})
-                    client = Client(twilio_conf["account_sid"], twilio_conf["auth_token"])
+                    client = get_twilio_client(twilio_conf["account_sid"], twilio_conf["auth_token"])
                     
                     msg = client.messages.create(
                         from_=twilio_conf["whatsapp_from"],
                         to=to_number,
-                        body=final_message
+                        body=personal_message
                     )
                     
                     st.success(f"✅ Gesendet an {recipient}! SID: {msg.sid}")
@@ -3684,6 +5524,37 @@ Dein halle11 Team""",
                 st.session_state['confirm_vielspieler_wa'] = False
                 st.rerun()
     
+    # Massenversand: aktueller Text an alle Vielspieler (im Hintergrund, mit Rate-Limit)
+    if vielspieler_list:
+        bulk_messages = {
+            name: fill_message_placeholders(final_message, name, buchungen_by_name.get(name, "X"))
+            for name in vielspieler_list
+        }
+        bulk_missing = sorted({p for text in bulk_messages.values() for p in open_placeholders(text)})
+        if st.button(f"📨 Nachricht an alle {len(vielspieler_list)} Vielspieler senden", key="send_all_vielspieler",
+                     disabled=bool(bulk_missing), use_container_width=True):
+            st.session_state['confirm_vielspieler_bulk'] = True
+        if bulk_missing:
+            st.caption(f"Massenversand gesperrt – offene Platzhalter: {', '.join(bulk_missing)}")
+        
+        if st.session_state.get('confirm_vielspieler_bulk', False) and not bulk_missing:
+            st.warning(f"⚠️ Nachricht wirklich an alle **{len(vielspieler_list)} Vielspieler** senden?")
+            col_yes, col_no = st.columns(2)
+            with col_yes:
+                if st.button("✅ Ja, an alle senden!", type="primary", key="confirm_bulk_yes", use_container_width=True):
+                    st.session_state['confirm_vielspieler_bulk'] = False
+                    jobs, skipped = build_text_jobs(bulk_messages)
+                    if jobs:
+                        enqueue_whatsapp_jobs(jobs)
+                        st.success(f"📬 {len(jobs)} Nachrichten in der Versandqueue")
+                    if skipped:
+                        st.warning(f"❌ Keine Telefonnummer: {', '.join(map(str, skipped))}")
+            with col_no:
+                if st.button("❌ Abbrechen", key="confirm_bulk_no", use_container_width=True):
+                    st.session_state['confirm_vielspieler_bulk'] = False
+                    st.rerun()
+        render_whatsapp_queue_status()
+    
     st.markdown("---")
     
     # ========================================
@@ -0,0 +1,40 @@
+"""
+Benchmark CSV-Ingestion: alter Parser (Python-Engine) gegen sniff_csv + read_csv_chunked.
+
+    python tests/bench_csv.py [rows]
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from conftest import load_app_module  # noqa: E402
+from csv_export import make_playtomic_export  # noqa: E402
+from test_csv import old_parse_playtomic_csv  # noqa: E402
+
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(rows=60_000):
+    app = load_app_module()
+    content = make_playtomic_export(rows)
+    print(f"{rows} Zeilen, {len(content) / 1e6:.1f} MB")
+
+    old_time, old_df = best_of(lambda: old_parse_playtomic_csv(content))
+    new_time, new_df = best_of(lambda: app.parse_playtomic_csv(io.BytesIO(content)))
+
+    assert old_df.equals(new_df), "Ergebnis weicht vom alten Parser ab"
+    print(f"alt: {old_time:.2f}s  neu: {new_time:.2f}s  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 60_000)
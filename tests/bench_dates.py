@@ -0,0 +1,58 @@
+"""
+Benchmark Datums-Parsing: parse_date_safe per .apply gegen parse_dates_vectorized.
+
+    python tests/bench_dates.py [rows]
+"""
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from conftest import load_app_module  # noqa: E402
+
+
+def make_service_dates(rows, seed=0):
+    """Playtomic-typische Werte: überwiegend 'dd/mm/YYYY HH:MM', dazu andere Formate und Müll."""
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    values = []
+    for _ in range(rows):
+        day = start + timedelta(days=rng.randrange(365))
+        time_of_day = f"{rng.randint(8, 22):02d}:{rng.choice(['00', '30'])}"
+        roll = rng.random()
+        if roll < 0.85:
+            values.append(f"{day:%d/%m/%Y} {time_of_day}")
+        elif roll < 0.93:
+            values.append(f"{day:%Y-%m-%d} {time_of_day}:00")
+        elif roll < 0.97:
+            values.append(f"{day:%d.%m.%Y}")
+        else:
+            values.append(rng.choice(['', '-', None, 'garbage', '31/02/2025']))
+    return pd.Series(values, dtype=object)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(rows=100_000):
+    app = load_app_module()
+    values = make_service_dates(rows)
+    print(f"{rows} Werte, {values.nunique()} verschiedene")
+
+    old_time, old = timed(lambda: values.apply(app.parse_date_safe))
+    new_time, new = timed(lambda: app.parse_dates_vectorized(values))
+
+    assert old.tolist() == new.tolist(), "Ergebnis weicht von parse_date_safe ab"
+    print(f"apply: {old_time:.2f}s  vektorisiert: {new_time:.2f}s  ({old_time / new_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,59 @@
+"""
+Lädt den Bibliotheksteil von Halle11.py (alles vor st.set_page_config) als Modul,
+ohne die Streamlit-Oberfläche zu starten.
+"""
+import ast
+import logging
+import types
+import warnings
+from pathlib import Path
+
+import pytest
+import streamlit as st
+
+from fake_sheets import FakeWorksheet
+
+APP_PATH = Path(__file__).resolve().parent.parent / "Halle11.py"
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+warnings.filterwarnings("ignore", module="streamlit")
+
+
+def load_app_module():
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    body = []
+    for node in tree.body:
+        if (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+                and ast.unparse(node.value.func) == "st.set_page_config"):
+            break
+        body.append(node)
+    module = types.ModuleType("halle11")
+    exec(compile(ast.Module(body=body, type_ignores=[]), str(APP_PATH), "exec"), module.__dict__)
+    return module
+
+
+@pytest.fixture(scope="session")
+def app():
+    return load_app_module()
+
+
+@pytest.fixture
+def sqlite_app(app, tmp_path, monkeypatch):
+    """App-Modul mit frischer SQLite-Datenbank und leeren Caches."""
+    monkeypatch.setattr(app, "get_storage_config", lambda: {"backend": "sqlite", "sqlite_path": str(tmp_path / "halle11.db")})
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield app
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def sheets_app(app, monkeypatch):
+    """App-Modul auf dem Google-Sheets-Pfad, Worksheets als FakeWorksheet im Speicher."""
+    sheets = {}
+    monkeypatch.setattr(app, "get_worksheet", lambda name: sheets.setdefault(name, FakeWorksheet()))
+    monkeypatch.setattr(app, "get_storage_backend", lambda: "gsheets")
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield app, sheets
+    st.cache_resource.clear()
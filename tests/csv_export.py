@@ -0,0 +1,30 @@
+"""Synthetischer Playtomic-Export für Parser-Tests und den Benchmark."""
+import random
+from datetime import date, timedelta
+
+PREAMBLE = [
+    "Playtomic Club Manager;halle11",
+    "Report;Payments",
+    "Zeitraum;01/01/2026 – 31/12/2026",
+    "",
+]
+EXTRA_COLUMNS = [f"Extra {i}" for i in range(31)]
+COLUMNS = ["User name", "Product SKU", "Service date", "Total"] + EXTRA_COLUMNS
+
+
+def make_playtomic_export(rows, seed=0, preamble=PREAMBLE, encoding="utf-8-sig"):
+    rng = random.Random(seed)
+    first = ["Anna", "Tim", "Jörg", "Zoë", "Max", "Lena"]
+    last = ["Otto", "Kern", "Müller", "Nußbaum", "Schmidt"]
+    lines = list(preamble) + [";".join(COLUMNS)]
+    start = date(2026, 1, 1)
+    for i in range(rows):
+        day = start + timedelta(days=i % 365)
+        values = [
+            f"{rng.choice(first)} {rng.choice(last)}",
+            rng.choice(["PADEL_60", "PADEL_90", "WELLPASS"]),
+            f"{day:%d/%m/%Y} {rng.randint(8, 22):02d}:{rng.choice(['00', '30'])}",
+            f"{rng.uniform(0, 60):.2f}",
+        ] + [str(rng.randint(0, 999)) for _ in EXTRA_COLUMNS]
+        lines.append(";".join(values))
+    return ("\r\n".join(lines) + "\r\n").encode(encoding)
@@ -0,0 +1,55 @@
+"""Minimaler In-Memory-Ersatz für ein gspread-Worksheet (nur die Aufrufe, die Halle11 nutzt)."""
+import re
+
+
+class FakeWorksheet:
+    def __init__(self, rows=None):
+        self.rows = [list(r) for r in (rows or [])]
+        self.calls = []
+
+    def row_values(self, i):
+        return [str(v) for v in self.rows[i - 1]] if len(self.rows) >= i else []
+
+    def col_values(self, c):
+        values = [str(r[c - 1]) if len(r) >= c else '' for r in self.rows]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def clear(self):
+        self.calls.append('clear')
+        self.rows = []
+
+    def update(self, values, range_name=None, value_input_option=None):
+        self.calls.append(('update', range_name))
+        if range_name is None:
+            self.rows = [list(r) for r in values]
+            return
+        start = int(re.sub(r'^[A-Z]+', '', range_name))
+        for i, r in enumerate(values):
+            self.rows[start - 1 + i] = list(r)
+
+    def batch_update(self, data, value_input_option=None):
+        self.calls.append(('batch_update', len(data)))
+        for item in data:
+            start = int(re.sub(r'^[A-Z]+', '', item['range']))
+            for i, r in enumerate(item['values']):
+                self.rows[start - 1 + i] = list(r)
+
+    def append_rows(self, values, value_input_option=None):
+        self.calls.append(('append', len(values)))
+        self.rows += [list(r) for r in values]
+
+    def delete_rows(self, start, end=None):
+        self.calls.append(('delete', start, end))
+        del self.rows[start - 1:(end or start)]
+
+    def batch_get(self, ranges):
+        out = []
+        for rg in ranges:
+            a, b = map(int, rg.split(':'))
+            out.append([[str(v) for v in r] for r in self.rows[a - 1:b]])
+        return out
+
+    def get_all_values(self):
+        return [[str(v) for v in r] for r in self.rows]
@@ -0,0 +1,38 @@
+"""Corrections-Store: Index pro Datenstand, Schreiben/Löschen per Schlüssel."""
+
+import pandas as pd
+
+
+def test_corrections_index_follows_sheet_version(sqlite_app):
+    app = sqlite_app
+    key = app.fehler_key({'Name_norm': 'anna otto', 'Datum': '2026-10-01', 'Betrag': 2.5})
+    assert app.get_corrections_index() == {}
+
+    assert app.upsert_correction(key, '2026-10-01', True)
+    assert app.get_corrections_index() == {key: True}
+
+    assert app.upsert_correction(key, '2026-10-01', False)
+    assert app.get_corrections_index() == {key: False}
+
+    assert app.delete_correction(key)
+    assert app.get_corrections_index() == {}
+
+
+def test_correction_writes_replace_legacy_key_variants(sqlite_app):
+    app = sqlite_app
+    key = app.fehler_key({'Name_norm': 'anna otto', 'Datum': '2026-10-01', 'Betrag': 2.2})
+    legacy = pd.DataFrame([
+        {'key': 'anna otto_2026-10-01_2.200000047683716', 'date': '2026-10-01', 'behoben': True, 'timestamp': '2026-10-01T10:00:00'},
+        {'key': 'anna otto_2026-10-01_2.2', 'date': '2026-10-01', 'behoben': True, 'timestamp': '2026-10-01T11:00:00'},
+    ], columns=app.CORRECTIONS_COLUMNS)
+    assert app.savesheet(legacy, "corrections")
+    assert app.get_corrections_index() == {key: True}
+
+    assert app.upsert_correction(key, '2026-10-01', False)
+    assert app.get_corrections_index() == {key: False}
+    assert app.loadsheet("corrections", app.CORRECTIONS_COLUMNS)['key'].tolist() == [key]
+
+    assert app.savesheet(legacy, "corrections")
+    assert app.delete_correction(key)
+    assert app.get_corrections_index() == {}
+    assert app.loadsheet("corrections", app.CORRECTIONS_COLUMNS).empty
@@ -0,0 +1,53 @@
+"""CSV-Ingestion: Header-Erkennung und Parität mit dem alten Parser."""
+import io
+
+import pandas as pd
+
+from csv_export import COLUMNS, PREAMBLE, make_playtomic_export
+
+
+def old_parse_playtomic_csv(content):
+    """Referenz: der frühere Parser (ganzer Text dekodiert, Python-Engine)."""
+    text = content.decode("utf-8-sig")
+    lines = text.strip().split("\n")
+    header_row = next(i for i, line in enumerate(lines) if all(col in line for col in COLUMNS[:4]))
+    df = pd.read_csv(io.BytesIO(content), sep=";", skiprows=header_row, engine="python",
+                     on_bad_lines="skip", encoding="utf-8-sig")
+    df.columns = df.columns.str.strip().str.replace("﻿", "")
+    return df
+
+
+def test_parse_playtomic_csv_matches_old_parser(app):
+    content = make_playtomic_export(500)
+
+    new = app.parse_playtomic_csv(io.BytesIO(content))
+
+    pd.testing.assert_frame_equal(new, old_parse_playtomic_csv(content))
+
+
+def test_sniff_csv_only_splits_on_newline(app):
+    # \x85 ist in cp1252 ein "…", latin-1 dekodiert es zu U+0085 – splitlines() würde dort trennen
+    preamble = ["Playtomic Club Manager;halle11 \x85 Padel", "Zeitraum;2026\x0b", ""]
+    content = make_playtomic_export(5, preamble=preamble, encoding="latin-1")
+
+    sniffed = app.sniff_csv(io.BytesIO(content), lambda line: all(col in line for col in COLUMNS[:4]))
+
+    assert sniffed["encoding"] == "latin-1"
+    assert sniffed["header_row"] == len(preamble)
+    assert sniffed["delimiter"] == ";"
+    assert not any(line.endswith("\r") for line in sniffed["preview"])
+
+    df = app.read_csv_chunked(io.BytesIO(content), sniffed, app.clean_csv_columns)
+    assert list(df.columns) == COLUMNS
+    assert len(df) == 5
+
+
+def test_sniff_csv_crlf_window_boundary(app, monkeypatch):
+    monkeypatch.setattr(app, "CSV_SNIFF_BYTES", 1024)
+    content = make_playtomic_export(50)
+
+    sniffed = app.sniff_csv(io.BytesIO(content), lambda line: all(col in line for col in COLUMNS[:4]))
+
+    assert sniffed["header_row"] == len(PREAMBLE)
+    df = app.read_csv_chunked(io.BytesIO(content), sniffed, app.clean_csv_columns)
+    assert len(df) == 50
@@ -0,0 +1,33 @@
+"""Parität: parse_dates_vectorized gegen den zeilenweisen parse_date_safe."""
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+MIXED_VALUES = [
+    '01/10/2025 18:30', '01/10/2025', '2025-10-01 18:30:00', '2025-10-01',
+    '01.10.2025 18:30', '01.10.2025', '20251001',
+    '  13/02/2025  ', '31/02/2025', '2025-02-30', '13.13.2025',
+    '2025-10-01T08:00', '1 Oct 2025', 'Oct 1, 2025', '5/3/2025',
+    '', '-', None, np.nan, pd.NaT, 'garbage', 'nan',
+    20251001, datetime(2025, 10, 1, 18, 30), date(2025, 10, 2), pd.Timestamp('2025-10-03 07:00'),
+]
+
+
+def test_parse_dates_vectorized_matches_row_parser(app):
+    values = pd.Series(MIXED_VALUES * 3, dtype=object)
+
+    expected = [app.parse_date_safe(v) for v in values]
+    actual = app.parse_dates_vectorized(values)
+
+    assert list(actual.index) == list(values.index)
+    assert actual.tolist() == expected
+
+
+def test_parse_dates_vectorized_keeps_index_and_all_invalid(app):
+    values = pd.Series(['', '-', None], index=[7, 3, 9], dtype=object)
+
+    result = app.parse_dates_vectorized(values)
+
+    assert list(result.index) == [7, 3, 9]
+    assert result.isna().all()
@@ -0,0 +1,84 @@
+"""Prognose: Feiertage, Kleinste-Quadrate-Fit und Rolling-Origin-Backtest."""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+WEEKDAY_EFFECT = np.array([0.0, 10.0, 20.0, 15.0, 40.0, 90.0, 70.0])  # Mo–So
+
+
+@pytest.mark.parametrize("year, easter", [
+    (2008, date(2008, 3, 23)), (2019, date(2019, 4, 21)), (2024, date(2024, 3, 31)),
+    (2025, date(2025, 4, 20)), (2026, date(2026, 4, 5)), (2038, date(2038, 4, 25)),
+])
+def test_easter_sunday(app, year, easter):
+    assert app.easter_sunday(year) == easter
+
+
+def test_german_holidays_2026(app):
+    assert sorted(app.german_holidays([2026])) == [
+        date(2026, 1, 1), date(2026, 4, 3), date(2026, 4, 6), date(2026, 5, 1), date(2026, 5, 14),
+        date(2026, 5, 25), date(2026, 10, 3), date(2026, 12, 25), date(2026, 12, 26),
+    ]
+
+
+def synthetic_series(app, end, days, noise=0.0, seed=0):
+    """gesamt = 200 + 3/Woche Trend + Wochentag − 80 an Feiertagen; buchungen = gesamt / 10."""
+    dates = [end - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    gesamt = truth(app, dates, end)
+    return pd.DataFrame({
+        'date_obj': dates,
+        'gesamt': gesamt + np.random.default_rng(seed).normal(0, noise, days),
+        'buchungen': gesamt / 10,
+    })
+
+
+def truth(app, dates, t0):
+    holidays = app.german_holidays({d.year for d in dates})
+    return np.array([
+        200 + 3 * (d - t0).days / 7 + WEEKDAY_EFFECT[d.weekday()] - (80 if d in holidays else 0)
+        for d in dates
+    ])
+
+
+def test_fit_forecast_recovers_weekday_trend_and_holidays(app):
+    end = date(2026, 6, 30)
+    model = app.fit_forecast(synthetic_series(app, end, 240))
+
+    assert model['t0'] == end
+    np.testing.assert_allclose(model['coef'][:, 0], [200, 3, *WEEKDAY_EFFECT[1:], -80], atol=1e-6)
+
+    future = [end + timedelta(days=i) for i in range(1, 15)]
+    pred = app.predict_forecast(model, future)
+    np.testing.assert_allclose(pred['gesamt'], truth(app, future, end), atol=1e-6)
+    np.testing.assert_allclose(pred['buchungen'], truth(app, future, end) / 10, atol=1e-6)
+
+
+def test_fit_forecast_needs_minimum_history(app):
+    series = synthetic_series(app, date(2026, 6, 30), app.FORECAST_MIN_DAYS - 1)
+
+    assert app.fit_forecast(series) is None
+    assert app.fit_forecast(series.iloc[0:0]) is None
+
+
+def test_backtest_forecast_reports_mae_per_horizon(app):
+    backtest = app.backtest_forecast(synthetic_series(app, date(2026, 6, 30), 240, noise=5.0))
+
+    assert backtest['Horizont'].tolist() == list(range(1, 15))
+    assert (backtest['n'] == app.FORECAST_BACKTEST_ORIGINS).all()
+    # Modell kennt Trend und Feiertage, der Wochentag-Durchschnitt nicht
+    assert backtest['Modell'].mean() < backtest['Wochentag_Ø'].mean()
+    assert backtest['Modell'].mean() < 10
+
+
+def test_backtest_forecast_with_short_history(app):
+    # 40 Tage: nur die jüngsten Startpunkte haben die 21 Trainingstage
+    short = app.backtest_forecast(synthetic_series(app, date(2026, 6, 30), 40))
+    assert short['Horizont'].tolist() == list(range(1, 15))
+    assert (short['n'] == 1).all()
+    np.testing.assert_allclose(short['Modell'], 0, atol=1e-6)
+
+    too_short = app.backtest_forecast(synthetic_series(app, date(2026, 6, 30), 30))
+    assert too_short.empty
+    assert list(too_short.columns) == ['Horizont', 'Modell', 'Wochentag_Ø', 'n']
@@ -0,0 +1,186 @@
+"""Import: neue Zeilen anhängen und Aggregate fortschreiben."""
+import io
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+
+def buchungen(*rows):
+    """Gespeicherte Buchungen im Format von reconcile_bookings; rows = (Tag, Name, Zeit, Betrag)."""
+    return pd.DataFrame([{
+        'Datum': day, 'Name': name, 'Name_norm': name.lower(), 'Betrag': betrag,
+        'Service_Zeit': zeit, 'Checkin_Zeit': '', 'Relevant': betrag > 0, 'Check-in': False,
+        'Mitarbeiter': False, 'Fehler': betrag > 0, 'analysis_date': day,
+    } for day, name, zeit, betrag in rows])
+
+
+def test_failed_append_does_not_touch_player_daily(sqlite_app, monkeypatch):
+    app = sqlite_app
+    assert app.append_new_rows(buchungen(('2026-10-01', 'Anna Otto', '18:00', 12.0)), "buchungen") == 1
+    player_daily_before = app.loadsheet("player_daily", app.PLAYER_DAILY_COLUMNS).copy()
+
+    append = app.appendsheet
+    monkeypatch.setattr(app, "appendsheet", lambda df, name: False)
+    second = buchungen(('2026-10-01', 'Anna Otto', '20:00', 12.0))
+    assert app.append_new_rows(second, "buchungen") is None
+    pd.testing.assert_frame_equal(app.loadsheet("player_daily", app.PLAYER_DAILY_COLUMNS), player_daily_before)
+
+    # Erneuter Import nach dem Fehler zählt die Buchung genau einmal
+    monkeypatch.setattr(app, "appendsheet", append)
+    assert app.append_new_rows(second, "buchungen") == 1
+    daily = app.loadsheet("player_daily", app.PLAYER_DAILY_COLUMNS)
+    assert daily['buchungen'].sum() == 2
+
+
+def test_failed_append_does_not_touch_demand_weekly(sqlite_app, monkeypatch):
+    app = sqlite_app
+    assert app.append_new_rows(buchungen(('2026-10-01', 'Anna Otto', '18:00', 12.0)), "buchungen") == 1
+    demand_before = app.loadsheet("demand_weekly", app.DEMAND_WEEKLY_COLUMNS).copy()
+    assert demand_before['buchungen'].sum() == 1
+
+    append = app.appendsheet
+    monkeypatch.setattr(app, "appendsheet", lambda df, name: False)
+    second = buchungen(('2026-10-02', 'Tim Kern', '19:00', 12.0))
+    assert app.append_new_rows(second, "buchungen") is None
+    pd.testing.assert_frame_equal(app.loadsheet("demand_weekly", app.DEMAND_WEEKLY_COLUMNS), demand_before)
+
+    monkeypatch.setattr(app, "appendsheet", append)
+    assert app.append_new_rows(second, "buchungen") == 1
+    matrix = app.demand_matrix(app.load_demand_slabs())
+    assert matrix.sum() == 2
+    assert matrix[3, 18] == 1 and matrix[4, 19] == 1
+
+
+def test_refresh_daily_rollup_loads_each_sheet_once_for_many_dates(sqlite_app, monkeypatch):
+    app = sqlite_app
+    days = [f"2026-10-{d:02d}" for d in range(1, 11)]
+    assert app.append_new_rows(buchungen(*[(day, 'Anna Otto', '18:00', 12.0) for day in days]), "buchungen") == 10
+    assert app.append_new_rows(buchungen(*[(day, 'Tim Kern', '19:00', 0.0) for day in days[:3]]), "buchungen") == 3
+
+    partition_calls = []
+    load_partition = app.load_partition
+    monkeypatch.setattr(app, "load_partition", lambda *args, **kwargs: partition_calls.append(args) or load_partition(*args, **kwargs))
+
+    app.refresh_daily_rollup(days)
+    assert partition_calls == []
+
+    app.refresh_daily_rollup(days[:2])
+    assert len(partition_calls) == 4
+
+    rollup = app.loadsheet("daily_rollup", app.DAILY_ROLLUP_COLUMNS).sort_values('date').reset_index(drop=True)
+    expected = app.build_daily_rollup(app.loadsheet("buchungen"), app.loadsheet("checkins"))
+    pd.testing.assert_frame_equal(rollup[app.DAILY_ROLLUP_COLUMNS],
+                                  expected.sort_values('date').reset_index(drop=True)[app.DAILY_ROLLUP_COLUMNS],
+                                  check_dtype=False)
+    assert rollup['buchungen'].tolist() == [2, 2, 2] + [1] * 7
+
+
+PLAYTOMIC_CSV = """Playtomic Club Manager;halle11
+User name;Product SKU;Service date;Total;Payment id;Club payment id;Sport
+Anna Otto;User booking registration;01/10/2026 18:00;0,00;p1;c1;PADEL
+Tim Kern;User booking registration;01/10/2026 19:00;24,00;p2;c2;PADEL
+""".encode("utf-8")
+
+CHECKINS_CSV = """Vor- & Nachname;Datum;Zeit
+Anna Otto;2026-10-01;17:55
+""".encode("utf-8")
+
+
+class MainThreadSecrets(dict):
+    """st.secrets-Ersatz, der Zugriffe aus Worker-Threads meldet."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker_reads = []
+
+    def get(self, *args):
+        if threading.current_thread() is not threading.main_thread():
+            self.worker_reads.append(args[0])
+        return super().get(*args)
+
+
+@pytest.fixture
+def job_app(app, tmp_path, monkeypatch):
+    """Echter Worker-Thread mit SQLite-Storage aus st.secrets; zählt st.*-Meldungen pro Thread."""
+    secrets = MainThreadSecrets(storage={"backend": "sqlite", "sqlite_path": str(tmp_path / "halle11.db")})
+    monkeypatch.setattr(app.st, "secrets", secrets)
+    worker_messages = []
+    for level in ('info', 'success', 'warning', 'error'):
+        show = getattr(app.st, level)
+
+        def record(message, *args, level=level, show=show, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                worker_messages.append((level, message))
+            return show(message, *args, **kwargs)
+        monkeypatch.setattr(app.st, level, record)
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield app, secrets, worker_messages
+    st.cache_resource.clear()
+
+
+def wait_for_job(app, job_id, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = app.get_ingestion_job(job_id)
+        if not app.ingestion_job_active(job):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} nicht fertig")
+
+
+def test_ingestion_job_reports_into_job_log_not_st(job_app, monkeypatch):
+    app, secrets, worker_messages = job_app
+    sleeps = []
+    monkeypatch.setattr(app.time, "sleep", sleeps.append)
+    load_table = app.load_table_sqlite
+    failures = ["APIError: [429]: Quota exceeded"]
+
+    def flaky_load_table(*args, **kwargs):
+        if failures and threading.current_thread() is not threading.main_thread():
+            raise Exception(failures.pop())
+        return load_table(*args, **kwargs)
+    monkeypatch.setattr(app, "load_table_sqlite", flaky_load_table)
+
+    job_id = app.start_ingestion_job(io.BytesIO(PLAYTOMIC_CSV), io.BytesIO(CHECKINS_CSV))
+    job = wait_for_job(app, job_id)
+
+    assert job['status'] == 'done', job['message']
+    assert "2 neue Buchungen" in job['message']
+    assert worker_messages == []
+    assert secrets.worker_reads == []
+
+    persisted = app.loadsheet("ingestion_jobs", app.INGESTION_JOB_COLUMNS)
+    log = app.ingestion_job_log(persisted[persisted['job_id'] == job_id].iloc[0].to_dict())
+    assert ["success", "✅ 2 Einträge!"] in log
+    assert ['warning', "⚠️ Rate Limit - warte 10s..."] in log
+    assert 10 in sleeps
+
+    buchungen = app.loadsheet("buchungen")
+    assert sorted(buchungen['Name']) == ['Anna Otto', 'Tim Kern']
+
+
+def test_unreadable_upload_is_rejected_before_the_job_starts(job_app):
+    app, _, _ = job_app
+
+    assert app.start_ingestion_job(io.BytesIO(b"foo;bar\n1;2\n"), io.BytesIO(CHECKINS_CSV)) is None
+    assert app.get_ingestion_queue()['jobs'] == {}
+
+
+def test_active_players_come_from_player_daily(sqlite_app):
+    app = sqlite_app
+    assert app.append_new_rows(buchungen(
+        ('2026-10-01', 'Anna Otto', '18:00', 12.0), ('2026-10-01', 'Tim Kern', '19:00', 0.0),
+        ('2026-10-08', 'Anna Otto', '18:00', 12.0), ('2026-10-09', 'Zoë Weiß', '20:00', 3.0),
+    ), "buchungen") == 4
+
+    daily = app.load_player_daily()
+    last_week = app.active_players(daily, date(2026, 10, 1), date(2026, 10, 8))
+    this_week = app.active_players(daily, date(2026, 10, 8))
+
+    assert last_week == {'anna otto', 'tim kern'}
+    assert this_week == {'anna otto', app.normalize_name('Zoë Weiß')}
@@ -0,0 +1,56 @@
+"""Match-Vorschläge: beim Import vorberechnet, im Tages-Tab nur gelesen."""
+import pandas as pd
+import pytest
+
+DAY = '2026-10-01'
+
+
+def fehler(*names):
+    return pd.DataFrame({'Name_norm': list(names), 'Fehler': True, 'analysis_date': DAY})
+
+
+def checkins(*names):
+    return pd.DataFrame({'Name': [n.title() for n in names], 'Name_norm': list(names), 'analysis_date': DAY})
+
+
+@pytest.fixture
+def count_computes(app, monkeypatch):
+    calls = []
+    compute = app.compute_match_suggestions
+    monkeypatch.setattr(app, "compute_match_suggestions", lambda *args: calls.append(args) or compute(*args))
+    return calls
+
+
+def test_precomputed_suggestions_are_read_back_without_recompute(sheets_app, count_computes):
+    app, sheets = sheets_app
+    day_fehler, day_checkins = fehler('anna otto', 'max muller', 'tim kern'), checkins('anna ottoo', 'max mueller', 'tom kern')
+
+    app.precompute_match_suggestions(day_fehler, day_checkins, {}, set())
+    assert len(count_computes) == 1
+    assert len(sheets['match_suggestions'].get_all_values()) == 4  # Header + drei Zeilen für einen Tag
+
+    first = app.get_match_suggestions(DAY, day_fehler, day_checkins, {}, set())
+    second = app.get_match_suggestions(DAY, day_fehler, day_checkins, {}, set())
+
+    assert len(count_computes) == 1
+    assert first == second
+    assert set(first) == {'anna otto', 'max muller', 'tim kern'}
+    assert first['anna otto'][0][0] == 'anna ottoo'
+
+
+def test_suggestions_recompute_when_checkins_change(sheets_app, count_computes):
+    app, sheets = sheets_app
+    day_fehler = fehler('anna otto', 'tim kern')
+    app.precompute_match_suggestions(day_fehler, checkins('tom kern'), {}, set())
+
+    # Check-ins des Tages nachträglich ergänzt, Buchungen unverändert
+    suggestions = app.get_match_suggestions(DAY, day_fehler, checkins('tom kern', 'anna ottoo'), {}, set())
+
+    assert len(count_computes) == 2
+    assert suggestions['anna otto'][0][0] == 'anna ottoo'
+    stored = app.load_match_suggestions_snapshot(DAY)
+    assert sorted(stored['buchung_name']) == ['anna otto', 'tim kern']
+    assert stored['fingerprint'].nunique() == 1
+
+    app.get_match_suggestions(DAY, day_fehler, checkins('tom kern', 'anna ottoo'), {}, set())
+    assert len(count_computes) == 2
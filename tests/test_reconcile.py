@@ -0,0 +1,118 @@
+"""Parität: vektorisierter Abgleich (reconcile_bookings) gegen die frühere Tages-Schleife."""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+FLAG_COLUMNS = ['Relevant', 'Check-in', 'Mitarbeiter', 'Fehler']
+
+
+def old_loop(app, playtomic_filtered, cdf, mapping):
+    """Die ursprüngliche Schleife über Tage und iterrows() (Flags als bool statt 'Ja'/'Nein')."""
+    all_dates = sorted(set(playtomic_filtered['Servicedatum'].dropna()) | set(cdf['Checkin_Datum'].dropna()))
+    mitarbeiter = [app.normalize_name(m) for m in app.MITARBEITER]
+    results, checkin_results = [], []
+    for day in all_dates:
+        pd_day = playtomic_filtered[playtomic_filtered['Servicedatum'] == day]
+        cd_day = cdf[cdf['Checkin_Datum'] == day]
+        for _, row in pd_day.iterrows():
+            is_ma = app.normalize_name(row['Name']) in mitarbeiter
+            checkin_match = cd_day[cd_day['Name_norm'] == row['Name_norm']]
+            has_ci = not checkin_match.empty
+            if not has_ci and row['Name_norm'] in mapping:
+                mapped = mapping[row['Name_norm']]
+                mapped_name = mapped['checkin_name'] if isinstance(mapped, dict) else mapped
+                mapped_checkin = cd_day[cd_day['Name_norm'] == mapped_name]
+                if not mapped_checkin.empty:
+                    has_ci, checkin_match = True, mapped_checkin
+            results.append({
+                'Datum': str(day), 'Name': row['Name'], 'Name_norm': row['Name_norm'],
+                'Betrag': row['Betrag'], 'Service_Zeit': str(row['Service_Zeit']),
+                'Checkin_Zeit': str(checkin_match.iloc[0]['Checkin_Zeit'] if has_ci else ''),
+                'Relevant': bool(row['Relevant']), 'Check-in': has_ci, 'Mitarbeiter': is_ma,
+                'Fehler': bool(row['Relevant'] and not has_ci and not is_ma),
+                'analysis_date': day.strftime("%Y-%m-%d"),
+            })
+        seen = set()
+        for _, row in cd_day.iterrows():
+            if row['Name_norm'] in seen:
+                continue
+            seen.add(row['Name_norm'])
+            checkin_results.append({
+                'Datum': str(day), 'Name': row['Name'], 'Name_norm': row['Name_norm'],
+                'Checkin_Zeit': str(row['Checkin_Zeit']),
+                'Gespielt': not pd_day[pd_day['Name_norm'] == row['Name_norm']].empty,
+                'analysis_date': day.strftime("%Y-%m-%d"),
+            })
+    return pd.DataFrame(results), pd.DataFrame(checkin_results)
+
+
+def make_fixture(app, seed, months=4):
+    rnd = random.Random(seed)
+    first = ['Max', 'Anna', 'Jörg', 'Lena', 'Paul', 'Sophie', 'Tim', 'Ute']
+    last = ['Müller', 'Schmidt', 'Meier-Lang', 'Weiß', 'Otto', 'Kern']
+    names = [f"{f} {l}" for f in first for l in last] + [sorted(app.MITARBEITER)[0]]
+    start = date(2025, 1, 1)
+    bookings, checkins = [], []
+    for offset in range(months * 30):
+        day = start + timedelta(days=offset)
+        for _ in range(rnd.randint(0, 12)):
+            name = rnd.choice(names)
+            amount = rnd.choice([0.0, 2.5, 5.99, 24.0])
+            bookings.append({
+                'Name': name, 'Servicedatum': day if rnd.random() > .02 else None,
+                'Service_Zeit': f"{rnd.randint(8, 22):02d}:00", 'Betrag': amount, 'Relevant': amount < 6,
+            })
+            if rnd.random() < .6:
+                ci_name = name if rnd.random() > .2 else name.replace('ö', 'oe') + ' jr'
+                checkins.append({'Name': ci_name, 'Checkin_Datum': day if rnd.random() > .03 else None,
+                                 'Checkin_Zeit': f"{rnd.randint(8, 22):02d}:{rnd.randint(0, 59):02d}"})
+    p = pd.DataFrame(bookings).sample(frac=1, random_state=seed).reset_index(drop=True)
+    c = pd.DataFrame(checkins).sample(frac=1, random_state=seed).reset_index(drop=True)
+    p['Name_norm'] = p['Name'].apply(app.normalize_name)
+    c['Name_norm'] = c['Name'].apply(app.normalize_name)
+    return p, c
+
+
+def mapping_for(p, kind):
+    if kind == 'empty':
+        return {}
+    if kind == 'no_match':
+        return {'niemand bekannt': 'auch niemand'}
+    names = sorted(p['Name_norm'].unique())[:20]
+    return {n: ({'checkin_name': n + ' jr'} if i % 2 else n + ' jr') for i, n in enumerate(names)}
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('mapping_kind', ['empty', 'no_match', 'learned'])
+def test_reconcile_matches_old_loop(app, seed, mapping_kind):
+    p, c = make_fixture(app, seed)
+    mapping = mapping_for(p, mapping_kind)
+
+    old_b, old_c = old_loop(app, p, c, mapping)
+    new_b, new_c = app.reconcile_bookings(p, c, mapping)
+
+    assert len(new_b) == len(old_b) and len(new_c) == len(old_c)
+    new_b = new_b[old_b.columns].reset_index(drop=True)
+    new_b[FLAG_COLUMNS] = new_b[FLAG_COLUMNS].astype(bool)
+    pd.testing.assert_frame_equal(new_b, old_b, check_dtype=False)
+    new_c = new_c[old_c.columns].reset_index(drop=True)
+    new_c['Gespielt'] = new_c['Gespielt'].astype(bool)
+    pd.testing.assert_frame_equal(new_c, old_c, check_dtype=False)
+
+
+def test_reconcile_empty_mapping_without_any_checkin_match(app):
+    """Frische Installation: leeres Mapping und kein einziger Treffer darf den Merge nicht sprengen."""
+    p = pd.DataFrame({'Name': ['Anna Otto'], 'Servicedatum': [date(2025, 3, 1)], 'Service_Zeit': ['10:00'],
+                      'Betrag': [0.0], 'Relevant': [True]})
+    c = pd.DataFrame({'Name': ['Tim Kern'], 'Checkin_Datum': [date(2025, 3, 1)], 'Checkin_Zeit': ['09:55']})
+    p['Name_norm'] = p['Name'].apply(app.normalize_name)
+    c['Name_norm'] = c['Name'].apply(app.normalize_name)
+
+    buchungen, checkins = app.reconcile_bookings(p, c, {})
+
+    assert buchungen['Fehler'].tolist() == [True]
+    assert checkins['Gespielt'].tolist() == [False]
+    assert np.all(buchungen['Checkin_Zeit'] == '')
@@ -0,0 +1,27 @@
+"""Rohdaten-Import und Umsatz-Cube."""
+import pandas as pd
+
+
+def playtomic_export(*payment_ids):
+    return pd.DataFrame({
+        'Payment id': list(payment_ids), 'Club payment id': [f"c{p}" for p in payment_ids],
+        'Service date': ['01/10/2026 18:00'] * len(payment_ids),
+        'Total': ['24,00'] * len(payment_ids), 'Sport': ['PADEL'] * len(payment_ids),
+        'Product SKU': ['User booking registration'] * len(payment_ids),
+    })
+
+
+def test_failed_raw_append_does_not_touch_revenue_cube(sqlite_app, monkeypatch):
+    app = sqlite_app
+    assert app.save_playtomic_raw(playtomic_export('p1')) == 1
+    cube_before = app.loadsheet("revenue_cube").copy()
+
+    append = app.appendsheet
+    monkeypatch.setattr(app, "appendsheet", lambda df, name: False)
+    assert app.save_playtomic_raw(playtomic_export('p2')) is None
+    pd.testing.assert_frame_equal(app.loadsheet("revenue_cube"), cube_before)
+
+    # Erneuter Upload nach dem Fehler zählt den Umsatz genau einmal
+    monkeypatch.setattr(app, "appendsheet", append)
+    assert app.save_playtomic_raw(playtomic_export('p2')) == 1
+    assert app.get_revenue_from_raw(date_str='2026-10-01')['gesamt'] == 48.0
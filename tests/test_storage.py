@@ -0,0 +1,82 @@
+"""Google-Sheets-Schreibpfade gegen ein In-Memory-Worksheet."""
+import pandas as pd
+
+from fake_sheets import FakeWorksheet
+
+
+def test_upsert_updates_in_place_and_appends_without_clear(sheets_app):
+    app, sheets = sheets_app
+    sheets['daily_rollup'] = FakeWorksheet([
+        ['date', 'umsatz', 'buchungen'],
+        ['2026-10-01', 100, 3],
+        ['2026-10-02', 50, 2],
+        ['2026-10-02', 10, 1],   # Altlast: doppelter Schlüssel
+        ['2026-10-03', 70, 4],
+    ])
+    delta = pd.DataFrame({'date': ['2026-10-02', '2026-10-04'], 'umsatz': [55.0, 20.0], 'buchungen': [3, 1]})
+
+    assert app.upsertsheet(delta, 'daily_rollup', ['date'])
+
+    ws = sheets['daily_rollup']
+    assert 'clear' not in ws.calls
+    assert ws.get_all_values() == [
+        ['date', 'umsatz', 'buchungen'],
+        ['2026-10-01', '100', '3'],
+        ['2026-10-03', '70', '4'],
+        ['2026-10-02', '55.0', '3'],
+        ['2026-10-04', '20.0', '1'],
+    ]
+    assert ('batch_update', 1) not in ws.calls  # doppelter Schlüssel → löschen + anhängen
+
+
+def test_upsert_keeps_every_row_of_a_multi_row_key(sheets_app):
+    app, sheets = sheets_app
+    header = ['analysis_date', 'buchung_name', 'rank', 'checkin_name']
+    sheets['match_suggestions'] = FakeWorksheet([header, ['2026-09-30', 'tim', 1, 'tim k']])
+    first = pd.DataFrame({
+        'analysis_date': ['2026-10-01'] * 3, 'buchung_name': ['anna', 'anna', 'max'],
+        'rank': [1, 2, 1], 'checkin_name': ['ana', 'hanna', 'maxi'],
+    })
+
+    assert app.upsertsheet(first, 'match_suggestions', ['analysis_date'])
+    assert app.upsertsheet(first.iloc[:2].assign(checkin_name=['anna o', 'anne']), 'match_suggestions', ['analysis_date'])
+
+    rows = sheets['match_suggestions'].get_all_values()
+    assert rows == [header, ['2026-09-30', 'tim', '1', 'tim k'],
+                    ['2026-10-01', 'anna', '1', 'anna o'], ['2026-10-01', 'anna', '2', 'anne']]
+    assert 'clear' not in sheets['match_suggestions'].calls
+
+
+def test_upsert_with_composite_key(sheets_app):
+    app, sheets = sheets_app
+    sheets['demand_weekly'] = FakeWorksheet([
+        ['week', 'Wochentag', 'Stunde', 'buchungen'],
+        ['2026-10-05', 0, 18, 2],
+        ['2026-10-05', 1, 18, 5],
+    ])
+    delta = pd.DataFrame({'week': ['2026-10-05', '2026-10-05'], 'Wochentag': [1, 1], 'Stunde': [18, 19], 'buchungen': [6, 1]})
+
+    assert app.upsertsheet(delta, 'demand_weekly', ['week', 'Wochentag', 'Stunde'])
+
+    rows = sheets['demand_weekly'].get_all_values()[1:]
+    assert rows == [['2026-10-05', '0', '18', '2'], ['2026-10-05', '1', '18', '6'], ['2026-10-05', '1', '19', '1']]
+    assert 'clear' not in sheets['demand_weekly'].calls
+
+
+def test_load_partition_gives_up_after_bounded_retries(sheets_app, monkeypatch):
+    app, _ = sheets_app
+    calls = []
+
+    def quota_exhausted(name, column, value, cols=None):
+        calls.append(name)
+        raise Exception("APIError: [429]: Quota exceeded")
+
+    sleeps = []
+    monkeypatch.setattr(app, "load_partition_gsheets", quota_exhausted)
+    monkeypatch.setattr(app.time, "sleep", sleeps.append)
+
+    df = app.load_partition("buchungen", "analysis_date", "2026-10-01", ['analysis_date'])
+
+    assert df.empty and list(df.columns) == ['analysis_date']
+    assert len(calls) == 3
+    assert sleeps == [10, 20]
@@ -0,0 +1,128 @@
+"""WhatsApp-Nachrichten: Platzhalter und Versandqueue."""
+
+import threading
+
+import pytest
+
+
+def test_fill_message_placeholders_personalizes_per_recipient(app):
+    text = "Servus {name}! {buchungen}x warst du da – heute um {zeit}."
+
+    filled = app.fill_message_placeholders(text, "Anna Otto", 7, "18:30")
+
+    assert filled == "Servus Anna! 7x warst du da – heute um 18:30."
+    assert app.open_placeholders(filled) == []
+
+
+def test_open_placeholders_blocks_unfilled_templates(app):
+    text = app.fill_message_placeholders("Hey {name}! Am [DATUM] um {zeit}: 👉 [Google Review Link]", "Tim Kern", 4)
+
+    assert app.open_placeholders(text) == ['[DATUM]', '[Google Review Link]', '{zeit}']
+
+
+class FakeSendError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class FakeTransport:
+    """Ersetzt Twilio: wirft die vorgegebenen Fehler der Reihe nach, danach eine SID."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.messages = []
+
+    def __call__(self, message):
+        self.messages.append(message)
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"SM{len(self.messages)}"
+
+
+def fake_queue():
+    return {'lock': threading.Lock(), 'jobs': {}, 'next_slot': 0.0}
+
+
+def fake_job(app, key="k1"):
+    job = app.make_whatsapp_job(key, "Anna Otto", "18.10.2026", "12,00", {'to': 'whatsapp:+4917000000', 'body': 'Hi'})
+    job.update({'id': key, 'status': 'queued', 'attempts': 0, 'sid': '', 'error': '', 'finished': '', 'logged': False})
+    return job
+
+
+@pytest.fixture
+def clock(app, monkeypatch):
+    """Eingefrorene Uhr; time.sleep schiebt sie vor und merkt sich die Wartezeiten."""
+    state = {'now': 100.0, 'sleeps': []}
+
+    def sleep(seconds):
+        state['sleeps'].append(seconds)
+        state['now'] += seconds
+
+    monkeypatch.setattr(app.time, "monotonic", lambda: state['now'])
+    monkeypatch.setattr(app.time, "sleep", sleep)
+    monkeypatch.setattr(app.random, "uniform", lambda a, b: 0.0)
+    return state
+
+
+def test_run_whatsapp_job_retries_transient_errors_with_backoff(app, clock):
+    transport = FakeTransport(FakeSendError(429), FakeSendError(503))
+    job = fake_job(app)
+
+    app.run_whatsapp_job(job, transport, rate=1000.0, queue=fake_queue())
+
+    assert (job['status'], job['attempts'], job['sid'], job['error']) == ('sent', 3, 'SM3', '')
+    backoffs = [s for s in clock['sleeps'] if s > 0]
+    assert backoffs == [app.WHATSAPP_BACKOFF_SECONDS, app.WHATSAPP_BACKOFF_SECONDS * 2]
+    assert job['finished'] and not job['logged']
+
+
+def test_run_whatsapp_job_fails_fast_on_permanent_error(app, clock):
+    transport = FakeTransport(FakeSendError(400))
+    job = fake_job(app)
+
+    app.run_whatsapp_job(job, transport, rate=1000.0, queue=fake_queue())
+
+    assert (job['status'], job['attempts']) == ('failed', 1)
+    assert len(transport.messages) == 1
+    assert "400" in job['error']
+
+
+def test_run_whatsapp_job_gives_up_after_max_retries(app, clock):
+    transport = FakeTransport(*[FakeSendError(429)] * 5)
+    job = fake_job(app)
+
+    app.run_whatsapp_job(job, transport, rate=1000.0, queue=fake_queue(), max_retries=3)
+
+    assert (job['status'], job['attempts']) == ('failed', 3)
+    assert len(transport.messages) == 3
+
+
+def test_wait_for_send_slot_spaces_sends_by_rate(app, clock):
+    queue = fake_queue()
+    sent_at = []
+
+    for _ in range(4):
+        app.wait_for_send_slot(queue, rate=2.0)
+        sent_at.append(clock['now'] - 100.0)
+
+    assert sent_at == [0.0, 0.5, 1.0, 1.5]
+
+
+def test_flush_whatsapp_log_persists_finished_jobs_once(sqlite_app, clock):
+    app = sqlite_app
+    queue = app.get_whatsapp_queue()
+    sent, failed, running = fake_job(app, "k_sent"), fake_job(app, "k_failed"), fake_job(app, "k_running")
+    app.run_whatsapp_job(sent, FakeTransport(), rate=1000.0, queue=queue)
+    app.run_whatsapp_job(failed, FakeTransport(FakeSendError(400)), rate=1000.0, queue=queue)
+    running['status'] = 'sending'
+    queue['jobs'].update({j['id']: j for j in (sent, failed, running)})
+
+    assert app.pending_whatsapp_keys() == {"k_sent", "k_running"}
+    assert app.flush_whatsapp_log() == 2
+    assert app.flush_whatsapp_log() == 0
+
+    log = app.loadsheet("whatsapp_log", app.WHATSAPP_LOG_COLUMNS)
+    assert sorted(log['status']) == ['failed', 'sent']
+    assert set(app.get_whatsapp_log_index()) == {"k_sent"}
+    assert app.pending_whatsapp_keys() == {"k_running"}